@@ -0,0 +1,134 @@
+-- RESTAURANTE: tabelas derivadas do banco de restaurantes (amostra_*)
+-- Executar no banco usado por lib/db-restaurante.ts.
+
+-- Mapa de restaurantes pré-agregado por tile (z/x/y) em vários zooms, com o centróide de cada tile
+-- (gerado por scripts/build_map_tiles.py --preset restaurantes)
+CREATE TABLE IF NOT EXISTS amostra_restaurants_tiles (
+    zoom SMALLINT NOT NULL,
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    restaurantes INTEGER NOT NULL,
+    disponiveis INTEGER NOT NULL,
+    avaliacao_media NUMERIC(3,2),
+    latitude NUMERIC(9,6),
+    longitude NUMERIC(9,6),
+    PRIMARY KEY (zoom, tile_x, tile_y)
+);
+
+-- Pedidos sintéticos dos dashboards de restaurante (gerados por scripts/generate_restaurant_orders.py)
+CREATE TABLE IF NOT EXISTS amostra_lojas (
+    merchant_id TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    peso NUMERIC(8,6) NOT NULL -- fração dos pedidos da rede
+);
+
+CREATE TABLE IF NOT EXISTS amostra_pedidos (
+    id UUID PRIMARY KEY,
+    merchant_id TEXT NOT NULL REFERENCES amostra_lojas(merchant_id) ON DELETE CASCADE,
+    criado_em TIMESTAMPTZ NOT NULL,
+    canal TEXT NOT NULL,
+    forma_pagamento TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('Concluído', 'Cancelado')),
+    itens INTEGER NOT NULL,
+    valor_itens NUMERIC(10,2) NOT NULL,
+    desconto NUMERIC(10,2) NOT NULL,
+    taxa_entrega NUMERIC(10,2) NOT NULL,
+    valor_total NUMERIC(10,2) NOT NULL,
+    taxa_plataforma NUMERIC(10,2) NOT NULL, -- comissão do app + taxa do meio de pagamento
+    tempo_preparo_min INTEGER NOT NULL,
+    tempo_entrega_min INTEGER, -- só entregas concluídas
+    motivo_cancelamento TEXT,
+    nota_nps INTEGER CHECK (nota_nps BETWEEN 0 AND 10),
+    avaliacao INTEGER CHECK (avaliacao BETWEEN 1 AND 5)
+);
+
+CREATE TABLE IF NOT EXISTS amostra_pedido_itens (
+    id UUID PRIMARY KEY,
+    pedido_id UUID NOT NULL REFERENCES amostra_pedidos(id) ON DELETE CASCADE,
+    item_nome TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    quantidade INTEGER NOT NULL,
+    preco_unitario NUMERIC(10,2) NOT NULL,
+    custo_unitario NUMERIC(10,2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_pedidos_merchant_criado ON amostra_pedidos(merchant_id, criado_em);
+CREATE INDEX IF NOT EXISTS idx_pedido_itens_pedido_id ON amostra_pedido_itens(pedido_id);
+
+-- Cobre: faturamento (visão geral, canais) e operacional/tempos, por dia, loja e canal
+-- (valores de pedidos concluídos; tempos médios = soma / pedidos concluídos ou entregas)
+CREATE TABLE IF NOT EXISTS amostra_pedidos_diario (
+    dia DATE NOT NULL,
+    merchant_id TEXT NOT NULL,
+    canal TEXT NOT NULL,
+    pedidos INTEGER NOT NULL,
+    cancelados INTEGER NOT NULL,
+    faturamento_bruto NUMERIC(14,2),
+    faturamento_liquido NUMERIC(14,2), -- descontadas as taxas de plataforma
+    itens INTEGER NOT NULL,
+    ticket_medio NUMERIC(10,2),
+    tempo_preparo_medio NUMERIC(6,2),
+    tempo_entrega_medio NUMERIC(6,2),
+    soma_tempo_preparo BIGINT NOT NULL,
+    soma_tempo_entrega BIGINT NOT NULL,
+    entregas INTEGER NOT NULL,
+    PRIMARY KEY (dia, merchant_id, canal)
+);
+
+-- Cobre: faturamento/pagamentos (pedidos concluídos)
+CREATE TABLE IF NOT EXISTS amostra_pagamentos_diario (
+    dia DATE NOT NULL,
+    merchant_id TEXT NOT NULL,
+    forma_pagamento TEXT NOT NULL,
+    pedidos INTEGER NOT NULL,
+    valor NUMERIC(14,2),
+    PRIMARY KEY (dia, merchant_id, forma_pagamento)
+);
+
+-- Cobre: cardapio (curva ABC, CMV por item)
+CREATE TABLE IF NOT EXISTS amostra_cardapio_diario (
+    dia DATE NOT NULL,
+    merchant_id TEXT NOT NULL,
+    item_nome TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    quantidade INTEGER NOT NULL,
+    receita NUMERIC(14,2),
+    custo NUMERIC(14,2),
+    cmv NUMERIC(5,2), -- % do custo sobre a receita
+    PRIMARY KEY (dia, merchant_id, item_nome)
+);
+
+-- Cobre: operacional/cancelamentos
+CREATE TABLE IF NOT EXISTS amostra_cancelamentos_diario (
+    dia DATE NOT NULL,
+    merchant_id TEXT NOT NULL,
+    canal TEXT NOT NULL,
+    motivo TEXT NOT NULL,
+    pedidos INTEGER NOT NULL,
+    valor_perdido NUMERIC(14,2),
+    PRIMARY KEY (dia, merchant_id, canal, motivo)
+);
+
+-- Cobre: picos de pedidos por hora e canal (toda a rede)
+CREATE TABLE IF NOT EXISTS amostra_pedidos_hora (
+    dia DATE NOT NULL,
+    hora INTEGER NOT NULL CHECK (hora BETWEEN 0 AND 23),
+    canal TEXT NOT NULL,
+    pedidos INTEGER NOT NULL,
+    faturamento NUMERIC(14,2),
+    PRIMARY KEY (dia, hora, canal)
+);
+
+-- Cobre: clientes/nps (NPS = % promotores - % detratores)
+CREATE TABLE IF NOT EXISTS amostra_nps_diario (
+    dia DATE NOT NULL,
+    merchant_id TEXT NOT NULL,
+    respostas INTEGER NOT NULL,
+    promotores INTEGER NOT NULL,
+    neutros INTEGER NOT NULL,
+    detratores INTEGER NOT NULL,
+    nps NUMERIC(6,2),
+    avaliacao_media NUMERIC(3,2),
+    soma_avaliacao INTEGER NOT NULL,
+    PRIMARY KEY (dia, merchant_id)
+);
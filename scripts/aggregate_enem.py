@@ -0,0 +1,107 @@
+"""Aggregate the INEP ENEM microdata into the enem_agregado_* tables.
+
+    python aggregate_enem.py MICRODADOS_ENEM_2023.csv --escolas microdados_ed_basica_2023.csv --workers 8
+
+Reads the (extracted) microdata CSV in one pass and writes per-state,
+per-city, per-school and per-bairro counts and means for CN/CH/LC/MT/redação
+(see ``datagen.enem``), in the layout of ``supabase_schema.sql``. ``--layout
+legado`` writes instead the old estado/cidade tables of the static CSVs.
+With --load the target tables must have the layout's columns.
+"""
+import argparse
+import os
+
+from datagen import enem
+from datagen.instrument import RunManifest
+from datagen.sharding import run_shards
+from datagen.writers import open_sink, CHUNK_SIZE
+
+_AREA_SCHEMA = {c: t for area, _ in enem.AREAS
+                for c, t in ((f'avg_{area}', 'numeric(6,2)'), (f'count_{area}', 'integer'))}
+_LOCATION = {'SG_UF_PROVA': 'dict', 'CO_MUNICIPIO_PROVA': 'integer', 'NO_MUNICIPIO_PROVA': 'text',
+             'tp_escola_label': 'dict'}
+
+SCHEMAS = {
+    'app': {
+        'enem_agregado_estado': {'SG_UF_PROVA': 'dict', 'tp_escola_label': 'dict', **_AREA_SCHEMA,
+                                 'total_inscritos': 'integer'},
+        'enem_agregado_cidade': {**_LOCATION, **_AREA_SCHEMA, 'total_inscritos': 'integer'},
+        'enem_agregado_escola': {**_LOCATION, 'CO_ESCOLA': 'integer', 'NO_ENTIDADE': 'text', 'NO_BAIRRO': 'text',
+                                 **_AREA_SCHEMA, 'total_inscritos': 'integer'},
+        'enem_agregado_bairro': {**_LOCATION, 'NO_BAIRRO': 'text', **_AREA_SCHEMA, 'total_inscritos': 'integer'},
+    },
+    'legado': {
+        'enem_agregado_estado': {'SG_UF_PROVA': 'char(2)', **{col: 'numeric(6,2)' for _, col in enem.AREAS},
+                                 'total_alunos': 'integer'},
+        'enem_agregado_cidade': {'id': 'uuid', 'CO_MUNICIPIO_PROVA': 'integer', 'NO_MUNICIPIO_PROVA': 'text',
+                                 'SG_UF_PROVA': 'char(2)', **{col: 'numeric(6,2)' for _, col in enem.AREAS},
+                                 'total_alunos': 'integer'},
+    },
+}
+
+
+def scan_range(spec):
+    path, header, (start, end) = spec
+    return enem.scan(path, start, end, header)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Agrega os microdados do ENEM (INEP) nas tabelas enem_agregado_*.')
+    parser.add_argument('microdados', help='CSV dos microdados do ENEM (extraído do zip do INEP; ";" e Latin-1)')
+    parser.add_argument('--escolas', metavar='CENSO_CSV',
+                        help='Microdados do Censo Escolar (CO_ENTIDADE, NO_ENTIDADE, NO_BAIRRO) para nomear escolas e bairros')
+    parser.add_argument('--out-dir', default='.', help='Diretório de saída')
+    parser.add_argument('--layout', choices=['app', 'legado'], default='app',
+                        help='app: colunas avg_*/count_* por tipo de escola, como as rotas /api/enem consultam; '
+                             'legado: enem_agregado_estado/cidade dos CSVs estáticos (NU_NOTA_*)')
+    parser.add_argument('--workers', type=int, default=0, help='Lê o arquivo em partes num pool de N processos')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por lote de escrita')
+    parser.add_argument('--load', metavar='POSTGRES_URL', help='Carrega as tabelas direto no Postgres via COPY')
+    parser.add_argument('--load-format', choices=['text', 'binary'], default='text', help='Formato do COPY (com --load)')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Formato dos arquivos (parquet/arrow requer pyarrow)')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help='Perfila cada etapa em <out-dir>/profiles (pyinstrument precisa estar instalado)')
+    args = parser.parse_args()
+
+    schemas = SCHEMAS[args.layout]
+    manifest = RunManifest(args.out_dir, profile=args.profile)
+    sink = manifest.wrap(open_sink(args.out_dir, args.chunk_size, args.load, args.load_format, fmt=args.format,
+                                   schemas=schemas))
+    if args.load:
+        # Checked before the scan: the columns a table lacks would be dropped from the load
+        for table, columns in schemas.items():
+            missing = [c for c in columns if c not in sink.columns.get(table, columns)]
+            if missing:
+                parser.error(f"{table} no banco não tem as colunas do --layout {args.layout} "
+                             f"({', '.join(missing)}): use o outro --layout ou recrie a tabela "
+                             f"com supabase_schema.sql")
+    try:
+        header = enem.read_header(args.microdados)
+        # A few ranges per worker, so one slow range does not hold up the pool
+        ranges = enem.byte_ranges(args.microdados, max(1, args.workers) * 4)
+        print(f"Reading {args.microdados} ({os.path.getsize(args.microdados) / 2**30:.1f} GB, {len(ranges)} parts)...")
+        with manifest.stage('microdados') as stage:
+            sums = enem.new_sums()
+            for partial in run_shards(scan_range, [(args.microdados, header, r) for r in ranges], args.workers,
+                                      stage=stage):
+                sums.update(partial)
+            stage['rows'] = sum(acc[0] for acc in sums.groups.values())
+        print(f"Aggregated {stage['rows']} inscritos into {len(sums.groups)} groups")
+
+        if args.layout == 'legado':
+            tables = list(enem.legacy_tables(sums))
+        else:
+            escolas = enem.load_escolas(args.escolas) if args.escolas else None
+            tables = list(enem.app_tables(sums, escolas))
+        sink.prepare([name for name, _ in tables])
+        for name, rows in tables:
+            sink.write_rows(name, rows)
+    finally:
+        sink.finish()
+        manifest.save()
+    print("Done!")
+
+
+if __name__ == '__main__':
+    main()
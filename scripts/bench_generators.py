@@ -0,0 +1,167 @@
+"""Benchmark the data generators at several school sizes.
+
+Runs generate_final_data / generate_bi_data once per (script, alunos) in a
+fresh process and collects, per run, the scripts' own run manifest (see
+``datagen.instrument``): wall time, peak RSS (the worker processes'
+included under --workers), and for each table the rows, seconds spent
+generating + writing it, rows/s and output bytes.
+Results go to a JSON file; ``--compare`` checks them against an earlier one
+and exits non-zero when a table got slower than ``--threshold``.
+
+    python bench_generators.py --scales 480 10000 --out bench.json
+    python bench_generators.py --scales 480 10000 --compare bench.json
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from datagen.instrument import MANIFEST_FILE
+
+SCRIPTS = ['generate_final_data', 'generate_bi_data']
+SCALES = [480, 10000, 100000, 1000000]
+# Tables faster than this are timer noise and never flagged by --compare
+MIN_SECONDS = 0.05
+
+
+def run_one(spec):
+    """Run one generator in this (fresh) process and return its measurements."""
+    module = importlib.import_module(spec['script'])
+    sys.argv = [f"{spec['script']}.py", '--out-dir', spec['out_dir'], '--alunos', str(spec['alunos'])] + spec['args']
+    if spec['script'] == 'generate_final_data':
+        # Measure the generation itself, not restoring tables from the cache
+        sys.argv.append('--no-cache')
+    with contextlib.redirect_stdout(io.StringIO()):
+        module.main()
+    with open(os.path.join(spec['out_dir'], MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    # Shards run in this process record a table once per shard: add them up
+    tables = {}
+    for s in manifest['stages']:
+        t = tables.setdefault(s['stage'], {'rows': 0, 'seconds': 0.0, 'bytes': 0, 'peak_rss_mb': 0})
+        t['rows'] += s['rows'] or 0
+        t['seconds'] += s['seconds']
+        t['bytes'] += s['bytes'] or 0
+        t['peak_rss_mb'] = max(t['peak_rss_mb'], s['peak_rss_mb'] or 0)
+        if s.get('workers_rss_mb'):
+            t['workers_rss_mb'] = s['workers_rss_mb']
+    for t in tables.values():
+        t['seconds'] = round(t['seconds'], 4)
+        t['rows_per_s'] = round(t['rows'] / t['seconds']) if t['seconds'] else None
+    return {
+        'script': spec['script'],
+        'alunos': spec['alunos'],
+        'args': spec['args'],
+        'wall_s': manifest['wall_s'],
+        # With --workers the pool's memory comes on top of this process's
+        'peak_rss_mb': round(manifest['process_peak_rss_mb'] + (manifest.get('workers_peak_rss_mb') or 0), 1),
+        'output_bytes': manifest['bytes'],
+        'tables': tables,
+    }
+
+
+def run_isolated(spec):
+    # One spawned process per run: peak RSS and import costs are not shared. Not a
+    # multiprocessing.Pool: its daemonic process could not start the generator's --workers pool
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_one, spec).result()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_key(run):
+    return run['script'], run['alunos'], tuple(run['args'])
+
+
+def compare(old, new, threshold):
+    """Print rows/s changes per table; return the regressions beyond ``threshold``."""
+    baseline = {run_key(r): r for r in old['runs']}
+    regressions = []
+    for run in new['runs']:
+        ref = baseline.get(run_key(run))
+        if ref is None:
+            continue
+        print(f"\n{run['script']} alunos={run['alunos']} {' '.join(run['args'])}")
+        print(f"  wall {ref['wall_s']:.2f}s -> {run['wall_s']:.2f}s, "
+              f"rss {ref['peak_rss_mb']:.0f} -> {run['peak_rss_mb']:.0f} MB")
+        for name, t in run['tables'].items():
+            r = ref['tables'].get(name)
+            if not r or not r['rows_per_s'] or not t['rows_per_s']:
+                continue
+            ratio = r['rows_per_s'] / t['rows_per_s']
+            slow = ratio > threshold and max(r['seconds'], t['seconds']) >= MIN_SECONDS
+            flag = '  REGRESSION' if slow else ''
+            print(f"  {name:28} {r['rows_per_s']:>10} -> {t['rows_per_s']:>10} rows/s ({ratio:.2f}x time){flag}")
+            if flag:
+                regressions.append((run_key(run), name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos geradores (linhas/s por tabela, tempo, pico de RSS, bytes).')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help='Números de alunos a medir')
+    parser.add_argument('--scripts', nargs='+', choices=SCRIPTS, default=SCRIPTS, help='Geradores a medir')
+    parser.add_argument('--repeat', type=int, default=1, help='Execuções por cenário (guarda a mais rápida)')
+    parser.add_argument('--out', help='Arquivo JSON de resultados (padrão: bench-<data>.json)')
+    parser.add_argument('--work-dir', help='Diretório temporário para as saídas (padrão: tmp do sistema)')
+    parser.add_argument('--compare', metavar='BASELINE_JSON', help='Compara com um resultado anterior')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Com --compare: falha se uma tabela ficar mais lenta que este fator')
+    args, extra = parser.parse_known_args()
+    # Anything else (--engine numpy, --format parquet, ...) goes to the generators
+
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'runs': [],
+    }
+    for alunos in args.scales:
+        for script in args.scripts:
+            best = None
+            for _ in range(args.repeat):
+                out_dir = tempfile.mkdtemp(prefix='bench-', dir=args.work_dir)
+                try:
+                    run = run_isolated({'script': script, 'alunos': alunos, 'out_dir': out_dir, 'args': extra})
+                finally:
+                    shutil.rmtree(out_dir, ignore_errors=True)
+                if best is None or run['wall_s'] < best['wall_s']:
+                    best = run
+            results['runs'].append(best)
+            print(f"{script:22} alunos={alunos:<8} {best['wall_s']:8.2f}s  "
+                  f"rss {best['peak_rss_mb']:7.1f} MB  {best['output_bytes'] / 1e6:9.1f} MB out")
+
+    out = args.out or f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} table(s) slower than {args.threshold}x the baseline")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
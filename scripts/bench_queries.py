@@ -0,0 +1,230 @@
+"""Benchmark the dashboard queries on generated data in a local Postgres.
+
+    python bench_queries.py --load postgresql://localhost/bench --scales 480 10000 100000 --out queries.json
+    python bench_queries.py --load postgresql://localhost/bench --scales 1000000 --engine numpy --workers 4
+
+Applies ``supabase_schema.sql`` to the database and, for each scale, loads
+generate_final_data.py's tables with ``--alunos`` = the scale (other
+arguments go to the generator). Every query of the catalog
+(dashboard_queries.sql: the SQL of app/api/dashboard/*/route.ts and
+app/api/enem/*/route.ts) is then replayed with representative parameters;
+per query and scale the results hold the latency percentiles and the
+figures of one ``EXPLAIN (ANALYZE, BUFFERS)``: planning/execution time,
+shared buffer hits and reads, and the tables read by sequential scans.
+The text plans go to ``<plans-dir>/<alunos>/<query>.txt``.
+
+The ENEM tables are loaded once, from ``--enem-inscritos`` synthetic
+candidates (see ``datagen.enem.synthetic``); with 0 the queries run on what
+the database already holds (e.g. a real ``aggregate_enem.py --load``).
+The tables are truncated and reloaded: point --load at a scratch database.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import psycopg
+
+from aggregate_enem import SCHEMAS as ENEM_SCHEMAS
+from bench_generators import git_revision
+from datagen import enem, workload
+from datagen.writers import open_sink
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(HERE, '..', 'supabase_schema.sql')
+CATALOG = os.path.join(HERE, 'dashboard_queries.sql')
+SCALES = [480, 10000, 100000]
+ENEM_INSCRITOS = 200000
+SEED = 42
+# tp_escola cases of the ENEM routes (None is "Todas")
+TP_ESCOLA = [None, 'Pública', 'Privada']
+SETTINGS = ['server_version', 'shared_buffers', 'work_mem', 'effective_cache_size', 'random_page_cost',
+            'max_parallel_workers_per_gather']
+
+
+def apply_schema(dsn):
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        with open(SCHEMA_FILE, encoding='utf-8') as f:
+            conn.execute(f.read())
+        # Databases created from an older supabase_schema.sql keep the legacy
+        # enem_agregado_estado/cidade (CREATE TABLE IF NOT EXISTS): rebuild them in the layout the routes query
+        for table, columns in ENEM_SCHEMAS['app'].items():
+            have = {r[0] for r in conn.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() "
+                "AND table_name = %s", [table])}
+            if 'tp_escola_label' not in have:
+                ddl = ', '.join(f'"{c}" {"TEXT" if t == "dict" else t.upper()}' for c, t in columns.items())
+                conn.execute(f'DROP TABLE IF EXISTS {table}')
+                conn.execute(f'CREATE TABLE {table} ({ddl})')
+                print(f"Recreated {table} in the layout of aggregate_enem.py --layout app")
+
+
+def load_enem(dsn, inscritos):
+    print(f"Loading ENEM tables ({inscritos} synthetic inscritos)...")
+    sums, escolas = enem.synthetic(inscritos, SEED)
+    tables = list(enem.app_tables(sums, escolas))
+    sink = open_sink(load=dsn)
+    try:
+        sink.prepare([name for name, _ in tables])
+        for name, rows in tables:
+            sink.write_rows(name, rows)
+    finally:
+        sink.finish()
+
+
+def enem_params(conn):
+    """The largest UF, its largest city and that city's three largest bairros."""
+    row = conn.execute('SELECT "SG_UF_PROVA" FROM enem_agregado_cidade GROUP BY 1 '
+                       'ORDER BY SUM(total_inscritos) DESC LIMIT 1').fetchone()
+    if row is None:
+        return {}
+    uf = row[0]
+    cidade = conn.execute('SELECT "NO_MUNICIPIO_PROVA" FROM enem_agregado_cidade WHERE "SG_UF_PROVA" = %s '
+                          'GROUP BY 1 ORDER BY SUM(total_inscritos) DESC LIMIT 1', [uf]).fetchone()[0]
+    bairros = [r[0] for r in conn.execute(
+        'SELECT UPPER("NO_BAIRRO") FROM enem_agregado_bairro WHERE "SG_UF_PROVA" = %s AND "NO_MUNICIPIO_PROVA" = %s '
+        'GROUP BY 1 ORDER BY SUM(total_inscritos) DESC LIMIT 3', [uf, cidade])]
+    params = {'uf': [uf], 'cidade': [cidade], 'tp_escola': TP_ESCOLA}
+    if bairros:
+        params['bairros'] = [bairros]
+    return params
+
+
+def load_scale(dsn, alunos, extra):
+    """Load generate_final_data.py's tables for ``alunos`` students (in a fresh process); return seconds."""
+    with tempfile.TemporaryDirectory(prefix='bench-queries-') as out_dir:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(HERE, 'generate_final_data.py'), '--alunos', str(alunos),
+                        '--load', dsn, '--out-dir', out_dir] + extra,
+                       cwd=HERE, check=True, stdout=subprocess.DEVNULL)
+        seconds = time.perf_counter() - start
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute('ANALYZE')
+    return seconds
+
+
+def table_sizes(conn):
+    rows = conn.execute(
+        "SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid) FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = current_schema() AND c.relkind = 'r' "
+        "ORDER BY c.relname").fetchall()
+    return {name: {'rows': max(0, tuples), 'bytes': size} for name, tuples, size in rows}
+
+
+def plan_file(plans_dir, alunos, name, label):
+    safe = re.sub(r'[^\w.-]+', '_', f'{name}_{label}' if label else name)
+    path = os.path.join(plans_dir, str(alunos), f'{safe}.txt')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def run_catalog(conn, queries, params, claims, args, alunos):
+    results = []
+    for query in queries:
+        try:
+            query_cases = list(workload.cases(query, params))
+        except KeyError as e:
+            print(f"  {query.name:40} skipped ({e.args[0].split(': ', 1)[1]})")
+            continue
+        for label, bound in query_cases:
+            try:
+                latencies, rows = workload.time_query(conn, query, bound, claims, args.repeat, args.warmup)
+                text, plan = workload.explain(conn, query, bound, claims)
+            except psycopg.Error as e:
+                # The route fails the same way (and falls back to mock data, where it has one)
+                error = str(e).splitlines()[0]
+                results.append({'query': query.name, 'route': query.route, 'case': label, 'error': error})
+                print(f"  {query.name + (' ' + label if label else ''):40} error: {error}")
+                continue
+            with open(plan_file(args.plans_dir, alunos, query.name, label), 'w', encoding='utf-8') as f:
+                f.write(f'-- {query.name} {label}'.rstrip() + f'\n-- {query.route}\n{text}\n')
+            result = {'query': query.name, 'route': query.route, 'case': label, 'rows': rows,
+                      **workload.summarize(latencies), 'plan': plan}
+            results.append(result)
+            hit = f"{plan['hit_ratio']:.0%}" if plan['hit_ratio'] is not None else '-'
+            seq = ','.join(plan['seq_scans']) or '-'
+            print(f"  {query.name + (' ' + label if label else ''):40} p50 {result['p50_ms']:9.2f} ms  "
+                  f"p95 {result['p95_ms']:9.2f} ms  hit {hit:>4}  seq {seq}")
+    return results
+
+
+def print_scaling(runs):
+    """p50 of each query across the scales, to spot the ones that grow with the data."""
+    scales = [r['alunos'] for r in runs]
+    print(f"\n  {'p50 (ms) by alunos':40} " + ' '.join(f'{s:>10}' for s in scales))
+    keys = list(dict.fromkeys((q['query'], q['case']) for r in runs for q in r['queries']))
+    by_run = [{(q['query'], q['case']): q for q in r['queries']} for r in runs]
+    for key in keys:
+        cells = [f"{b[key]['p50_ms']:10.2f}" if 'p50_ms' in b.get(key, {}) else f"{'-':>10}" for b in by_run]
+        name = f'{key[0]} {key[1]}'.strip()
+        print(f'  {name:40} ' + ' '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das consultas dos dashboards (latência, buffers e planos) '
+                                                 'sobre dados gerados num Postgres local.')
+    parser.add_argument('--load', metavar='POSTGRES_URL', required=True,
+                        help='Banco de benchmark (as tabelas são esvaziadas e recarregadas)')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help='Números de alunos a medir')
+    parser.add_argument('--repeat', type=int, default=20, help='Execuções medidas por consulta')
+    parser.add_argument('--warmup', type=int, default=2, help='Execuções descartadas antes das medidas')
+    parser.add_argument('--only', metavar='TEXTO', help='Só as consultas cujo nome contém TEXTO (ex.: enem/, financeiro)')
+    parser.add_argument('--catalog', default=CATALOG, help='Catálogo de consultas (padrão: dashboard_queries.sql)')
+    parser.add_argument('--enem-inscritos', type=int, default=ENEM_INSCRITOS,
+                        help='Inscritos sintéticos das tabelas do ENEM; 0 usa o que já estiver no banco')
+    parser.add_argument('--out', help='Arquivo JSON de resultados (padrão: bench-queries-<data>.json)')
+    parser.add_argument('--plans-dir', help='Diretório dos planos EXPLAIN (padrão: <out sem .json>-plans)')
+    args, extra = parser.parse_known_args()
+    # Anything else (--engine numpy, --workers 4, ...) goes to generate_final_data.py
+
+    args.out = args.out or f"bench-queries-{datetime.now():%Y%m%d-%H%M%S}.json"
+    args.plans_dir = args.plans_dir or os.path.splitext(args.out)[0] + '-plans'
+    queries = [q for q in workload.load_catalog(args.catalog) if not args.only or args.only in q.name]
+    if not queries:
+        parser.error(f'nenhuma consulta em {args.catalog} com {args.only!r}')
+
+    apply_schema(args.load)
+    if args.enem_inscritos:
+        load_enem(args.load, args.enem_inscritos)
+    with psycopg.connect(args.load, autocommit=True) as conn:
+        params = enem_params(conn)
+        settings = {name: conn.execute(f'SHOW {name}').fetchone()[0] for name in SETTINGS}
+
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'postgres': settings,
+        'generator_args': extra,
+        'enem_inscritos': args.enem_inscritos,
+        'params': params,
+        'runs': [],
+    }
+    for alunos in args.scales:
+        print(f"Loading alunos={alunos}...")
+        load_s = load_scale(args.load, alunos, extra)
+        with psycopg.connect(args.load, autocommit=True) as conn:
+            escola = conn.execute('SELECT id FROM escolas ORDER BY id LIMIT 1').fetchone()
+            # Claims as the Clerk session carries them (see queryWithTenant in lib/db.ts)
+            claims = {'sub': 'bench', 'metadata': {'escola_id': str(escola[0]) if escola else None, 'role': 'admin'}}
+            print(f"Loaded alunos={alunos} in {load_s:.1f}s; replaying {len(queries)} queries...")
+            run = {'alunos': alunos, 'load_s': round(load_s, 2), 'tables': table_sizes(conn),
+                   'queries': run_catalog(conn, queries, params, claims, args, alunos)}
+        results['runs'].append(run)
+
+    print_scaling(results['runs'])
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results saved to {args.out} (plans in {args.plans_dir})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Build the pre-tiled map aggregates from a students or restaurants CSV.
+
+    python build_map_tiles.py out/alunos.csv --out-dir out/
+    python build_map_tiles.py out_bi/dim_alunos.csv --escola-id <uuid> --load postgresql://...
+    python build_map_tiles.py amostra_restaurants.csv --preset restaurantes --zooms 11,13,15
+
+generate_final_data.py writes rollup_mapa_alunos in its full runs. Use this
+script for other inputs: generate_bi_data.py's dim_alunos, alunos.csv after
+``--append`` runs (evasões change the counts), or an export of
+amostra_restaurants (``\\copy amostra_restaurants TO ... CSV HEADER``).
+The input may be .csv.gz/.csv.zst. See ``datagen.tiles`` for the layout.
+"""
+import argparse
+
+from datagen import tiles
+from datagen.instrument import RunManifest
+from datagen.writers import CsvSource, open_sink, CHUNK_SIZE
+
+_TILE = {'zoom': 'integer', 'tile_x': 'integer', 'tile_y': 'integer'}
+_CENTROID = {'latitude': 'numeric(9,6)', 'longitude': 'numeric(9,6)'}
+
+TABLES = {'alunos': 'rollup_mapa_alunos', 'restaurantes': 'amostra_restaurants_tiles'}
+SCHEMAS = {
+    'rollup_mapa_alunos': {'escola_id': 'uuid', **_TILE, 'alunos': 'integer',
+                           **{m: 'integer' for m in tiles.ALUNO_MEASURES}, **_CENTROID},
+    'amostra_restaurants_tiles': {**_TILE, 'restaurantes': 'integer', 'disponiveis': 'integer',
+                                  'avaliacao_media': 'numeric(3,2)', **_CENTROID},
+}
+
+
+def aluno_tiles(rows, zooms, escola_id=None):
+    acc = tiles.new_tiles(['escola_id'], tiles.ALUNO_MEASURES)
+    for aluno in rows:
+        tiles.add_aluno(acc, (aluno.get('escola_id') or escola_id,), aluno, zooms)
+    for row in tiles.tile_rows(acc, 'alunos'):
+        yield {k: row[k] for k in SCHEMAS['rollup_mapa_alunos']}
+
+
+def restaurante_tiles(rows, zooms):
+    acc = tiles.new_tiles([], tiles.RESTAURANTE_MEASURES)
+    for restaurante in rows:
+        tiles.add_restaurante(acc, (), restaurante, zooms)
+    for row in tiles.tile_rows(acc, 'restaurantes'):
+        n = row.pop('avaliados')
+        row['avaliacao_media'] = round(row.pop('soma_avaliacao') / n, 2) if n else None
+        yield {k: row[k] for k in SCHEMAS['amostra_restaurants_tiles']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera os agregados por tile (z/x/y) dos mapas de alunos e restaurantes.')
+    parser.add_argument('csv', help='alunos.csv / dim_alunos.csv ou export de amostra_restaurants (também .gz/.zst)')
+    parser.add_argument('--preset', choices=sorted(TABLES), default='alunos',
+                        help='alunos: contagem por status de matrícula e bolsistas; restaurantes: disponíveis e nota média')
+    parser.add_argument('--zooms', default=','.join(map(str, tiles.ZOOMS)),
+                        help=f"Níveis de zoom separados por vírgula (padrão: {','.join(map(str, tiles.ZOOMS))})")
+    parser.add_argument('--escola-id', help='escola_id dos alunos quando o arquivo não tem a coluna (dim_alunos)')
+    parser.add_argument('--out-dir', default='.', help='Diretório de saída')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por lote de escrita')
+    parser.add_argument('--load', metavar='POSTGRES_URL', help='Carrega a tabela direto no Postgres via COPY')
+    parser.add_argument('--load-format', choices=['text', 'binary'], default='text', help='Formato do COPY (com --load)')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Formato do arquivo (parquet/arrow requer pyarrow)')
+    args = parser.parse_args()
+    try:
+        zooms = tiles.parse_zooms(args.zooms)
+    except ValueError as e:
+        parser.error(str(e))
+
+    name = TABLES[args.preset]
+    manifest = RunManifest(args.out_dir)
+    sink = manifest.wrap(open_sink(args.out_dir, args.chunk_size, args.load, args.load_format, fmt=args.format,
+                                   schemas=SCHEMAS))
+    sink.prepare([name])
+    try:
+        rows = CsvSource(args.csv)
+        print(f"Tiling {args.csv} at zooms {','.join(map(str, zooms))}...")
+        with manifest.stage(name):
+            if args.preset == 'alunos':
+                sink.write_rows(name, aluno_tiles(rows, zooms, args.escola_id))
+            else:
+                sink.write_rows(name, restaurante_tiles(rows, zooms))
+    finally:
+        sink.finish()
+        manifest.save()
+    print("Done!")
+
+
+if __name__ == '__main__':
+    main()
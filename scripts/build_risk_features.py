@@ -0,0 +1,116 @@
+"""Recompute aluno_risk_features from the fact tables, for every student or only some.
+
+    python build_risk_features.py --out-dir out/
+    python build_risk_features.py --out-dir out/ --eventos eventos.ndjson
+    python build_risk_features.py --load postgresql://localhost/ensitec --eventos eventos-*.ndjson
+    python build_risk_features.py --load postgresql://localhost/ensitec --alunos-ids <uuid>,<uuid>
+
+generate_final_data.py writes aluno_risk_features in its full runs and
+recomputes it after its ``--append`` runs. When the facts change otherwise
+(a simulate_events.py stream, edits in the database) this rebuilds it
+from alunos, desempenho_academico, financeiro_mensalidades and
+metricas_mensais, read from the CSVs in --out-dir (also .csv.gz/.csv.zst
+with --compress, or partitioned by generate_final_data.py --partition) or
+from the database (--load).
+
+With --eventos (NDJSON streams recorded by simulate_events.py) or
+--alunos-ids only the students they touch are recomputed: just their facts
+are read (through the aluno_id indexes, in the database) and just their
+rows replaced, in place in the CSV or upserted in the database. An event
+on metricas_mensais changes every student's unit NPS, so it recomputes
+them all. Databases created from supabase_schema.sql alone lack a few
+columns: without desempenho_academico.bimestre the grade periods are
+years, without taxa_entrega_atividades entrega_media stays blank and
+without alunos.unidade / metricas_mensais.unidade_escolar the NPS and
+health score are the school's. See ``datagen.risk`` for the features and
+the score.
+"""
+import argparse
+import os
+
+from datagen.cache import release
+from datagen.events import read_ndjson
+from datagen.instrument import RunManifest
+from datagen.partitions import read_manifest
+from datagen.risk import collect, csv_rows, db_rows
+from datagen.writers import block_rows, open_sink, CHUNK_SIZE
+from generate_final_data import ESCOLA_ID, PARTITIONS, SCHEMAS, START_DATE
+
+NAME = 'aluno_risk_features'
+
+
+def touched_students(paths):
+    """Ids of the students the events of ``paths`` change; None when every student is affected."""
+    ids = set()
+    for path in paths:
+        for e in read_ndjson(path):
+            if e['table'] == 'metricas_mensais':
+                return None
+            if e['table'] == 'alunos':
+                ids.add(e['key']['id'])
+            else:
+                aluno = e['key'].get('aluno_id') or e['values'].get('aluno_id')
+                if aluno:
+                    ids.add(aluno)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recalcula aluno_risk_features (features e score de risco por aluno) '
+                                                 'a partir das tabelas de fatos.')
+    parser.add_argument('--out-dir', default='.', help='Diretório dos CSVs de entrada e saída')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help='Os CSVs são .csv.gz/.csv.zst')
+    parser.add_argument('--load', metavar='POSTGRES_URL',
+                        help='Lê os fatos do Postgres e grava a tabela nele em vez dos CSVs')
+    parser.add_argument('--eventos', nargs='+', metavar='NDJSON',
+                        help='Só os alunos alterados por estes eventos de simulate_events.py')
+    parser.add_argument('--alunos-ids', help='Só estes alunos (ids separados por vírgula)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por lote de escrita')
+    args = parser.parse_args()
+    if args.eventos and args.alunos_ids:
+        parser.error('use --eventos ou --alunos-ids, não os dois')
+
+    ids = None
+    if args.alunos_ids:
+        ids = {s.strip() for s in args.alunos_ids.split(',') if s.strip()}
+    elif args.eventos:
+        ids = touched_students(args.eventos)
+        if ids is None:
+            print("The events change metricas_mensais: recomputing every aluno")
+        elif not ids:
+            print("No aluno changed by the events")
+            return
+
+    manifest = RunManifest(args.out_dir)
+    # Written back in the layout it has: flat files or partitions
+    partitioned = not args.load and read_manifest(os.path.join(args.out_dir, NAME)) is not None
+    sink = manifest.wrap(open_sink(args.out_dir, args.chunk_size, args.load, fmt='csv', schemas=SCHEMAS,
+                                   compression=args.compress, partitions=partitioned and PARTITIONS,
+                                   tenant=ESCOLA_ID))
+    try:
+        with manifest.stage(NAME):
+            sources = db_rows(args.load, ids) if args.load else csv_rows(args.out_dir, args.compress)
+            facts = collect(sources, START_DATE, ids)
+            if ids is None:
+                if not args.load:
+                    # The file may have been restored from generate_final_data.py's table cache
+                    release(sink.path(NAME))
+                sink.prepare([NAME])
+                sink.write_blocks(NAME, facts.blocks())
+            elif args.load:
+                sink.upsert_rows(NAME, 'aluno_id', block_rows(facts.blocks()))
+            else:
+                updated = sink.update_rows(NAME, 'aluno_id', list(block_rows(facts.blocks())))
+                if updated < len(facts):
+                    print(f"{len(facts) - updated} alunos are not in {sink.path(NAME)}: "
+                          f"run without --eventos/--alunos-ids to rebuild it")
+            if len(facts) < len(ids or ()):
+                print(f"Skipped {len(ids) - len(facts)} ids not found in alunos")
+    finally:
+        sink.finish()
+        manifest.save(incremental=ids is not None)
+    print("Done!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,440 @@
+-- Catálogo das consultas das rotas app/api/dashboard/*/route.ts e app/api/enem/*/route.ts,
+-- replicadas por scripts/bench_queries.py. Manter em sincronia com as rotas.
+--
+-- Cada consulta começa com "-- name:" e "-- route:". Parâmetros usam %(nome)s; uma lista
+-- (bairros) vira um placeholder por item, como a rota de escolas monta o IN (...).
+-- Rotas de app/api/dashboard rodam como queryWithTenant (request.jwt.claims na transação).
+-- Fora do catálogo: app/api/enem/debug (information_schema) e as métricas de
+-- app/api/dashboard/analytics que ainda respondem com dados mock.
+
+-- name: academico/disciplinas
+-- route: app/api/dashboard/academico/route.ts
+SELECT
+    disciplina as name,
+    CAST(AVG(media_final) AS NUMERIC(10,1)) as val
+FROM desempenho_academico
+GROUP BY disciplina
+ORDER BY val DESC;
+
+-- name: academico/medias
+-- route: app/api/dashboard/academico/route.ts
+SELECT
+    CAST(AVG(media_final) AS NUMERIC(10,1)) as media_global,
+    CAST(AVG(percentual_presenca) AS NUMERIC(10,1)) as frequencia_media
+FROM desempenho_academico;
+
+-- name: academico/aprovacao
+-- route: app/api/dashboard/academico/route.ts
+SELECT
+    COUNT(*) as total,
+    SUM(CASE WHEN media_final >= 6.0 AND percentual_presenca >= 75 THEN 1 ELSE 0 END) as aprovados
+FROM desempenho_academico;
+
+-- name: academico/risco
+-- route: app/api/dashboard/academico/route.ts
+SELECT COUNT(DISTINCT aluno_id) as risk_count
+FROM desempenho_academico
+WHERE media_final < 6.0 OR percentual_presenca < 75;
+
+-- name: academico/histograma
+-- route: app/api/dashboard/academico/route.ts
+SELECT
+    floor(media_final) as bucket,
+    COUNT(*) as count
+FROM desempenho_academico
+GROUP BY floor(media_final)
+ORDER BY bucket;
+
+-- name: academico/evolucao
+-- route: app/api/dashboard/academico/route.ts
+SELECT
+    to_char(mes_referencia, 'Mon') as month,
+    valor as media
+FROM metricas_mensais
+WHERE tipo_metrica = 'health_score'
+ORDER BY mes_referencia ASC
+LIMIT 12;
+
+-- name: academico/crescimento
+-- route: app/api/dashboard/academico/route.ts
+WITH last_two AS (
+    SELECT valor, tipo_metrica, row_number() OVER (PARTITION BY tipo_metrica ORDER BY mes_referencia DESC) as rn
+    FROM metricas_mensais
+    WHERE tipo_metrica IN ('nps', 'health_score', 'uptime_ti')
+)
+SELECT
+    tipo_metrica,
+    valor as current_val,
+    LAG(valor) OVER (PARTITION BY tipo_metrica ORDER BY rn DESC) as prev_val
+FROM last_two
+WHERE rn <= 2;
+
+-- name: analytics/total-students
+-- route: app/api/dashboard/analytics/route.ts
+SELECT a.unidade as unit_label, a.turma as class_label, COUNT(*) as value FROM alunos a WHERE a.status_matricula != 'Evadido' GROUP BY a.unidade, a.turma;
+
+-- name: analytics/scholarships
+-- route: app/api/dashboard/analytics/route.ts
+SELECT a.unidade as unit_label, a.turma as class_label, COUNT(*) as value FROM alunos a WHERE a.bolsista = true AND a.status_matricula != 'Evadido' GROUP BY a.unidade, a.turma;
+
+-- name: analytics/occupancy
+-- route: app/api/dashboard/analytics/route.ts
+SELECT turma as class_label, COUNT(*) as value FROM alunos WHERE status_matricula != 'Evadido' GROUP BY turma;
+
+-- name: analytics/demography-gender
+-- route: app/api/dashboard/analytics/route.ts
+SELECT a.unidade as unit_label, a.genero as name, COUNT(*) as value FROM alunos a WHERE a.status_matricula != 'Evadido' GROUP BY a.unidade, a.genero;
+
+-- name: analytics/demography-race
+-- route: app/api/dashboard/analytics/route.ts
+SELECT a.unidade as unit_label, a.cor_raca as name, COUNT(*) as value FROM alunos a WHERE a.status_matricula != 'Evadido' GROUP BY a.unidade, a.cor_raca;
+
+-- name: analytics/demography-income
+-- route: app/api/dashboard/analytics/route.ts
+SELECT a.unidade as unit_label, a.faixa_renda as name, COUNT(*) as value FROM alunos a WHERE a.status_matricula != 'Evadido' GROUP BY a.unidade, a.faixa_renda;
+
+-- name: analytics/demography-age
+-- route: app/api/dashboard/analytics/route.ts
+SELECT
+    a.unidade as unit_label,
+    CASE
+        WHEN extract(year from age(current_date, data_nascimento)) BETWEEN 0 AND 6 THEN '4-6 anos'
+        WHEN extract(year from age(current_date, data_nascimento)) BETWEEN 7 AND 10 THEN '7-10 anos'
+        WHEN extract(year from age(current_date, data_nascimento)) BETWEEN 11 AND 14 THEN '11-14 anos'
+        ELSE '15-18 anos'
+    END as name,
+    COUNT(*) as value
+FROM alunos a
+WHERE a.status_matricula != 'Evadido'
+GROUP BY a.unidade, name;
+
+-- name: analytics/demography-neighborhood
+-- route: app/api/dashboard/analytics/route.ts
+SELECT a.unidade as unit_label, a.cidade_aluno as name, COUNT(*) as value FROM alunos a WHERE a.status_matricula != 'Evadido' GROUP BY a.unidade, a.cidade_aluno;
+
+-- name: analytics/locations
+-- route: app/api/dashboard/analytics/route.ts
+SELECT a.id, a.latitude as lat, a.longitude as lng, a.segmento as segment, extract(year from age(current_date, a.data_nascimento)) as age FROM alunos a WHERE a.status_matricula != 'Evadido' AND a.latitude IS NOT NULL;
+
+-- name: clientes/status
+-- route: app/api/dashboard/clientes/route.ts
+SELECT status_matricula, COUNT(*) as count FROM alunos GROUP BY status_matricula;
+
+-- name: clientes/genero
+-- route: app/api/dashboard/clientes/route.ts
+SELECT genero, COUNT(*) as count FROM alunos GROUP BY genero;
+
+-- name: clientes/turmas
+-- route: app/api/dashboard/clientes/route.ts
+SELECT turma as name, COUNT(*) as occupied FROM alunos WHERE status_matricula ILIKE 'ativo' GROUP BY turma ORDER BY turma;
+
+-- name: clientes/cidades
+-- route: app/api/dashboard/clientes/route.ts
+SELECT COALESCE(nullif(trim(cidade_aluno), ''), 'Unidade', 'Indefinido') as name, COUNT(id) as value FROM alunos GROUP BY 1 ORDER BY value DESC LIMIT 5;
+
+-- name: clientes/idades
+-- route: app/api/dashboard/clientes/route.ts
+SELECT CASE WHEN EXTRACT(YEAR FROM age(data_nascimento)) BETWEEN 0 AND 5 THEN '0-5' WHEN EXTRACT(YEAR FROM age(data_nascimento)) BETWEEN 6 AND 10 THEN '6-10' WHEN EXTRACT(YEAR FROM age(data_nascimento)) BETWEEN 11 AND 14 THEN '11-14' WHEN EXTRACT(YEAR FROM age(data_nascimento)) BETWEEN 15 AND 18 THEN '15-18' ELSE '18+' END as age_group, COUNT(*) as count FROM alunos GROUP BY age_group;
+
+-- name: clientes/cor-raca
+-- route: app/api/dashboard/clientes/route.ts
+SELECT cor_raca, COUNT(*) as count FROM alunos GROUP BY cor_raca;
+
+-- name: clientes/renda
+-- route: app/api/dashboard/clientes/route.ts
+SELECT faixa_renda, COUNT(*) as count FROM alunos GROUP BY faixa_renda;
+
+-- name: clientes/totais
+-- route: app/api/dashboard/clientes/route.ts
+SELECT COUNT(*) as total, COUNT(*) FILTER (WHERE status_matricula ILIKE 'ativo') as ativos, COUNT(*) FILTER (WHERE status_matricula ILIKE 'evadido') as evadidos, COUNT(*) FILTER (WHERE bolsista = true) as bolsistas, COUNT(*) FILTER (WHERE tem_irmaos = true) as com_irmaos FROM alunos;
+
+-- name: clientes/metricas
+-- route: app/api/dashboard/clientes/route.ts
+SELECT DISTINCT ON (tipo_metrica) tipo_metrica, valor FROM metricas_mensais WHERE tipo_metrica IN ('nps', 'health_score') ORDER BY tipo_metrica, mes_referencia DESC;
+
+-- name: financeiro/fluxo-caixa
+-- route: app/api/dashboard/financeiro/route.ts
+SELECT
+    to_char(mes_referencia, 'Mon') as month,
+    SUM(CASE WHEN status_pagamento ILIKE 'pago' THEN valor ELSE 0 END) as receita,
+    SUM(CASE WHEN status_pagamento NOT ILIKE 'pago' THEN valor ELSE 0 END) as pendente,
+    SUM(valor) as total
+FROM financeiro_mensalidades
+GROUP BY mes_referencia, to_char(mes_referencia, 'Mon')
+ORDER BY MIN(mes_referencia) ASC
+LIMIT 12;
+
+-- name: financeiro/kpis
+-- route: app/api/dashboard/financeiro/route.ts
+SELECT
+    SUM(valor) as total_geral,
+    SUM(CASE WHEN status_pagamento ILIKE 'pago' THEN valor ELSE 0 END) as total_pago,
+    SUM(CASE WHEN status_pagamento ILIKE 'atrasado' THEN valor ELSE 0 END) as total_atrasado,
+    COUNT(*) as total_transacoes,
+    CAST(SUM(CASE WHEN status_pagamento ILIKE 'atrasado' THEN 1 ELSE 0 END) * 100.0 / NULLIF(COUNT(*), 0) AS NUMERIC(10,2)) as taxa_inadimplencia
+FROM financeiro_mensalidades;
+
+-- name: financeiro/despesas
+-- route: app/api/dashboard/financeiro/route.ts
+SELECT
+    categoria as name,
+    SUM(valor) as value
+FROM financeiro_despesas
+GROUP BY categoria
+ORDER BY value DESC;
+
+-- name: financeiro/transacoes-recentes
+-- route: app/api/dashboard/financeiro/route.ts
+SELECT
+    f.id,
+    a.nome_completo as desc,
+    to_char(f.created_at, 'DD/MM, HH24:MI') as date,
+    f.valor as amount,
+    f.status_pagamento as type
+FROM financeiro_mensalidades f
+JOIN alunos a ON f.aluno_id = a.id
+ORDER BY f.created_at DESC
+LIMIT 5;
+
+-- name: financeiro/crescimento
+-- route: app/api/dashboard/financeiro/route.ts
+WITH monthly_totals AS (
+    SELECT
+        date_trunc('month', mes_referencia) as month,
+        SUM(valor) as total
+    FROM financeiro_mensalidades
+    GROUP BY 1
+    ORDER BY 1 DESC
+    LIMIT 2
+)
+SELECT
+    total as current_val,
+    LEAD(total) OVER (ORDER BY month DESC) as prev_val
+FROM monthly_totals;
+
+-- name: map/unidades
+-- route: app/api/dashboard/map/route.ts
+SELECT
+    a.unidade as id,
+    a.unidade as name,
+    MAX(COALESCE(nullif(trim(a.cidade_aluno), ''), e.cidade)) as city,
+    COUNT(a.id) as students
+FROM alunos a
+JOIN escolas e ON e.id = a.escola_id
+GROUP BY a.unidade;
+
+-- name: operacional/ocupacao
+-- route: app/api/dashboard/operacional/route.ts
+SELECT
+    turma,
+    COUNT(*) as count
+FROM alunos
+WHERE status_matricula = 'Ativo'
+GROUP BY turma;
+
+-- name: operacional/metricas
+-- route: app/api/dashboard/operacional/route.ts
+SELECT DISTINCT ON (tipo_metrica)
+    tipo_metrica, valor, unidade
+FROM metricas_mensais
+ORDER BY tipo_metrica, mes_referencia DESC;
+
+-- name: operacional/chamados-abertos
+-- route: app/api/dashboard/operacional/route.ts
+SELECT COUNT(*) as count
+FROM operacional_chamados
+WHERE status NOT ILIKE 'resolvido';
+
+-- name: operacional/custos
+-- route: app/api/dashboard/operacional/route.ts
+SELECT
+    to_char(data_despesa, 'Mon') as month,
+    SUM(CASE WHEN categoria = 'Energia' THEN valor ELSE 0 END) as energia,
+    SUM(CASE WHEN categoria = 'Manutenção' THEN valor ELSE 0 END) as manutencao,
+    SUM(CASE WHEN categoria = 'Insumos' THEN valor ELSE 0 END) as insumos
+FROM financeiro_despesas
+GROUP BY to_char(data_despesa, 'Mon'), date_trunc('month', data_despesa)
+ORDER BY date_trunc('month', data_despesa) ASC
+LIMIT 12;
+
+-- name: operacional/chamados-semana
+-- route: app/api/dashboard/operacional/route.ts
+SELECT
+    to_char(data_abertura, 'Dy') as name,
+    COUNT(*) FILTER (WHERE status != 'Resolvido') as abertos,
+    COUNT(*) FILTER (WHERE status = 'Resolvido') as resolvidos,
+    date_part('dow', data_abertura) as dow
+FROM operacional_chamados
+GROUP BY 1, 4
+ORDER BY 4 ASC;
+
+-- name: overview/academico
+-- route: app/api/dashboard/overview/route.ts
+SELECT
+    AVG(percentual_presenca) as frequencia,
+    AVG(media_final) as media_global
+FROM desempenho_academico;
+
+-- name: overview/receita
+-- route: app/api/dashboard/overview/route.ts
+SELECT SUM(valor) as total FROM financeiro_mensalidades
+WHERE status_pagamento ILIKE 'pago';
+
+-- name: overview/despesa
+-- route: app/api/dashboard/overview/route.ts
+SELECT SUM(valor) as total FROM financeiro_despesas;
+
+-- name: overview/alunos-ativos
+-- route: app/api/dashboard/overview/route.ts
+SELECT COUNT(*) as total FROM alunos
+WHERE status_matricula ILIKE 'ativo' OR status_matricula ILIKE 'matriculado';
+
+-- name: overview/chamados-abertos
+-- route: app/api/dashboard/overview/route.ts
+SELECT COUNT(*) as total FROM operacional_chamados
+WHERE status ILIKE 'aberto' OR status ILIKE 'em_andamento' OR status ILIKE 'pendente';
+
+-- name: enem/stats-nacional
+-- route: app/api/enem/stats/route.ts
+SELECT
+    (SELECT SUM("count_redacao") FROM enem_agregado_estado WHERE "avg_redacao" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as total,
+    (SELECT ROUND(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0))::INTEGER
+     FROM enem_agregado_estado WHERE "avg_cn" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as media_cn,
+    (SELECT SUM("count_cn") FROM enem_agregado_estado WHERE "avg_cn" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as count_cn,
+    (SELECT ROUND(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0))::INTEGER
+     FROM enem_agregado_estado WHERE "avg_ch" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as media_ch,
+    (SELECT SUM("count_ch") FROM enem_agregado_estado WHERE "avg_ch" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as count_ch,
+    (SELECT ROUND(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0))::INTEGER
+     FROM enem_agregado_estado WHERE "avg_lc" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as media_lc,
+    (SELECT SUM("count_lc") FROM enem_agregado_estado WHERE "avg_lc" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as count_lc,
+    (SELECT ROUND(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0))::INTEGER
+     FROM enem_agregado_estado WHERE "avg_mt" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as media_mt,
+    (SELECT SUM("count_mt") FROM enem_agregado_estado WHERE "avg_mt" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as count_mt,
+    (SELECT ROUND(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0))::INTEGER
+     FROM enem_agregado_estado WHERE "avg_redacao" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as media_redacao,
+    (SELECT SUM("count_redacao") FROM enem_agregado_estado WHERE "avg_redacao" > 0 AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)) as count_redacao;
+
+-- name: enem/stats-estados
+-- route: app/api/enem/stats/route.ts
+SELECT
+    "SG_UF_PROVA" as uf,
+    ROUND(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0))::INTEGER as media_mt,
+    SUM("count_mt") as "count_mt",
+    ROUND(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0))::INTEGER as media_cn,
+    SUM("count_cn") as "count_cn",
+    ROUND(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0))::INTEGER as media_ch,
+    SUM("count_ch") as "count_ch",
+    ROUND(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0))::INTEGER as media_lc,
+    SUM("count_lc") as "count_lc",
+    ROUND(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0))::INTEGER as media_redacao,
+    SUM("count_redacao") as "count_redacao",
+    SUM("count_redacao") as total_alunos
+FROM enem_agregado_estado
+WHERE "avg_mt" > 0 AND "avg_cn" > 0 AND "avg_ch" > 0 AND "avg_lc" > 0 AND "avg_redacao" > 0
+AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)
+GROUP BY "SG_UF_PROVA"
+ORDER BY media_mt DESC;
+
+-- name: enem/cidades
+-- route: app/api/enem/cidades/route.ts
+SELECT
+    "NO_MUNICIPIO_PROVA" as cidade,
+    ROUND(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0))::INTEGER as media_mt,
+    SUM("count_mt") as "count_mt",
+    ROUND(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0))::INTEGER as media_cn,
+    SUM("count_cn") as "count_cn",
+    ROUND(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0))::INTEGER as media_ch,
+    SUM("count_ch") as "count_ch",
+    ROUND(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0))::INTEGER as media_lc,
+    SUM("count_lc") as "count_lc",
+    ROUND(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0))::INTEGER as media_redacao,
+    SUM("count_redacao") as "count_redacao",
+    SUM("count_redacao") as total_alunos
+FROM enem_agregado_cidade
+WHERE "SG_UF_PROVA" = %(uf)s
+  AND "avg_mt" > 0 AND "avg_cn" > 0 AND "avg_ch" > 0 AND "avg_lc" > 0 AND "avg_redacao" > 0
+  AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)
+GROUP BY "NO_MUNICIPIO_PROVA"
+ORDER BY media_mt DESC;
+
+-- name: enem/cidades-estado
+-- route: app/api/enem/cidades/route.ts
+SELECT
+    ROUND(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0))::INTEGER as media_mt,
+    SUM("count_mt") as "count_mt",
+    ROUND(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0))::INTEGER as media_cn,
+    SUM("count_cn") as "count_cn",
+    ROUND(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0))::INTEGER as media_ch,
+    SUM("count_ch") as "count_ch",
+    ROUND(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0))::INTEGER as media_lc,
+    SUM("count_lc") as "count_lc",
+    ROUND(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0))::INTEGER as media_redacao,
+    SUM("count_redacao") as "count_redacao",
+    SUM("count_redacao") as total_alunos
+FROM enem_agregado_estado
+WHERE "SG_UF_PROVA" = %(uf)s
+  AND "avg_mt" > 0 AND "avg_cn" > 0 AND "avg_ch" > 0 AND "avg_lc" > 0 AND "avg_redacao" > 0
+  AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)
+GROUP BY "SG_UF_PROVA";
+
+-- name: enem/bairros
+-- route: app/api/enem/bairros/route.ts
+SELECT
+    UPPER("NO_BAIRRO") as bairro,
+    ROUND(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0))::INTEGER as media_mt,
+    SUM("count_mt") as count_mt,
+    ROUND(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0))::INTEGER as media_cn,
+    SUM("count_cn") as count_cn,
+    ROUND(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0))::INTEGER as media_ch,
+    SUM("count_ch") as count_ch,
+    ROUND(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0))::INTEGER as media_lc,
+    SUM("count_lc") as count_lc,
+    ROUND(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0))::INTEGER as media_redacao,
+    SUM("count_redacao") as count_redacao,
+    ROUND((
+        COALESCE(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0), 0) +
+        COALESCE(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0), 0) +
+        COALESCE(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0), 0) +
+        COALESCE(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0), 0) +
+        COALESCE(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0), 0)
+    ) / 5)::INTEGER as media_geral
+FROM enem_agregado_bairro
+WHERE UPPER("SG_UF_PROVA") = UPPER(%(uf)s)
+  AND UPPER("NO_MUNICIPIO_PROVA") = UPPER(%(cidade)s)
+  AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)
+  AND "NO_BAIRRO" IS NOT NULL
+  AND "NO_BAIRRO" <> ''
+  AND "avg_mt" > 0
+GROUP BY UPPER("NO_BAIRRO")
+ORDER BY media_geral DESC NULLS LAST;
+
+-- name: enem/escolas
+-- route: app/api/enem/escolas/route.ts
+SELECT
+    "NO_ENTIDADE" as escola,
+    UPPER("NO_BAIRRO") as bairro,
+    ROUND(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0))::INTEGER as media_mt,
+    SUM("count_mt") as count_mt,
+    ROUND(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0))::INTEGER as media_cn,
+    SUM("count_cn") as count_cn,
+    ROUND(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0))::INTEGER as media_ch,
+    SUM("count_ch") as count_ch,
+    ROUND(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0))::INTEGER as media_lc,
+    SUM("count_lc") as count_lc,
+    ROUND(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0))::INTEGER as media_redacao,
+    SUM("count_redacao") as count_redacao,
+    ROUND((
+        COALESCE(SUM("avg_mt" * "count_mt") / NULLIF(SUM("count_mt"), 0), 0) +
+        COALESCE(SUM("avg_cn" * "count_cn") / NULLIF(SUM("count_cn"), 0), 0) +
+        COALESCE(SUM("avg_ch" * "count_ch") / NULLIF(SUM("count_ch"), 0), 0) +
+        COALESCE(SUM("avg_lc" * "count_lc") / NULLIF(SUM("count_lc"), 0), 0) +
+        COALESCE(SUM("avg_redacao" * "count_redacao") / NULLIF(SUM("count_redacao"), 0), 0)
+    ) / 5)::INTEGER as media_geral
+FROM enem_agregado_escola
+WHERE UPPER("SG_UF_PROVA") = UPPER(%(uf)s)
+  AND UPPER("NO_MUNICIPIO_PROVA") = UPPER(%(cidade)s)
+  AND (%(tp_escola)s::text IS NULL OR "tp_escola_label" = %(tp_escola)s)
+  AND UPPER("NO_BAIRRO") IN (%(bairros)s)
+  AND "NO_ENTIDADE" IS NOT NULL
+GROUP BY "NO_ENTIDADE", UPPER("NO_BAIRRO")
+ORDER BY media_geral DESC NULLS LAST;
@@ -0,0 +1 @@
+"""Shared helpers for the synthetic data generators in ``scripts/``."""
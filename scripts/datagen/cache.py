@@ -0,0 +1,175 @@
+"""Content-addressed cache of finished table files.
+
+CI and preview deployments regenerate the same demo data many times a day.
+Each table's output is stored under a key hashing everything it is drawn
+from: the table name, the seed, the options that shape the file (scale,
+engine, format, compression...), the generator's constants, the source of
+the generator and of ``datagen``, and the keys of the tables it is built
+from (so a change to alunos invalidates its facts and their rollups). When
+the key is already in the cache the files are hard-linked into the output
+directory (copied across filesystems) instead of being generated again.
+
+Entries live in ``<cache_dir()>/tables/<key>/`` with an ``entry.json``
+listing their files; an entry is used as a whole or not at all. Hits touch
+the entry, and ``evict`` removes the least recently used entries beyond the
+size limit. A restored file shares its inode with the cache, so it must be
+unlinked (``release``) or copied (``unshare``) before it is rewritten in
+place; the generators do so before writing.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from datagen.pools import cache_dir
+
+CACHE_VERSION = 1
+MAX_MB = 2048
+ENTRY_FILE = 'entry.json'
+
+
+def source_hash(*paths):
+    """sha256 of the given source files, and of every ``.py`` file in the given directories."""
+    digest = hashlib.sha256()
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.py'))
+        else:
+            files.append(path)
+    for path in files:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def table_keys(tables, depends, configs, code):
+    """Key of each of ``tables``: its name, its ``configs`` entry, ``code`` and its dependencies' keys (``depends``)."""
+    keys = {}
+
+    def key(name):
+        if name not in keys:
+            doc = {'version': CACHE_VERSION, 'table': name, 'config': configs[name], 'code': code,
+                   'depends': sorted(key(d) for d in depends.get(name, ()))}
+            blob = json.dumps(doc, sort_keys=True, default=str).encode()
+            keys[name] = hashlib.sha256(blob).hexdigest()
+        return keys[name]
+    for name in tables:
+        key(name)
+    return keys
+
+
+def _place(src, dst):
+    """Hard-link ``src`` to ``dst`` (replacing it), or copy it where links are not possible."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp = f'{dst}.{os.getpid()}.tmp'
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def release(path):
+    """Unlink ``path`` if it is shared with the cache, so writing it anew cannot change the entry."""
+    if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+        os.unlink(path)
+
+
+def unshare(path):
+    """Give ``path`` an inode of its own if it is shared with the cache, before appending to it."""
+    if os.path.isfile(path) and os.stat(path).st_nlink > 1:
+        tmp = f'{path}.{os.getpid()}.tmp'
+        shutil.copy2(path, tmp)
+        os.replace(tmp, path)
+
+
+class TableCache:
+    """The cache directory and its size limit (``max_mb``)."""
+
+    def __init__(self, root=None, max_mb=MAX_MB):
+        self.root = root or os.path.join(cache_dir(), 'tables')
+        self.max_bytes = int(max_mb * 2**20)
+
+    def _entry(self, key):
+        return os.path.join(self.root, key)
+
+    def _read(self, key):
+        try:
+            with open(os.path.join(self._entry(key), ENTRY_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def restore(self, key, out_dir):
+        """Place entry ``key``'s files in ``out_dir``; return their paths, or None on a miss."""
+        entry = self._read(key)
+        if entry is None:
+            return None
+        src = self._entry(key)
+        files = entry['files']
+        # A damaged entry (a file missing or of another size) is a miss, and is dropped
+        if any(os.path.getsize(os.path.join(src, f)) != size if os.path.isfile(os.path.join(src, f)) else True
+               for f, size in files.items()):
+            shutil.rmtree(src, ignore_errors=True)
+            return None
+        os.makedirs(out_dir, exist_ok=True)
+        placed = []
+        for f in files:
+            _place(os.path.join(src, f), os.path.join(out_dir, f))
+            placed.append(os.path.join(out_dir, f))
+        os.utime(os.path.join(src, ENTRY_FILE))
+        return placed
+
+    def store(self, key, table, paths):
+        """Keep ``paths`` (the finished files of ``table``) as entry ``key``; return the bytes stored."""
+        paths = [p for p in paths if os.path.isfile(p)]
+        if not paths or os.path.isdir(self._entry(key)):
+            return 0
+        tmp = f'{self._entry(key)}.{os.getpid()}.tmp'
+        os.makedirs(tmp, exist_ok=True)
+        files = {}
+        for path in paths:
+            name = os.path.basename(path)
+            _place(path, os.path.join(tmp, name))
+            files[name] = os.path.getsize(path)
+        with open(os.path.join(tmp, ENTRY_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'table': table, 'files': files, 'created_at': time.time()}, f)
+        try:
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            # Another run stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+            return 0
+        return sum(files.values())
+
+    def entries(self):
+        """``(last used, bytes, key)`` of every entry."""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for key in os.listdir(self.root):
+            entry = self._read(key)
+            if entry is None:
+                continue
+            used = os.path.getmtime(os.path.join(self._entry(key), ENTRY_FILE))
+            out.append((used, sum(entry['files'].values()), key))
+        return out
+
+    def evict(self, keep=()):
+        """Drop the least recently used entries until the cache fits ``max_bytes``; return the keys dropped."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        dropped = []
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= size
+            dropped.append(key)
+        return dropped
@@ -0,0 +1,219 @@
+"""Typed columnar output (Parquet / Arrow IPC) for the generated tables.
+
+Each table is described by a schema mapping column -> SQL type name, as in
+``supabase_schema.sql`` (``'uuid'``, ``'text'``, ``'char(2)'``, ``'date'``,
+``'timestamptz'``, ``'integer'``, ``'numeric(10,2)'``, ``'boolean'``), plus
+``'dict'`` for low-cardinality text that is stored dictionary-encoded.
+Empty strings in non-text columns become nulls.
+
+Dictionaries are shared by every batch of a file (new values are appended),
+so Arrow IPC files only ever carry dictionary deltas and readers get one
+categorical column per field. Both formats are zstd-compressed.
+
+Requires pyarrow (``pip install pyarrow``).
+"""
+import os
+import re
+from itertools import chain, islice
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+_TEXT_TYPES = ('uuid', 'text')
+_NUMERIC = re.compile(r'numeric\((\d+),\s*(\d+)\)$')
+
+
+def arrow_type(sql_type):
+    """Arrow type for a schema entry (see the module docstring)."""
+    if sql_type == 'dict':
+        return pa.dictionary(pa.int32(), pa.string())
+    if sql_type in _TEXT_TYPES or sql_type.startswith('char'):
+        return pa.string()
+    m = _NUMERIC.match(sql_type)
+    if m:
+        return pa.decimal128(int(m.group(1)), int(m.group(2)))
+    return {
+        'date': pa.date32(),
+        'timestamptz': pa.timestamp('us', tz='UTC'),
+        'integer': pa.int32(),
+        'bigint': pa.int64(),
+        'boolean': pa.bool_(),
+    }[sql_type]
+
+
+def arrow_schema(columns, table_schema):
+    """Arrow schema for ``columns`` in generator order; unknown columns are text."""
+    return pa.schema([(c, arrow_type(table_schema.get(c, 'text'))) for c in columns])
+
+
+def _blank_to_none(values):
+    return [None if v == '' else v for v in values]
+
+
+def to_array(values, type_):
+    """Convert one generated column (list or numpy array) to ``type_``."""
+    if hasattr(values, 'dtype') and values.dtype.kind != 'O':
+        arr = pa.array(values)
+    elif pa.types.is_string(type_) or pa.types.is_dictionary(type_):
+        arr = pa.array(values, pa.string())
+    else:
+        values = values.tolist() if hasattr(values, 'tolist') else values
+        arr = pa.array(_blank_to_none(values))
+
+    if pa.types.is_decimal(type_):
+        # Floats (or their repr) are rounded to the column scale first;
+        # a straight cast refuses to drop digits
+        return pc.round(arr.cast(pa.float64()), type_.scale).cast(type_)
+    if pa.types.is_timestamp(type_) and not pa.types.is_timestamp(arr.type):
+        # Dates / naive ISO strings are taken as UTC
+        return arr.cast(pa.timestamp(type_.unit)).cast(type_)
+    if pa.types.is_boolean(type_) and pa.types.is_string(arr.type):
+        return pc.equal(pc.utf8_lower(arr), 'true')
+    if pa.types.is_dictionary(type_):
+        return arr
+    return arr.cast(type_)
+
+
+class _Dictionary:
+    """Value -> code mapping for one dictionary column, grown across batches."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, arr):
+        if pa.types.is_dictionary(arr.type):
+            arr = arr.dictionary_decode()
+        batch = arr.dictionary_encode()
+        local = batch.dictionary.to_pylist()
+        for v in local:
+            if v not in self.codes:
+                self.codes[v] = len(self.values)
+                self.values.append(v)
+        remap = np.array([self.codes[v] for v in local], dtype=np.int32)
+        indices = pa.array(remap).take(batch.indices)
+        return pa.DictionaryArray.from_arrays(indices, pa.array(self.values, pa.string()))
+
+
+class ColumnarWriter:
+    """Writes record batches of one table to a Parquet or Arrow IPC file."""
+
+    def __init__(self, filename, schema, fmt):
+        self.schema = schema
+        self.dictionaries = {f.name: _Dictionary() for f in schema if pa.types.is_dictionary(f.type)}
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(filename, schema, compression='zstd',
+                                            use_dictionary=list(self.dictionaries))
+        else:
+            options = ipc.IpcWriteOptions(compression='zstd', emit_dictionary_deltas=True)
+            self._writer = ipc.new_file(filename, schema, options=options)
+
+    def write_columns(self, columns):
+        """Write a dict of raw generated columns; returns the row count."""
+        arrays = [to_array(columns[f.name], f.type) for f in self.schema]
+        return self.write_arrays(arrays)
+
+    def write_arrays(self, arrays):
+        arrays = [self.dictionaries[f.name].encode(a) if f.name in self.dictionaries else a
+                  for f, a in zip(self.schema, arrays)]
+        batch = pa.record_batch(arrays, schema=self.schema)
+        self._writer.write_batch(batch)
+        return batch.num_rows
+
+    def close(self):
+        self._writer.close()
+
+
+def read_batches(filename, fmt):
+    if fmt == 'parquet':
+        yield from pq.ParquetFile(filename).iter_batches()
+    else:
+        with ipc.open_file(filename) as reader:
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+
+def read_schema(filename, fmt):
+    if fmt == 'parquet':
+        return pq.read_schema(filename)
+    with ipc.open_file(filename) as reader:
+        return reader.schema
+
+
+class ColumnarSink:
+    """Destination that writes each table to ``<out_dir>/<name>.parquet|.arrow``.
+
+    ``schemas`` maps table name -> {column: SQL type}; see ``arrow_type``.
+    Row generators are converted ``chunk_size`` rows at a time, column
+    blocks (numpy engine) one block per record batch.
+    """
+
+    def __init__(self, out_dir='.', fmt='parquet', schemas=None, chunk_size=10000, quiet=False):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.schemas = schemas or {}
+        self.chunk_size = chunk_size
+        self.quiet = quiet
+
+    def path(self, name):
+        os.makedirs(self.out_dir, exist_ok=True)
+        return os.path.join(self.out_dir, f'{name}.{self.fmt}')
+
+    def write_rows(self, name, rows):
+        rows = iter(rows)
+
+        def blocks():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    return
+                yield {k: [r[k] for r in chunk] for k in chunk[0]}
+        return self.write_blocks(name, blocks())
+
+    def write_blocks(self, name, blocks):
+        blocks = iter(blocks)
+        first = next(blocks, None)
+        if first is None:
+            return 0
+        filename = self.path(name)
+        writer = ColumnarWriter(filename, arrow_schema(first.keys(), self.schemas.get(name, {})), self.fmt)
+        try:
+            total = sum(writer.write_columns(block) for block in chain([first], blocks))
+        finally:
+            writer.close()
+        self._report(filename, total)
+        return total
+
+    def merge(self, name, parts):
+        """Concatenate shard part files (``(path, rows)``) into one table file."""
+        parts = [p for p, rows in parts if rows]
+        filename = self.path(name)
+        total = 0
+        if parts:
+            schema = read_schema(parts[0], self.fmt)
+            writer = ColumnarWriter(filename, schema, self.fmt)
+            try:
+                for part in parts:
+                    for batch in read_batches(part, self.fmt):
+                        total += writer.write_arrays(batch.columns)
+            finally:
+                writer.close()
+        self._report(filename, total)
+        return total
+
+    def _report(self, filename, total):
+        if not self.quiet:
+            print(f"Generated {filename} ({total} rows)")
+
+    # Same lifecycle as the other sinks
+    def prepare(self, names):
+        pass
+
+    def finish(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,235 @@
+"""Compressed CSV output written as independent frames.
+
+A ``FrameWriter`` takes the CSV text as the writers produce it and cuts it
+into frames of about ``FRAME_BYTES`` at write-call boundaries, i.e. between
+rows. Each frame is compressed on a thread pool (zlib and zstd release the
+GIL) while the caller keeps generating, and written out in order as a
+complete gzip member / zstd frame. The file is therefore a plain
+``.csv.gz`` / ``.csv.zst`` any tool can read, and every frame also
+decompresses on its own into whole rows.
+
+The header is always the first frame, and a ``<file>.frames.json`` sidecar
+lists the ``[offset, length]`` of every frame. With it, appends and shard
+merges are byte copies, and loaders can decompress and COPY frames in
+parallel (see ``PgSink.copy_file``).
+
+zstd requires ``zstandard`` (``pip install zstandard``); gzip is stdlib.
+"""
+import gzip
+import io
+import json
+import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+FRAME_BYTES = 4 << 20
+LEVELS = {'gzip': 6, 'zstd': 3}
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+INDEX_SUFFIX = '.frames.json'
+
+
+def codec_for(filename):
+    """The codec of ``filename`` from its suffix, or ``None`` for plain files."""
+    for codec, suffix in SUFFIXES.items():
+        if filename.endswith(suffix):
+            return codec
+    return None
+
+
+def _threads():
+    return min(4, os.cpu_count() or 1)
+
+
+class _Zstd:
+    # zstandard (de)compressors are not thread-safe: one per thread
+    _local = threading.local()
+
+    @classmethod
+    def compress(cls, data, level):
+        import zstandard
+        cctx = getattr(cls._local, 'cctx', None)
+        if cctx is None or cls._local.level != level:
+            cctx = cls._local.cctx = zstandard.ZstdCompressor(level=level)
+            cls._local.level = level
+        return cctx.compress(data)
+
+    @classmethod
+    def decompress(cls, data):
+        import zstandard
+        dctx = getattr(cls._local, 'dctx', None)
+        if dctx is None:
+            dctx = cls._local.dctx = zstandard.ZstdDecompressor()
+        return dctx.decompress(data)
+
+
+def compress_frame(data, codec, level=None):
+    level = LEVELS[codec] if level is None else level
+    if codec == 'gzip':
+        # mtime=0: identical input gives identical bytes
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return _Zstd.compress(data, level)
+
+
+def decompress_frame(data, codec):
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    return _Zstd.decompress(data)
+
+
+def read_index(filename):
+    """The frame list of ``filename`` (header frame first), or ``None`` without a sidecar."""
+    try:
+        with open(filename + INDEX_SUFFIX, encoding='utf-8') as f:
+            return json.load(f)['frames']
+    except FileNotFoundError:
+        return None
+
+
+def _write_index(filename, codec, frames):
+    tmp = f'{filename}{INDEX_SUFFIX}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'codec': codec, 'frames': frames}, f)
+    os.replace(tmp, filename + INDEX_SUFFIX)
+
+
+def replace(src, dst):
+    """``os.replace`` for a compressed file and its sidecar."""
+    os.replace(src, dst)
+    if os.path.exists(src + INDEX_SUFFIX):
+        os.replace(src + INDEX_SUFFIX, dst + INDEX_SUFFIX)
+
+
+class FrameWriter:
+    """Text file object that writes ``filename`` as independently compressed frames.
+
+    On a new file the first ``write`` (the CSV header) is a frame of its own.
+    ``append`` continues an existing file and its sidecar. At most
+    ``2 * threads`` frames are in flight, which bounds memory and stalls the
+    caller only when compression falls behind. ``write`` also takes text
+    already encoded to UTF-8 bytes.
+    """
+
+    def __init__(self, filename, codec=None, append=False, level=None, threads=None,
+                 frame_bytes=FRAME_BYTES):
+        self.filename = filename
+        self.codec = codec or codec_for(filename)
+        self.level = level
+        self.frame_bytes = frame_bytes
+        self.frames = (read_index(filename) or []) if append else []
+        if append and os.path.exists(filename) and not self.frames and os.path.getsize(filename):
+            raise ValueError(f'{filename}: cannot append without its {INDEX_SUFFIX} sidecar')
+        self._file = open(filename, 'ab' if append else 'wb')
+        self._offset = self._file.tell()
+        self._header = not self.frames
+        self._buffer = []
+        self._size = 0
+        self._threads = threads or _threads()
+        self._pool = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix='compress')
+        self._pending = deque()
+
+    def write(self, text):
+        data = text if isinstance(text, bytes) else text.encode('utf-8')
+        self._buffer.append(data)
+        self._size += len(data)
+        if self._header or self._size >= self.frame_bytes:
+            self._header = False
+            self._cut()
+        return len(text)
+
+    def _cut(self):
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer, self._size = [], 0
+        self._pending.append(self._pool.submit(compress_frame, data, self.codec, self.level))
+        while len(self._pending) > 2 * self._threads:
+            self._drain_one()
+
+    def _drain_one(self):
+        frame = self._pending.popleft().result()
+        self._file.write(frame)
+        self.frames.append([self._offset, len(frame)])
+        self._offset += len(frame)
+
+    def close(self):
+        try:
+            self._cut()
+            while self._pending:
+                self._drain_one()
+        finally:
+            self._pool.shutdown()
+            self._file.close()
+        _write_index(self.filename, self.codec, self.frames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(filename, append=False, binary=False):
+    """Writable text file for ``filename``: a ``FrameWriter`` for ``.gz``/``.zst`` names.
+
+    ``binary`` opens a plain file for UTF-8 bytes instead (a ``FrameWriter``
+    takes either).
+    """
+    if codec_for(filename):
+        return FrameWriter(filename, append=append)
+    if binary:
+        return open(filename, 'ab' if append else 'wb')
+    return open(filename, 'a' if append else 'w', newline='', encoding='utf-8')
+
+
+def open_input(filename):
+    """Readable text file for ``filename``, decompressing ``.gz``/``.zst`` as a stream."""
+    codec = codec_for(filename)
+    if codec == 'gzip':
+        return gzip.open(filename, 'rt', newline='', encoding='utf-8')
+    if codec == 'zstd':
+        import zstandard
+        raw = zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), read_across_frames=True,
+                                                          closefd=True)
+        return io.TextIOWrapper(raw, newline='', encoding='utf-8')
+    return open(filename, newline='', encoding='utf-8')
+
+
+def read_frames(filename, frames):
+    """Yield the decompressed bytes of ``frames`` (``[offset, length]`` pairs) of ``filename``."""
+    codec = codec_for(filename)
+    with open(filename, 'rb') as f:
+        for offset, length in frames:
+            f.seek(offset)
+            yield decompress_frame(f.read(length), codec)
+
+
+def merge_frames(filename, parts, quiet=False):
+    """Concatenate compressed CSV part files into ``filename``, keeping one header frame.
+
+    Frames are copied as raw bytes (no recompression); the sidecars give the
+    header frame of each part, which is dropped for all but the first.
+    Same contract as ``merge_csv_parts``.
+    """
+    total = 0
+    frames = []
+    with open(filename, 'wb') as out:
+        for path, rows in parts:
+            if not rows:
+                continue
+            index = read_index(path)
+            keep = index[1:] if frames else index
+            if not keep:
+                continue
+            start = keep[0][0]
+            with open(path, 'rb') as f:
+                f.seek(start)
+                shift = out.tell() - start
+                shutil.copyfileobj(f, out, 1 << 20)
+            frames += [[offset + shift, length] for offset, length in keep]
+            total += rows
+    _write_index(filename, codec_for(filename), frames)
+    if not quiet:
+        print(f"Generated {filename} ({total} rows)")
+    return total
@@ -0,0 +1,181 @@
+"""Array-backed student dimension for the fact generators.
+
+The fact tables only need a handful of each student's 18 columns, but a
+list of row dicts keeps all of them (and a dict) per student. A
+``StudentDimension`` keeps just those columns, one ``array`` each:
+
+* the id as its 16 raw UUID bytes,
+* unidade/segmento/turma/status_matricula as 1-byte category codes,
+* the boolean columns packed as bits of one byte,
+* data_matricula/data_evasao as int32 days since 1970-01-01,
+* latitude/longitude as doubles,
+
+about 45 bytes per student. Fact loops compare small ints (``codes``)
+instead of strings, and the numpy engines take whole columns with
+``array``/``windows`` instead of rebuilding them from dicts.
+"""
+import uuid
+from array import array
+from datetime import date, timedelta
+
+CATEGORIES = ('unidade', 'segmento', 'turma', 'status_matricula')
+DATES = ('data_matricula', 'data_evasao')
+COORDS = ('latitude', 'longitude')
+STATUS = ['Ativo', 'Evadido', 'Inadimplente']
+
+EPOCH = date(1970, 1, 1)
+# Day offset of a blank date; sorts before every real one
+NO_DATE = -(1 << 31)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+_TYPECODES = {'B': 'uint8', 'i': 'int32', 'd': 'float64'}
+
+
+def _true(value):
+    # bools from the generators, 'true'/'True' from their CSVs, 't' from psql exports
+    return str(value).lower() in ('true', 't', '1')
+
+
+class StudentDimension:
+    """The students of a run, column by column, in generation order.
+
+    ``categories`` presets the code of each category value (e.g.
+    ``{'unidade': UNIDADES}``); values not listed get the next code when
+    first seen. ``flags`` names the boolean columns (bit ``1 << k``).
+    Rows are dicts as yielded by the generators or read back from their
+    CSVs (``CsvSource``); missing columns are left blank.
+    """
+
+    def __init__(self, categories=None, flags=('bolsista',)):
+        categories = categories or {}
+        self.categories = {c: list(categories.get(c, ())) for c in CATEGORIES}
+        self._codes = {c: {v: i for i, v in enumerate(values)} for c, values in self.categories.items()}
+        self.flags = {name: 1 << k for k, name in enumerate(flags)}
+        self.columns = {c: array('B') for c in CATEGORIES}
+        self.columns.update({c: array('i') for c in DATES})
+        self.columns.update({c: array('d') for c in COORDS})
+        self.columns['flags'] = array('B')
+        self._ids = bytearray()
+        self._index = None
+
+    @classmethod
+    def from_rows(cls, rows, categories=None, flags=('bolsista',)):
+        dim = cls(categories, flags)
+        for row in rows:
+            dim.add(row)
+        return dim
+
+    def __len__(self):
+        return len(self._ids) // 16
+
+    def __getitem__(self, column):
+        """The ``array`` of a column (category codes, day offsets, coordinates or ``'flags'``)."""
+        return self.columns[column]
+
+    def add(self, row):
+        self._ids += uuid.UUID(row['id']).bytes
+        for c in CATEGORIES:
+            self.columns[c].append(self.code(c, row.get(c, '')))
+        for c in DATES:
+            self.columns[c].append(self.day(row.get(c)))
+        for c in COORDS:
+            value = row.get(c)
+            self.columns[c].append(float('nan') if value in (None, '') else float(value))
+        self.columns['flags'].append(sum(bit for name, bit in self.flags.items() if _true(row.get(name))))
+        self._index = None
+
+    def collect(self, rows):
+        """Pass ``rows`` through (e.g. to a sink) while adding each one."""
+        for row in rows:
+            self.add(row)
+            yield row
+
+    # Encoding
+    def code(self, column, value):
+        """Category code of ``value`` in ``column`` (a new one for a value not seen yet)."""
+        codes = self._codes[column]
+        if value not in codes:
+            if len(codes) == 256:
+                raise ValueError(f'{column}: more than 256 distinct values')
+            codes[value] = len(codes)
+            self.categories[column].append(value)
+        return codes[value]
+
+    @staticmethod
+    def day(value):
+        """Day offset of a ``date``, an ISO ``'YYYY-MM-DD'`` string or a blank."""
+        if value in (None, ''):
+            return NO_DATE
+        if isinstance(value, str):
+            value = date.fromisoformat(value[:10])
+        return value.toordinal() - _EPOCH_ORDINAL
+
+    # Row access
+    def id(self, i):
+        return str(uuid.UUID(bytes=bytes(self._ids[16 * i:16 * i + 16])))
+
+    def ids(self, lo=0, hi=None):
+        hi = len(self) if hi is None else hi
+        # Sliced out of one hex string: a uuid.UUID per student costs more than the row it ends up in
+        h = self._ids[16 * lo:16 * hi].hex()
+        return [f'{h[k:k + 8]}-{h[k + 8:k + 12]}-{h[k + 12:k + 16]}-{h[k + 16:k + 20]}-{h[k + 20:k + 32]}'
+                for k in range(0, len(h), 32)]
+
+    def value(self, column, i):
+        """Category value of student ``i``."""
+        return self.categories[column][self.columns[column][i]]
+
+    def date(self, column, i):
+        """``date`` of student ``i`` (``None`` when blank)."""
+        days = self.columns[column][i]
+        return None if days == NO_DATE else EPOCH + timedelta(days=days)
+
+    def iso(self, column, i):
+        d = self.date(column, i)
+        return d.isoformat() if d else ''
+
+    def flag(self, name, i):
+        return bool(self.columns['flags'][i] & self.flags[name])
+
+    def set(self, column, i, value):
+        """Change a category or date column of student ``i`` (e.g. an evasão)."""
+        if column in DATES:
+            self.columns[column][i] = self.day(value)
+        else:
+            self.columns[column][i] = self.code(column, value)
+
+    def index(self, student_id):
+        """Row of a student id, through an index built on first use."""
+        if self._index is None:
+            self._index = {bytes(self._ids[k:k + 16]): k // 16 for k in range(0, len(self._ids), 16)}
+        return self._index[uuid.UUID(student_id).bytes]
+
+    def window(self, cal, i):
+        """``cal.window`` of student ``i``: the months from matrícula through evasão."""
+        return cal.window(self.date('data_matricula', i), self.date('data_evasao', i))
+
+    # numpy views, for the vectorized engines
+    def array(self, column, lo=0, hi=None):
+        """Column ``lo:hi`` as a numpy array (a copy)."""
+        import numpy as np
+
+        values = self.columns[column]
+        return np.frombuffer(values, dtype=_TYPECODES[values.typecode])[lo:hi].copy()
+
+    def flag_array(self, name, lo=0, hi=None):
+        return (self.array('flags', lo, hi) & self.flags[name]) != 0
+
+    def windows(self, cal, lo=0, hi=None):
+        """``window`` of students ``lo:hi`` as two arrays (see ``MonthCalendar.active_mask``)."""
+        import numpy as np
+
+        shift = cal.index(EPOCH)
+
+        def months(column):
+            days = self.array(column, lo, hi)
+            return days == NO_DATE, days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) + shift
+
+        blank, first = months('data_matricula')
+        start = np.where(blank, 0, np.maximum(0, first))
+        blank, last = months('data_evasao')
+        end = np.where(blank, len(cal), np.minimum(len(cal), last + 1))
+        return start, np.maximum(start, end)
@@ -0,0 +1,273 @@
+"""One-pass aggregation of the INEP ENEM microdata into the enem_agregado_* tables.
+
+The microdata file (``MICRODADOS_ENEM_<ano>.csv``: ``;``-separated, Latin-1,
+several GB) is read line by line, keeping only the columns below, and summed
+into a ``GroupSums`` keyed by UF × município de prova × tipo de escola ×
+escola. That is the finest grain needed: the state, city and bairro tables
+are regrouped from it at the end, so the whole scan is a single pass and
+memory is bounded by the number of schools, not of candidates.
+
+The file can be split into byte ranges aligned to line starts and each
+range scanned in its own process; the partial sums merge with
+``GroupSums.update``. Records must not contain embedded newlines (true for
+the INEP files, which do not quote fields).
+"""
+import csv
+import os
+import uuid
+from operator import itemgetter
+
+from datagen.rollups import GroupSums
+
+ENCODING = 'latin-1'
+DELIMITER = ';'
+
+# (suffix of the app's avg_*/count_* columns, microdata column)
+AREAS = [('cn', 'NU_NOTA_CN'), ('ch', 'NU_NOTA_CH'), ('lc', 'NU_NOTA_LC'),
+         ('mt', 'NU_NOTA_MT'), ('redacao', 'NU_NOTA_REDACAO')]
+KEY_COLUMNS = ['SG_UF_PROVA', 'CO_MUNICIPIO_PROVA', 'NO_MUNICIPIO_PROVA', 'TP_ESCOLA', 'CO_ESCOLA']
+KEYS = ['SG_UF_PROVA', 'CO_MUNICIPIO_PROVA', 'NO_MUNICIPIO_PROVA', 'tp_escola_label', 'CO_ESCOLA']
+# Grades have one decimal place: sums are kept in integer tenths, so partial
+# sums merge exactly and the output does not depend on how the file was split
+MEASURES = [m for area, _ in AREAS for m in (f'count_{area}', f'sum_{area}')]
+
+# TP_ESCOLA in the microdata dictionary
+TP_ESCOLA_LABEL = {'1': 'Não respondeu', '2': 'Pública', '3': 'Privada', '4': 'Exterior'}
+
+# Scanned lines per batch: bounds the raw text held at once
+CHUNK_LINES = 100000
+
+
+def new_sums():
+    return GroupSums(KEYS, MEASURES)
+
+
+def read_header(path):
+    with open(path, encoding=ENCODING, newline='') as f:
+        return next(csv.reader(f, delimiter=DELIMITER))
+
+
+def byte_ranges(path, parts):
+    """Split ``path`` into ``parts`` ``(start, end)`` byte ranges after the header.
+
+    Ranges are cut at arbitrary offsets; ``scan`` moves each start to the
+    next line, so every line is read by exactly one range.
+    """
+    with open(path, 'rb') as f:
+        f.readline()
+        first = f.tell()
+    size = os.path.getsize(path)
+    step = max(1, -(-(size - first) // max(1, parts)))
+    return [(start, min(start + step, size)) for start in range(first, size, step)]
+
+
+def _lines(f, start, end, chunk_lines):
+    # Lines that *start* before ``end`` belong to this range
+    if start:
+        f.seek(start - 1)
+        f.readline()
+    pos = f.tell()
+    batch = []
+    while pos < end:
+        line = f.readline()
+        if not line:
+            break
+        pos += len(line)
+        batch.append(line.decode(ENCODING))
+        if len(batch) == chunk_lines:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _grade(value):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return float(value.replace(',', '.'))
+
+
+def scan(path, start, end, header=None, chunk_lines=CHUNK_LINES):
+    """Aggregate the microdata lines in ``[start, end)`` into a new ``GroupSums``.
+
+    Blank grades (absent) and zeros (eliminated) are not counted, the same
+    rule the dashboard routes apply with ``avg_* > 0``. Files without
+    ``CO_ESCOLA`` (it is not published every year) aggregate with a blank school.
+    """
+    header = header or read_header(path)
+    index = {name: i for i, name in enumerate(header)}
+    missing = [c for c in KEY_COLUMNS[:4] + [col for _, col in AREAS] if c not in index]
+    if missing:
+        raise ValueError(f"{path}: missing columns {', '.join(missing)}")
+    width = len(header)
+    keys = itemgetter(*(index[c] for c in KEY_COLUMNS[:4]))
+    escola = index.get('CO_ESCOLA')
+    grades = itemgetter(*(index[col] for _, col in AREAS))
+
+    sums = new_sums()
+    with open(path, 'rb') as f:
+        for batch in _lines(f, start, end, chunk_lines):
+            for row in csv.reader(batch, delimiter=DELIMITER):
+                if len(row) < width:
+                    continue
+                uf, co_mun, no_mun, tp = keys(row)
+                key = (uf, co_mun, no_mun, TP_ESCOLA_LABEL.get(tp, tp),
+                       row[escola] if escola is not None else '')
+                values = []
+                for value in grades(row):
+                    nota = _grade(value)
+                    if nota:
+                        values += (1, round(nota * 10))
+                    else:
+                        values += (0, 0)
+                sums.add(key, values)
+    return sums
+
+
+def load_escolas(path):
+    """Map ``CO_ENTIDADE`` to ``(NO_ENTIDADE, NO_BAIRRO)`` from the Censo Escolar microdata."""
+    with open(path, encoding=ENCODING, newline='') as f:
+        reader = csv.reader(f, delimiter=DELIMITER)
+        index = {name: i for i, name in enumerate(next(reader))}
+        code, name, bairro = (index[c] for c in ('CO_ENTIDADE', 'NO_ENTIDADE', 'NO_BAIRRO'))
+        return {row[code]: (row[name], row[bairro]) for row in reader if len(row) > bairro}
+
+
+def regroup(sums, keys, key_fn):
+    """Sum the groups of ``sums`` into coarser groups named ``keys`` (``key_fn(key)``)."""
+    out = GroupSums(keys, sums.measures)
+    for key, acc in sums.groups.items():
+        new_key = key_fn(key)
+        if new_key is not None:
+            out.add(new_key, acc[1:], count=acc[0])
+    return out
+
+
+def _averages(row):
+    for area, _ in AREAS:
+        n, total = row.pop(f'count_{area}'), row.pop(f'sum_{area}')
+        row[f'avg_{area}'] = round(total / n / 10, 2) if n else 0
+        row[f'count_{area}'] = n
+    row['total_inscritos'] = row.pop('registros')
+    return row
+
+
+def app_tables(sums, escolas=None):
+    """Yield ``(table, rows)`` in the layout the ENEM dashboard routes query.
+
+    One row per group and ``tp_escola_label``, with ``avg_*``/``count_*``
+    per area (the routes recombine them as ``SUM(avg*count)/SUM(count)``).
+    ``escolas`` (see ``load_escolas``) names the schools; without it the
+    school table has blank names and no bairro table is produced.
+    """
+    escolas = escolas or {}
+    yield 'enem_agregado_estado', map(_averages, regroup(
+        sums, ['SG_UF_PROVA', 'tp_escola_label'], itemgetter(0, 3)).rows())
+    yield 'enem_agregado_cidade', map(_averages, regroup(
+        sums, KEYS[:4], itemgetter(0, 1, 2, 3)).rows())
+
+    def escola_key(key):
+        if not key[4]:
+            return None
+        nome, bairro = escolas.get(key[4], ('', ''))
+        return key + (nome, bairro)
+    yield 'enem_agregado_escola', map(_averages, regroup(
+        sums, KEYS + ['NO_ENTIDADE', 'NO_BAIRRO'], escola_key).rows())
+
+    if escolas:
+        def bairro_key(key):
+            bairro = escolas.get(key[4], ('', ''))[1]
+            return key[:4] + (bairro,) if bairro else None
+        yield 'enem_agregado_bairro', map(_averages, regroup(
+            sums, KEYS[:4] + ['NO_BAIRRO'], bairro_key).rows())
+
+
+def _legacy(row):
+    for area, col in AREAS:
+        n, total = row.pop(f'count_{area}'), row.pop(f'sum_{area}')
+        row[col] = round(total / n / 10, 2) if n else 0
+    row['total_alunos'] = row.pop('registros')
+    return row
+
+
+def legacy_tables(sums):
+    """Yield ``(table, rows)`` in the ``supabase_schema.sql`` layout: all school types together."""
+    yield 'enem_agregado_estado', map(_legacy, regroup(sums, ['SG_UF_PROVA'], lambda key: key[:1]).rows())
+
+    def cidade(row):
+        row = _legacy(row)
+        return {'id': _cidade_id(row['CO_MUNICIPIO_PROVA']), **row}
+    yield 'enem_agregado_cidade', map(cidade, regroup(
+        sums, ['CO_MUNICIPIO_PROVA', 'NO_MUNICIPIO_PROVA', 'SG_UF_PROVA'], itemgetter(1, 2, 0)).rows())
+
+
+def _cidade_id(co_municipio):
+    # Stable per município, so reloading a year keeps the same ids
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f'enem/municipio/{co_municipio}'))
+
+
+# Synthetic candidates, for benchmarks without the INEP files:
+# (UF, IBGE code, relative number of inscritos)
+_UFS = [('SP', 35, 590), ('MG', 31, 370), ('BA', 29, 300), ('RJ', 33, 280), ('CE', 23, 240), ('PE', 26, 230),
+        ('PA', 15, 230), ('MA', 21, 180), ('PR', 41, 160), ('RS', 43, 140), ('GO', 52, 130), ('AM', 13, 120),
+        ('PB', 25, 110), ('PI', 22, 100), ('SC', 42, 90), ('RN', 24, 80), ('AL', 27, 80), ('ES', 32, 70),
+        ('MT', 51, 70), ('SE', 28, 60), ('DF', 53, 60), ('MS', 50, 50), ('TO', 17, 40), ('RO', 11, 40),
+        ('AP', 16, 30), ('AC', 12, 25), ('RR', 14, 15)]
+# TP_ESCOLA codes drawn, and each one's mean grade
+_TIPOS = ['1', '2', '3']
+_MEDIA = [530, 500, 600]
+
+
+def synthetic(inscritos, seed, municipios=40, por_escola=150):
+    """Sums as ``scan`` would return for ``inscritos`` made-up candidates, plus their ``escolas``.
+
+    Candidates spread over ``municipios`` per UF (sizes falling off as
+    1/rank) and schools of about ``por_escola`` candidates, each school in
+    one of a few bairros of its município; most candidates, as in the INEP
+    files, have no school. Same ``seed``, same sums.
+    """
+    import numpy as np
+
+    from datagen.pools import load_pools
+
+    rng = np.random.default_rng(seed)
+    rank = 1.0 / np.arange(1, municipios + 1)
+    peso = (np.array([p for _, _, p in _UFS], dtype=float)[:, None] * rank / rank.sum()).ravel()
+    peso /= peso.sum()
+    n_mun = len(peso)
+    n_esc = max(1, inscritos // por_escola)
+    esc_mun = rng.choice(n_mun, n_esc, p=peso)
+    esc_tp = np.where(rng.random(n_esc) < 0.22, 2, 1)
+    bairros = load_pools().bairros
+    esc_bairro = (esc_mun * 7 + rng.integers(0, 12, n_esc)) % len(bairros)
+
+    sem_escola = rng.random(inscritos) < 0.6
+    escola = rng.integers(0, n_esc, inscritos)
+    mun = np.where(sem_escola, rng.choice(n_mun, inscritos, p=peso), esc_mun[escola])
+    tp = np.where(sem_escola, 0, esc_tp[escola])
+    escola = np.where(sem_escola, -1, escola)
+    measures = []
+    for _ in AREAS:
+        # Absent (blank) or eliminated (zero) grades are not counted
+        presente = rng.random(inscritos) >= 0.28
+        nota = np.clip(rng.normal(np.array(_MEDIA)[tp], 90), 300, 980)
+        measures += [presente, np.where(presente, np.rint(nota * 10), 0)]
+
+    codes = (mun * len(_TIPOS) + tp) * (n_esc + 1) + escola + 1
+    uniq, inverse = np.unique(codes, return_inverse=True)
+    counts = np.bincount(inverse).tolist()
+    totals = [np.bincount(inverse, weights=m).astype(np.int64).tolist() for m in measures]
+    sums = new_sums()
+    for j, code in enumerate(uniq.tolist()):
+        rest, e = divmod(code, n_esc + 1)
+        m, t = divmod(rest, len(_TIPOS))
+        uf, ibge, _ = _UFS[m // municipios]
+        co_mun = str(ibge * 100000 + m % municipios + 1)
+        key = (uf, co_mun, f'Município {uf} {m % municipios + 1:02d}', TP_ESCOLA_LABEL[_TIPOS[t]],
+               str(10000000 + e) if e else '')
+        sums.add(key, [s[j] for s in totals], count=counts[j])
+    escolas = {str(10000001 + e): (f'Escola {e + 1:05d}', bairros[esc_bairro[e]]) for e in range(n_esc)}
+    return sums, escolas
@@ -0,0 +1,298 @@
+"""Rate-controlled delivery of an event stream (simulate_events.py).
+
+An event is a dict: ``seq``, ``ts`` (simulated time), ``tipo``, the
+``table`` it changes, ``op`` (``insert`` or ``update``), the ``key``
+columns that find the row and the ``values`` written to it. ``deliver``
+paces the producer to a target events/s and hands the events to a writer
+thread through a bounded queue: when the sink falls behind (a socket peer
+that stops reading, a slow database) the queue fills and the producer
+blocks instead of piling events up in memory. The writer takes whatever is
+queued, up to ``batch`` events, per write, so batches grow by themselves
+when the sink is the bottleneck. Throughput, lag behind the target rate,
+queue depth and time blocked are reported every few seconds.
+
+Sinks: ``NdjsonSink`` (file, rotated by event count, or stdout),
+``SocketSink`` (NDJSON over TCP or a unix socket) and ``PgEventSink``
+(each batch applied as upserts/updates in one transaction).
+"""
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+BATCH = 500
+QUEUE_SIZE = 10000
+REPORT_EVERY = 5.0
+
+
+def event(seq, ts, tipo, table, op, key, values):
+    return {'seq': seq, 'ts': ts.isoformat(timespec='seconds'), 'tipo': tipo, 'table': table, 'op': op,
+            'key': key, 'values': values}
+
+
+def read_ndjson(path):
+    """Events recorded by ``NdjsonSink``, for replay."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _lines(events):
+    return ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in events)
+
+
+class NdjsonSink:
+    """One JSON event per line; ``-`` is stdout. With ``rotate``, a new
+    ``<name>-00001.ndjson``, ``-00002``... file every ``rotate`` events."""
+
+    def __init__(self, path, rotate=0):
+        self.path, self.rotate = path, rotate
+        self.files = 0
+        self._file, self._count = None, 0
+
+    def _open(self):
+        if self.path == '-':
+            return sys.stdout
+        path = self.path
+        if self.rotate:
+            stem, ext = os.path.splitext(self.path)
+            path = f'{stem}-{self.files + 1:05d}{ext or ".ndjson"}'
+        self.files += 1
+        return open(path, 'w', encoding='utf-8')
+
+    def write(self, events):
+        while events:
+            if self._file is None:
+                self._file, self._count = self._open(), 0
+            take = len(events) if not self.rotate else min(len(events), self.rotate - self._count)
+            self._file.write(_lines(events[:take]))
+            self._file.flush()
+            self._count += take
+            events = events[take:]
+            if self.rotate and self._count >= self.rotate:
+                self._close_file()
+
+    def _close_file(self):
+        if self._file is not None and self._file is not sys.stdout:
+            self._file.close()
+        self._file = None
+
+    def close(self):
+        self._close_file()
+
+
+class SocketSink:
+    """NDJSON over a stream socket: ``host:port`` (TCP) or the path of a unix socket.
+
+    ``sendall`` blocks while the peer's receive window is full, which is
+    what pushes back on the producer.
+    """
+
+    def __init__(self, address):
+        if os.sep in address or ':' not in address:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+        else:
+            host, port = address.rsplit(':', 1)
+            self.sock = socket.create_connection((host or 'localhost', int(port)))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def write(self, events):
+        self.sock.sendall(_lines(events).encode('utf-8'))
+
+    def close(self):
+        self.sock.close()
+
+
+class PgEventSink:
+    """Applies each batch in one transaction over a single connection.
+
+    Inserts are upserts on the row's ``id`` (a replayed stream can be
+    applied twice); updates match on the event's key columns. Runs of
+    consecutive events with the same shape go through one ``executemany``,
+    so the batch keeps its order. Value columns and tables missing from
+    the database are ignored, as in ``PgSink``; an event whose key has a
+    column the table lacks (bimestre on supabase_schema.sql) is skipped
+    and counted, since a narrower key would change every row it matches.
+    """
+
+    def __init__(self, dsn):
+        import psycopg
+
+        from datagen.pg_loader import PgSink
+        self.loader = PgSink(dsn)
+        self.conn = psycopg.connect(dsn)
+        self.skipped = Counter()
+        self.unkeyed = Counter()
+
+    def _statement(self, table, op, key, cols):
+        if op == 'insert':
+            names = key + cols
+            update = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in cols)
+            return 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ("{}") DO {}'.format(
+                table, ', '.join(f'"{c}"' for c in names), ', '.join(['%s'] * len(names)), key[0],
+                f'UPDATE SET {update}' if cols else 'NOTHING')
+        sets = ', '.join(f'"{c}" = %s' for c in cols)
+        return 'UPDATE {} SET {} WHERE {}'.format(table, sets, ' AND '.join(f'"{k}" = %s' for k in key))
+
+    def write(self, events):
+        groups = []
+        for e in events:
+            table = self.loader.table(e['table'])
+            if table not in self.loader.columns:
+                self.skipped[table] += 1
+                continue
+            columns = self.loader.columns[table]
+            key = list(e['key'])
+            missing = tuple(k for k in key if k not in columns)
+            if missing:
+                self.unkeyed[table, missing] += 1
+                continue
+            cols = [c for c in e['values'] if c in columns]
+            shape = (table, e['op'], tuple(key), tuple(cols))
+            if not groups or groups[-1][0] != shape:
+                groups.append((shape, []))
+            if e['op'] == 'insert':
+                params = [e['key'][k] for k in key] + [e['values'][c] for c in cols]
+            else:
+                params = [e['values'][c] for c in cols] + [e['key'][k] for k in key]
+            groups[-1][1].append(params)
+        with self.conn.transaction():
+            cur = self.conn.cursor()
+            for (table, op, key, cols), rows in groups:
+                convs = [self.loader._converter(table, c) for c in (key + cols if op == 'insert' else cols + key)]
+                cur.executemany(self._statement(table, op, list(key), list(cols)),
+                                [tuple(c(v) for c, v in zip(convs, row)) for row in rows])
+
+    def close(self):
+        self.conn.close()
+        if self.skipped:
+            print(f"Skipped events of tables not in the database: "
+                  f"{', '.join(f'{t} ({n})' for t, n in self.skipped.items())}")
+        if self.unkeyed:
+            tables = [f"{t} without {', '.join(m)} ({n})" for (t, m), n in self.unkeyed.items()]
+            print(f"Skipped events whose key columns are not in the table: {'; '.join(tables)}")
+
+
+class _Writer(threading.Thread):
+    def __init__(self, sink, batch, queue_size):
+        super().__init__(daemon=True)
+        self.sink, self.batch = sink, batch
+        self.queue = queue.Queue(queue_size)
+        self.written = self.writes = 0
+        self.write_s = 0.0
+        self.error = None
+
+    def run(self):
+        done = False
+        while not done:
+            chunk = [self.queue.get()]
+            if chunk[0] is None:
+                break
+            while len(chunk) < self.batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                chunk.append(item)
+            start = time.perf_counter()
+            try:
+                self.sink.write(chunk)
+            except Exception as e:  # surfaced by the producer
+                self.error = e
+                return
+            self.write_s += time.perf_counter() - start
+            self.written += len(chunk)
+            self.writes += 1
+
+    def put(self, item):
+        """Queue ``item``; return the seconds spent blocked on a full queue."""
+        try:
+            self.queue.put_nowait(item)
+            return 0.0
+        except queue.Full:
+            pass
+        start = time.perf_counter()
+        while True:
+            if self.error is not None or not self.is_alive():
+                raise RuntimeError(f'event sink failed: {self.error}') from self.error
+            try:
+                self.queue.put(item, timeout=0.5)
+                return time.perf_counter() - start
+            except queue.Full:
+                continue
+
+
+def deliver(events, sink, rate=0, limit=None, duration=None, batch=BATCH, queue_size=QUEUE_SIZE,
+            report=REPORT_EVERY, out=sys.stdout):
+    """Send ``events`` to ``sink`` at ``rate`` events/s (0: as fast as the sink takes them).
+
+    Stops after ``limit`` events, ``duration`` seconds, the end of
+    ``events`` or Ctrl-C; returns the run's figures.
+    """
+    writer = _Writer(sink, batch, queue_size)
+    writer.start()
+    tipos = Counter()
+    sent = 0
+    blocked = max_lag = 0.0
+    max_queue = 0
+    start = last = time.perf_counter()
+    last_written = 0
+    lag = 0.0
+
+    def line(now):
+        elapsed = now - start
+        return (f"{elapsed:7.1f}s  {sent} sent  {writer.written} written  "
+                f"{(writer.written - last_written) / max(now - last, 1e-9):9.0f} ev/s"
+                f"{f' (target {rate:g})' if rate else ''}  lag {lag:6.2f}s  "
+                f"queue {writer.queue.qsize()}/{queue_size}  blocked {blocked:.1f}s")
+
+    try:
+        for e in events:
+            if limit is not None and sent >= limit:
+                break
+            now = time.perf_counter()
+            if duration is not None and now - start >= duration:
+                break
+            if rate:
+                # Hold each event until its slot; falling behind the slots is the lag
+                due = start + sent / rate
+                if due - now > 0.001:
+                    time.sleep(due - now)
+                lag = max(0.0, now - due)
+                max_lag = max(max_lag, lag)
+            blocked += writer.put(e)
+            sent += 1
+            tipos[e['tipo']] += 1
+            max_queue = max(max_queue, writer.queue.qsize())
+            if report and now - last >= report:
+                print(line(now), file=out, flush=True)
+                last, last_written = now, writer.written
+    except KeyboardInterrupt:
+        print("Interrupted; flushing the queued events...", file=out)
+    writer.put(None)
+    writer.join()
+    if writer.error is not None:
+        raise RuntimeError(f'event sink failed: {writer.error}') from writer.error
+    seconds = time.perf_counter() - start
+    return {
+        'events': writer.written,
+        'seconds': round(seconds, 3),
+        'events_per_s': round(writer.written / seconds, 1) if seconds else None,
+        'target_per_s': rate or None,
+        'max_lag_s': round(max_lag, 3),
+        'blocked_s': round(blocked, 3),
+        'max_queue': max_queue,
+        'writes': writer.writes,
+        'mean_batch': round(writer.written / writer.writes, 1) if writer.writes else 0,
+        'mean_write_ms': round(writer.write_s * 1000 / writer.writes, 3) if writer.writes else 0,
+        'tipos': dict(tipos),
+    }
@@ -0,0 +1,151 @@
+"""External merge sort of a generated CSV on a clustering key, in bounded memory.
+
+The generators emit rows in loop order (mensalidades month by month,
+desempenho student by student), so a table loads into an unclustered heap.
+``sort_csv`` rewrites a finished file sorted on some of its columns: the
+rows are read in runs of about ``memory_mb``, each run is sorted and
+spilled to a temporary file next to the output, and the runs are merged
+with a heap, ``fan_in`` at a time (more passes when there are more runs).
+A file that fits in one run is sorted in memory. Plain and compressed
+(``.csv.gz``/``.csv.zst``) files are read and written alike; the result
+replaces the file only once complete.
+
+Keys compare as the schema types them: integers and numerics as numbers
+(blanks first), everything else as text, which orders ISO dates and
+timestamps correctly. The sort is stable, so rows with equal keys keep
+their generation order.
+"""
+import csv
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+from itertools import islice
+from operator import itemgetter
+
+from datagen import compress
+
+MEMORY_MB = 256
+FAN_IN = 64
+# Per-row and per-field overhead of a csv row held as a list of str
+_ROW_BYTES, _FIELD_BYTES = 72, 57
+_SAMPLE = 16
+
+
+def _number(value):
+    return float(value) if value else float('-inf')
+
+
+def key_function(header, columns, types=None):
+    """Sort key of a row (list of strings) for ``columns``, typed by ``types`` (column -> SQL type)."""
+    types = types or {}
+    missing = [c for c in columns if c not in header]
+    if missing:
+        raise ValueError(f"no column {', '.join(missing)} to sort on (columns: {', '.join(header)})")
+    index = [header.index(c) for c in columns]
+    numeric = [types.get(c, 'text') in ('integer', 'smallint', 'bigint') or types.get(c, '').startswith('numeric')
+               for c in columns]
+    if not any(numeric):
+        # Text only: the strings themselves are the key
+        return itemgetter(*index)
+    getters = [(i, _number if num else None) for i, num in zip(index, numeric)]
+
+    def key(row):
+        return tuple(conv(row[i]) if conv else row[i] for i, conv in getters)
+    return key
+
+
+def _size(row):
+    return _ROW_BYTES + sum(_FIELD_BYTES + len(f) for f in row)
+
+
+def _runs(reader, key, memory_bytes):
+    """Sorted lists of rows of about ``memory_bytes`` each, with whether the input may go on after them."""
+    run, size = [], 0
+    for row in reader:
+        run.append(row)
+        # Rows of a table are about the same size: measure one in _SAMPLE
+        if len(run) % _SAMPLE == 1:
+            size += _SAMPLE * _size(row)
+            if size >= memory_bytes:
+                run.sort(key=key)
+                yield run, True
+                run, size = [], 0
+    run.sort(key=key)
+    yield run, False
+
+
+def _spill(rows, tmp_dir, n):
+    path = os.path.join(tmp_dir, f'run-{n:05d}.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def _read(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.reader(f)
+
+
+def _merge(paths, key):
+    # Run order breaks ties (heapq.merge is stable), so equal keys keep the input order
+    return heapq.merge(*(_read(p) for p in paths), key=key)
+
+
+def sort_csv(filename, columns, types=None, transform=None, memory_mb=MEMORY_MB, fan_in=FAN_IN):
+    """Sort ``filename`` in place on ``columns``; return ``{'rows', 'runs', 'passes'}``.
+
+    ``transform(header)`` may return a function applied to every row (a
+    list of strings) as it is written in sorted order, e.g. to renumber ids.
+    """
+    csv.field_size_limit(sys.maxsize)
+    memory_bytes = int(memory_mb * 2**20)
+    directory = os.path.dirname(os.path.abspath(filename))
+    tmp_dir = tempfile.mkdtemp(prefix='.sort-', dir=directory)
+    try:
+        with compress.open_input(filename) as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            key = key_function(header, columns, types)
+            paths = []
+            for run, more in _runs(reader, key, memory_bytes):
+                if not more and not paths:
+                    # Fits in memory: no spill
+                    merged = iter(run)
+                    break
+                if run:
+                    paths.append(_spill(run, tmp_dir, len(paths)))
+        stats = {'rows': 0, 'runs': max(1, len(paths)), 'passes': 1}
+        n = len(paths)
+        while len(paths) > fan_in:
+            # Merge groups of fan_in runs into longer runs until one pass can merge them all
+            merged_paths = []
+            for lo in range(0, len(paths), fan_in):
+                group = paths[lo:lo + fan_in]
+                merged_paths.append(_spill(_merge(group, key), tmp_dir, n))
+                n += 1
+                for p in group:
+                    os.unlink(p)
+            paths = merged_paths
+            stats['passes'] += 1
+        if paths:
+            merged = _merge(paths, key)
+
+        apply = transform(header) if transform else None
+        tmp = os.path.join(directory, f'tmp-{os.path.basename(filename)}')
+        with compress.open_output(tmp) as out:
+            writer = csv.writer(out)
+            writer.writerow(header)
+            while True:
+                chunk = list(islice(merged, 10000))
+                if not chunk:
+                    break
+                if apply:
+                    chunk = [apply(row) for row in chunk]
+                writer.writerows(chunk)
+                stats['rows'] += len(chunk)
+        compress.replace(tmp, filename)
+        return stats
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
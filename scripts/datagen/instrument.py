@@ -0,0 +1,223 @@
+"""Per-stage instrumentation and the run manifest of a generation job.
+
+Every table handed to the sink is a stage: its start/end time, rows, rows/s,
+bytes written and memory are recorded in ``run_manifest.json`` next to the
+outputs. A stage's ``peak_rss_mb`` is the peak RSS reached during that
+stage (and ``rss_growth_mb`` that peak over the RSS it started with): on
+Linux the kernel's peak counter is reset when each stage starts (see
+``_reset_peak``); elsewhere they are null. The top-level
+``process_peak_rss_mb`` is the peak of the whole process. Worker
+processes are measured apart: a stage that runs shards on a pool records
+their memory (``datagen.sharding.run_shards``) and the top-level
+``workers_peak_rss_mb`` is the largest of those. Shards run in the process
+itself tag their stages with ``shard``; the top-level totals leave them
+out, as the merges count those rows again. Generators are lazy, so a
+stage's time covers producing the rows as well as writing them (with
+``--load`` the COPY of non-parent tables finishes in the background and is
+not included).
+
+``profile`` (``'cprofile'`` or ``'pyinstrument'``) also profiles each stage
+into ``<out_dir>/profiles/<stage>.prof`` / ``.html``.
+"""
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+MANIFEST_FILE = 'run_manifest.json'
+PROFILE_DIR = 'profiles'
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+def peak_rss_mb():
+    """Peak RSS of the whole process so far."""
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+
+def _status_mb(field):
+    # VmRSS/VmHWM of /proc/self/status (Linux), in MB; None elsewhere
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    """Reset the process's peak RSS (VmHWM) to its current RSS; False where the kernel does not allow it."""
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class RunManifest:
+    """Collects stage records for one run and saves them as JSON."""
+
+    def __init__(self, out_dir, profile=None):
+        self.out_dir = out_dir
+        self.profile = profile
+        self.stages = []
+        self.started_at = _now()
+        self._start = time.perf_counter()
+        self._profiling = False
+        # Peak RSS of the enclosing stages until their nested stage started (the reset loses it)
+        self._peaks = []
+        # The reset clears ru_maxrss too: the process peak is kept here across resets
+        self._process_peak = 0
+
+    def wrap(self, sink, shard=None):
+        return InstrumentedSink(sink, self, shard)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the ``with`` body as stage ``name``; set ``rows``/``bytes`` on the yielded dict."""
+        record = {'stage': name, 'started_at': _now(), 'rows': None, 'bytes': None}
+        before = _status_mb('VmHWM') or 0
+        self._process_peak = max(self._process_peak, before)
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], before)
+        rss = _status_mb('VmRSS')
+        tracked = _reset_peak()
+        self._peaks.append(0)
+        profiler = self._start_profiler()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler:
+                self._stop_profiler(profiler, name)
+            peak = max(self._peaks.pop(), _status_mb('VmHWM') or 0) if tracked else None
+            if peak is not None:
+                self._process_peak = max(self._process_peak, peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+            record.update({
+                'ended_at': _now(),
+                'seconds': round(seconds, 4),
+                'rows_per_s': round(record['rows'] / seconds) if record['rows'] and seconds else None,
+                'peak_rss_mb': peak,
+                'rss_growth_mb': round(peak - rss, 1) if peak is not None and rss is not None else None,
+            })
+            self.stages.append(record)
+
+    def save(self, **extra):
+        """Write the manifest to ``<out_dir>/run_manifest.json`` and return its path.
+
+        Meant to be called from a ``finally`` block: a run aborted by an
+        exception is saved with ``status: failed`` and the stages it got through.
+        """
+        error = sys.exc_info()[1]
+        manifest = {
+            'script': os.path.basename(sys.argv[0]),
+            'status': 'failed' if error else 'ok',
+            'error': repr(error) if error else None,
+            'argv': sys.argv[1:],
+            'python': platform.python_version(),
+            'started_at': self.started_at,
+            'ended_at': _now(),
+            'wall_s': round(time.perf_counter() - self._start, 3),
+            'process_peak_rss_mb': max(peak_rss_mb(), self._process_peak),
+            'workers_peak_rss_mb': max((s['workers_rss_mb'] for s in self.stages if 'workers_rss_mb' in s),
+                                       default=None),
+            # A shard's stages write its part files, counted again by the merge
+            'rows': sum(s['rows'] or 0 for s in self.stages if 'shard' not in s),
+            'bytes': sum(s['bytes'] or 0 for s in self.stages if 'shard' not in s),
+            **extra,
+            'stages': self.stages,
+        }
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, MANIFEST_FILE)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        return path
+
+    def _start_profiler(self):
+        # Nested stages run under the outer stage's profiler
+        if not self.profile or self._profiling:
+            return None
+        self._profiling = True
+        if self.profile == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler, name):
+        self._profiling = False
+        path = os.path.join(self.out_dir, PROFILE_DIR)
+        os.makedirs(path, exist_ok=True)
+        filename = re.sub(r'\W+', '_', name).strip('_')
+        if self.profile == 'pyinstrument':
+            profiler.stop()
+            with open(os.path.join(path, f'{filename}.html'), 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(path, f'{filename}.prof'))
+
+
+class InstrumentedSink:
+    """Sink wrapper that records every table write as a stage of ``manifest``.
+
+    With ``shard`` (the sink of a shard run in this process) the stages are
+    tagged with its index.
+    """
+
+    def __init__(self, sink, manifest, shard=None):
+        self.sink = sink
+        self.manifest = manifest
+        self.shard = shard
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+    def write_rows(self, name, rows):
+        return self._record(name, self.sink.write_rows, name, rows)
+
+    def write_blocks(self, name, blocks):
+        return self._record(name, self.sink.write_blocks, name, blocks)
+
+    def merge(self, name, parts):
+        return self._record(f'{name} (merge)', self.sink.merge, name, parts)
+
+    def update_rows(self, name, key, updates):
+        return self._record(f'{name} (update)', self.sink.update_rows, name, key, updates)
+
+    def _record(self, stage, method, table, *args):
+        # Appending sinks grow an existing file: count only the bytes added
+        before = self._size(table) if getattr(self.sink, 'append', False) else None
+        with self.manifest.stage(stage) as record:
+            if self.shard is not None:
+                record['shard'] = self.shard
+            record['rows'] = rows = method(table, *args)
+            after = self._size(table)
+            record['bytes'] = None if after is None else after - (before or 0)
+        return rows
+
+    def _size(self, name):
+        path = getattr(self.sink, 'path', None)
+        if path is None:
+            return None
+        filename = path(name)
+        return os.path.getsize(filename) if os.path.exists(filename) else None
@@ -0,0 +1,73 @@
+"""Month calendar shared by the monthly loops (billing, expenses, metrics).
+
+The generators used to step ``curr = next_month(curr)`` by hand and compare
+or re-parse each student's dates every month. A ``MonthCalendar`` lays the
+months out once (first day, ISO string, year, the due/payment days), and
+turns a student's matrícula/evasão dates into a ``[lo, hi)`` range of month
+indices, so billing is a range check, or for the numpy engines a single
+students × months cross-join with a mask (``active_mask``).
+"""
+from datetime import date
+
+
+def next_month(d):
+    if d.month == 12:
+        return date(d.year + 1, 1, 1)
+    return date(d.year, d.month + 1, 1)
+
+
+def _ordinal(year, month):
+    return year * 12 + month - 1
+
+
+class MonthCalendar:
+    """The months from ``start``'s through ``end``'s (both included)."""
+
+    def __init__(self, start, end):
+        self.dates = []
+        d = start.replace(day=1)
+        while d <= end:
+            self.dates.append(d)
+            d = next_month(d)
+        self.iso = [d.isoformat() for d in self.dates]
+        self.years = [d.year for d in self.dates]
+        self._base = _ordinal(start.year, start.month)
+        self._days = {}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __iter__(self):
+        return iter(self.dates)
+
+    def on_day(self, day):
+        """``date`` of day ``day`` in each month (e.g. the due date), computed once."""
+        if day not in self._days:
+            self._days[day] = [d.replace(day=day) for d in self.dates]
+        return self._days[day]
+
+    def index(self, value):
+        """Month index of a ``date`` or ISO ``'YYYY-MM-DD'`` string (may fall outside the calendar)."""
+        if isinstance(value, str):
+            return _ordinal(int(value[:4]), int(value[5:7])) - self._base
+        return _ordinal(value.year, value.month) - self._base
+
+    def window(self, first='', last=''):
+        """``(lo, hi)`` month indices from the month of ``first`` through the month of ``last``.
+
+        Either bound may be empty (open); the range is clipped to the calendar.
+        A student who drops out in a month is still billed for that month.
+        """
+        lo = max(0, self.index(first)) if first else 0
+        hi = min(len(self.dates), self.index(last) + 1) if last else len(self.dates)
+        return lo, max(lo, hi)
+
+    def active_mask(self, lo, hi):
+        """Cross-join students × months: ``mask[s, m]`` is true when month ``m`` is in ``[lo[s], hi[s])``.
+
+        ``lo``/``hi`` are arrays with one entry per student (see ``window``).
+        """
+        import numpy as np
+
+        months = np.arange(len(self.dates))
+        return (months >= np.asarray(lo)[:, None]) & (months < np.asarray(hi)[:, None])
@@ -0,0 +1,168 @@
+"""NumPy engine for the restaurant orders (generate_restaurant_orders.py).
+
+A day of orders is drawn at once, from a stream of its own
+(``derive_seed(seed, 'pedidos', day)``), so any day can be drawn again
+alone: the orders and their items are written in two passes over the days,
+and shards of days come out the same for any number of workers.
+
+Volumes and mixes follow the sample series of the restaurant dashboards:
+orders per weekday and month (faturamento), the lunch and dinner peaks of
+each channel (faturamento/canais), the channel and payment mixes
+(faturamento/pagamentos), prep and delivery times (operacional/tempos),
+cancellation reasons (operacional/cancelamentos), menu costs (cardapio/cmv)
+and the stars/NPS split (clientes/nps).
+"""
+import numpy as np
+
+from datagen.rng import derive_seed
+from datagen.vectorized import uuid_block
+
+CANAIS = ['Salão', 'iFood / Apps', 'Retirada / Balcão', 'Site Próprio']
+CANAL_SHARE = [0.42, 0.35, 0.13, 0.10]
+# Delivered channels get a delivery fee and time
+ENTREGA = np.array([False, True, False, True])
+# Order lines beyond the first (Poisson mean) and marketplace commission, per channel
+LINHAS_EXTRAS = np.array([1.4, 0.9, 0.4, 1.5])
+COMISSAO = np.array([0.0, 0.23, 0.0, 0.05])
+
+PAGAMENTOS = ['PIX', 'Crédito', 'Débito', 'VA / VR', 'Dinheiro']
+PAGAMENTO_SHARE = [0.38, 0.28, 0.18, 0.12, 0.04]
+TAXA_PAGAMENTO = np.array([0.0, 0.031, 0.015, 0.065, 0.0])
+
+# Relative orders per weekday (Monday first) and per month (January first)
+DIA_SEMANA = [410, 445, 480, 460, 620, 785, 647]
+MES = [178, 172, 187, 175, 172, 165, 168, 170, 166, 158, 165, 195]
+
+# Orders per hour of the day: dine-in/counter and delivery profiles
+_SALAO = {11: 12, 12: 45, 13: 52, 14: 25, 15: 6, 16: 3, 17: 5, 18: 18, 19: 35, 20: 65, 21: 48, 22: 22, 23: 6}
+_DELIVERY = {0: 6, 10: 8, 11: 35, 12: 65, 13: 48, 14: 18, 15: 8, 16: 6, 17: 12, 18: 42, 19: 85, 20: 110, 21: 80,
+             22: 45, 23: 20}
+HORAS = np.array([[profile.get(h, 0) for h in range(24)] for profile in (_SALAO, _DELIVERY)], dtype=float)
+PERFIL = np.array([0, 1, 0, 1])  # hour profile of each channel
+
+MOTIVOS = ['Atraso na entrega', 'Pedido errado', 'Cliente desistiu', 'Item indisponível', 'Qualidade']
+# Late deliveries are cancelled for the delay; other cancellations split by these weights
+MOTIVO_PESO = [28, 18, 15, 8]
+ATRASO_MIN = 45
+
+# (item, categoria, custo, preço de venda, popularidade)
+CARDAPIO = [
+    ('Combo Executivo', 'Pratos', 14.00, 35.00, 16),
+    ('Filé de Frango', 'Pratos', 8.96, 28.00, 12),
+    ('Picanha Grelhada', 'Pratos', 26.60, 70.00, 6),
+    ('Risoto Camarão', 'Pratos', 28.00, 68.00, 5),
+    ('Hambúrguer Artesanal', 'Lanches', 11.40, 34.50, 12),
+    ('Pizza Grande Margherita', 'Pizzas', 17.60, 55.00, 8),
+    ('Carpaccio', 'Entradas', 24.75, 45.00, 4),
+    ('Sobremesa Brownie', 'Sobremesas', 7.00, 20.00, 8),
+    ('Cerveja Chopp 600ml', 'Bebidas', 3.20, 21.00, 14),
+    ('Suco Natural', 'Bebidas', 3.90, 13.00, 15),
+]
+
+# Share of completed orders that answer the survey, stars 1..5 and the NPS range of each star
+RESPOSTA_NPS = 0.2
+ESTRELAS_PESO = [22, 45, 128, 312, 485]
+NPS_FAIXA = np.array([(0, 4), (3, 6), (6, 8), (7, 9), (9, 10)])
+
+
+def _p(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def daily_counts(days, total):
+    """Orders per day: ``total`` split by weekday and month weights, exactly (largest remainder)."""
+    weights = np.array([DIA_SEMANA[d.weekday()] * MES[d.month - 1] for d in days], dtype=float)
+    exact = total * weights / weights.sum()
+    counts = np.floor(exact).astype(np.int64)
+    counts[np.argsort(counts - exact, kind='stable')[:total - int(counts.sum())]] += 1
+    return counts.tolist()
+
+
+class Money:
+    """Renders cents as ``repr(round(x, 2))`` strings through a table grown on demand."""
+
+    def __init__(self):
+        self.table = np.empty(0, dtype=object)
+
+    def __call__(self, values):
+        cents = np.rint(np.asarray(values) * 100).astype(np.int64)
+        top = int(cents.max()) + 1 if cents.size else 0
+        if top > len(self.table):
+            grown = np.array([repr(round(c / 100, 2)) for c in range(len(self.table), top)], dtype=object)
+            self.table = np.concatenate([self.table, grown])
+        return self.table[cents]
+
+
+def optional(values, present):
+    """Integer column as strings, blank (NULL) where not ``present``."""
+    out = np.full(len(values), '', dtype=object)
+    out[present] = np.asarray(values)[present].astype(str).astype(object)
+    return out
+
+
+class OrderEngine:
+    """Draws a day of orders and order lines for the stores ``lojas`` (weighted by ``pesos``)."""
+
+    def __init__(self, lojas, pesos, seed):
+        self.lojas = np.array(lojas, dtype=object)
+        self.pesos = _p(pesos)
+        self.seed = seed
+        self.horas = np.array([_p(h) for h in HORAS])
+        # Kitchen load of each hour (0..1), which slows prep and delivery at the peaks
+        self.carga = HORAS / HORAS.max(axis=1, keepdims=True)
+        self.preco = np.array([c[3] for c in CARDAPIO])
+        self.custo = np.array([c[2] for c in CARDAPIO])
+        self.popularidade = _p([c[4] for c in CARDAPIO])
+
+    def day(self, day, n):
+        """Raw columns of day ``day``'s ``n`` orders (``pedido_*``) and their lines (``linha_*``), by time of day."""
+        rng = np.random.default_rng(derive_seed(self.seed, 'pedidos', day.isoformat()))
+        canal = rng.choice(len(CANAIS), n, p=CANAL_SHARE)
+        hora = np.empty(n, dtype=np.int64)
+        for perfil, p in enumerate(self.horas):
+            mask = PERFIL[canal] == perfil
+            hora[mask] = rng.choice(24, int(mask.sum()), p=p)
+        segundo = hora * 3600 + rng.integers(0, 3600, n)
+        order = np.argsort(segundo, kind='stable')
+        canal, hora, segundo = canal[order], hora[order], segundo[order]
+        loja = rng.choice(len(self.lojas), n, p=self.pesos)
+        pagamento = rng.choice(len(PAGAMENTOS), n, p=PAGAMENTO_SHARE)
+        ids = np.array(uuid_block(rng, n), dtype=object)
+
+        linhas = 1 + rng.poisson(LINHAS_EXTRAS[canal])
+        pedido = np.repeat(np.arange(n), linhas)
+        m = len(pedido)
+        item = rng.choice(len(CARDAPIO), m, p=self.popularidade)
+        quantidade = 1 + (rng.random(m) < 0.12)
+        valor_itens = np.bincount(pedido, weights=quantidade * self.preco[item], minlength=n)
+        desconto = np.where(rng.random(n) < 0.10, np.round(valor_itens * 0.10, 2), 0.0)
+        taxa_entrega = np.where(ENTREGA[canal], rng.integers(4, 13, n) + 0.99, 0.0)
+        valor_total = valor_itens - desconto + taxa_entrega
+        taxa_plataforma = np.round(valor_itens * COMISSAO[canal] + valor_total * TAXA_PAGAMENTO[pagamento], 2)
+
+        carga = self.carga[PERFIL[canal], hora]
+        preparo = np.maximum(3, np.rint(rng.gamma(8.0, (12 + 8 * carga) / 8.0))).astype(np.int64)
+        entrega = np.maximum(5, np.rint(rng.gamma(6.0, (22 + 12 * carga) / 6.0))).astype(np.int64)
+        entregue = ENTREGA[canal]
+        atraso = entregue & (entrega > ATRASO_MIN)
+        cancelado = rng.random(n) < 0.02 + 0.20 * atraso
+        motivo = np.where(atraso, 0, 1 + rng.choice(len(MOTIVO_PESO), n, p=_p(MOTIVO_PESO)))
+        responde = ~cancelado & (rng.random(n) < RESPOSTA_NPS)
+        estrelas = 1 + rng.choice(5, n, p=_p(ESTRELAS_PESO))
+        estrelas = np.where(atraso, np.maximum(1, estrelas - 1), estrelas)
+        lo, hi = NPS_FAIXA[estrelas - 1].T
+        nps = rng.integers(lo, hi + 1)
+        return {
+            'day': day, 'n': n,
+            'pedido_id': ids, 'pedido_loja': loja, 'pedido_canal': canal, 'pedido_hora': hora,
+            'pedido_segundo': segundo, 'pedido_pagamento': pagamento,
+            'pedido_itens': np.bincount(pedido, weights=quantidade, minlength=n).astype(np.int64),
+            'pedido_valor_itens': valor_itens, 'pedido_desconto': desconto, 'pedido_taxa_entrega': taxa_entrega,
+            'pedido_valor_total': valor_total, 'pedido_taxa_plataforma': taxa_plataforma,
+            'pedido_preparo': preparo, 'pedido_entrega': entrega, 'pedido_entregue': entregue,
+            'pedido_cancelado': cancelado, 'pedido_motivo': motivo, 'pedido_responde': responde,
+            'pedido_estrelas': estrelas, 'pedido_nps': nps,
+            'linha_id': np.array(uuid_block(rng, m), dtype=object), 'linha_pedido': pedido,
+            'linha_item': item, 'linha_quantidade': quantidade.astype(np.int64),
+        }
@@ -0,0 +1,297 @@
+"""Hive-style partitioned output: ``<table>/escola_id=<id>/ano=<year>/part-0.<ext>``.
+
+``PartitionedSink`` stands in for the file sinks (same interface) and sends
+each row to the directory of its tenant and year, so loaders and readers
+(pyarrow.dataset, DuckDB and Spark all read the ``key=value`` layout) can
+prune to one school or one year. Rows are buffered per partition and
+flushed ``chunk_size`` at a time; numpy blocks are split per partition.
+
+Each table directory gets a ``_partitions.json`` manifest listing, for every
+partition, its key values, file, row count and the min/max of each date and
+numeric column of the table schema. ``load_data.py --escola-id/--ano``
+uses it to reload a single tenant or year.
+"""
+import json
+import os
+import shutil
+from collections import defaultdict
+from itertools import islice
+
+from datagen import compress
+from datagen.sharding import merge_csv_parts
+from datagen.writers import CHUNK_SIZE, CsvBlockWriter, update_csv
+
+MANIFEST = '_partitions.json'
+PART = 'part-0'
+KEYS = ('escola_id', 'ano')
+# Hive's name for rows whose partition column is blank
+DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def year_of(value):
+    """Partition value for a year/date column: ``2025``, ``'2025-03-01'`` and ``date(2025, 3, 1)`` -> ``'2025'``."""
+    if value is None or value == '':
+        return DEFAULT_PARTITION
+    if hasattr(value, 'year'):
+        return str(value.year)
+    return str(value)[:4]
+
+
+def _stat_columns(schema):
+    return [c for c, t in schema.items()
+            if t in ('date', 'timestamptz', 'integer', 'bigint') or t.startswith('numeric')]
+
+
+def _bounds(values, convert=None):
+    """(min, max) of a column chunk (list or numpy array), ignoring blanks."""
+    if hasattr(values, 'dtype') and values.dtype.kind in 'iuf':
+        return (values.min().item(), values.max().item()) if values.size else None
+    values = values.tolist() if hasattr(values, 'tolist') else values
+    values = [v for v in values if v is not None and v != '']
+    if convert:
+        # Numbers may arrive as text (CSV rows, format_fixed columns)
+        values = [convert(v) if isinstance(v, str) else v for v in values]
+    return (min(values), max(values)) if values else None
+
+
+def read_manifest(table_dir):
+    """The manifest of a partitioned table directory, or ``None``."""
+    try:
+        with open(os.path.join(table_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def select(manifest, escola_id=None, ano=None):
+    """Partitions of ``manifest`` matching the given key values (all when ``None``)."""
+    return [p for p in manifest['partitions']
+            if (escola_id is None or p['escola_id'] == escola_id) and (ano is None or p.get('ano') == str(ano))]
+
+
+class _Table:
+    """Partition files and manifest of one table while it is being written."""
+
+    def __init__(self, sink, name, reset=None):
+        self.sink = sink
+        self.name = name
+        self.dir = os.path.join(sink.out_dir, name)
+        schema = sink.schemas.get(name, {})
+        self.stats = _stat_columns(schema)
+        self.convert = {c: float if schema[c].startswith('numeric') else int
+                        for c in self.stats if schema[c] not in ('date', 'timestamptz')}
+        # A new run replaces the table; --append continues its partitions
+        reset = not sink.append if reset is None else reset
+        manifest = None if reset else read_manifest(self.dir)
+        if manifest is None:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            tenant, period = sink.spec.get(name, (None, None))
+            manifest = {'table': name, 'partition_by': {'escola_id': tenant, 'ano': period}, 'partitions': []}
+            if isinstance(tenant, tuple):
+                column, parent, key, parent_tenant = tenant
+                manifest['partition_by']['escola_id'] = column
+                manifest['tenant_via'] = {'table': parent, 'key': key, 'column': parent_tenant}
+        self.manifest = manifest
+        self.entries = {p['path']: p for p in manifest['partitions']}
+        self.writers = {}
+        self.total = 0
+
+    def entry(self, part):
+        rel = '/'.join(f'{k}={v}' for k, v in zip(KEYS, part)) + '/' + PART + self.sink.suffix
+        if rel not in self.entries:
+            os.makedirs(os.path.join(self.dir, os.path.dirname(rel)), exist_ok=True)
+            entry = self.entries[rel] = dict(zip(KEYS, part), path=rel, rows=0, min={}, max={})
+            self.manifest['partitions'].append(entry)
+        return self.entries[rel]
+
+    def add_stats(self, entry, columns):
+        for col in self.stats:
+            if col not in columns:
+                continue
+            bounds = _bounds(columns[col], self.convert.get(col))
+            if bounds is None:
+                continue
+            lo, hi = bounds
+            entry['min'][col] = lo if col not in entry['min'] else min(entry['min'][col], lo)
+            entry['max'][col] = hi if col not in entry['max'] else max(entry['max'][col], hi)
+
+    def write(self, part, block, nrows):
+        """Append a column block (dict of lists/arrays) of ``nrows`` rows to partition ``part``."""
+        entry = self.entry(part)
+        filename = os.path.join(self.dir, entry['path'])
+        # One open writer per partition until close (a compressed CSV keeps its frames and threads)
+        writer = self.writers.get(part)
+        if writer is None:
+            if self.sink.fmt == 'csv':
+                # A file already there is a partition an --append continues
+                writer = self.writers[part] = CsvBlockWriter(filename, append=True)
+            else:
+                from datagen.columnar import ColumnarWriter, arrow_schema
+                if os.path.exists(filename):
+                    raise ValueError(f'{filename}: {self.sink.fmt} partitions cannot be appended to')
+                writer = self.writers[part] = ColumnarWriter(
+                    filename, arrow_schema(block.keys(), self.sink.schemas.get(self.name, {})), self.sink.fmt)
+        if self.sink.fmt == 'csv':
+            writer.write(block)
+        else:
+            writer.write_columns(block)
+        entry['rows'] += nrows
+        self.add_stats(entry, block)
+        self.total += nrows
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.save()
+        if not self.sink.quiet:
+            verb = 'Appended to' if self.sink.append else 'Generated'
+            print(f"{verb} {self.dir} ({self.total} rows, {len(self.entries)} partitions)")
+        return self.total
+
+    def save(self):
+        self.manifest['partitions'].sort(key=lambda p: p['path'])
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = os.path.join(self.dir, MANIFEST + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1, default=str)
+        os.replace(tmp, os.path.join(self.dir, MANIFEST))
+
+
+class PartitionedSink:
+    """Destination that writes each table to ``<out_dir>/<name>/escola_id=<id>/ano=<year>/``.
+
+    ``spec`` maps table -> ``(tenant_column, period_column)``; either may be
+    ``None``. Rows of tables without a tenant column go under ``tenant``
+    (the school of the run); without a period column there is no ``ano=``
+    level. The tenant may also come through a parent table, as
+    ``(column, parent, parent_key, parent_tenant_column)`` (e.g. a fact's
+    ``aluno_id`` -> ``alunos.escola_id``): the rows go under ``tenant`` too,
+    and the manifest records the link (``tenant_via``) so a loader can
+    delete one tenant's rows. ``fmt``/``schemas``/``compression`` are as for
+    the flat sinks.
+    """
+
+    def __init__(self, out_dir='.', spec=None, tenant=None, fmt='csv', schemas=None, chunk_size=CHUNK_SIZE,
+                 quiet=False, append=False, compression=None):
+        self.out_dir = out_dir
+        self.spec = spec or {}
+        self.tenant = tenant
+        self.fmt = fmt
+        self.schemas = schemas or {}
+        self.chunk_size = chunk_size
+        self.quiet = quiet
+        self.append = append
+        self.compression = compression
+        if fmt == 'csv':
+            self.suffix = '.csv' + (compress.SUFFIXES[compression] if compression else '')
+        else:
+            self.suffix = f'.{fmt}'
+
+    def path(self, name):
+        """The table directory (holds the partitions and ``_partitions.json``)."""
+        return os.path.join(self.out_dir, name)
+
+    def _keys(self, name, columns, n):
+        """Partition key tuple for each of the ``n`` rows of a column block."""
+        tenant_col, period_col = self.spec.get(name, (None, None))
+        # A tenant through a parent table is the run's
+        tenants = columns[tenant_col] if tenant_col and not isinstance(tenant_col, tuple) else None
+        tenants = tenants.tolist() if hasattr(tenants, 'tolist') else tenants
+        if period_col is None:
+            return [(str(t),) for t in tenants] if tenants is not None else [(str(self.tenant),)] * n
+        periods = columns[period_col]
+        periods = periods.tolist() if hasattr(periods, 'tolist') else periods
+        years = {}
+        keys = []
+        for i, value in enumerate(periods):
+            year = years.get(value)
+            if year is None:
+                year = years[value] = year_of(value)
+            keys.append((str(tenants[i] if tenants is not None else self.tenant), year))
+        return keys
+
+    def write_blocks(self, name, blocks):
+        table = _Table(self, name)
+        for block in blocks:
+            n = len(next(iter(block.values())))
+            groups = defaultdict(list)
+            for i, key in enumerate(self._keys(name, block, n)):
+                groups[key].append(i)
+            for part, rows in groups.items():
+                if len(groups) == 1:
+                    table.write(part, block, n)
+                    break
+                table.write(part, {k: _take(v, rows) for k, v in block.items()}, len(rows))
+        return table.close()
+
+    def write_rows(self, name, rows):
+        rows = iter(rows)
+
+        def blocks():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    return
+                if self.fmt == 'csv':
+                    # Rendered as csv.DictWriter would, for CsvBlockWriter
+                    yield {k: ['' if r[k] is None else str(r[k]) for r in chunk] for k in chunk[0]}
+                else:
+                    yield {k: [r[k] for r in chunk] for k in chunk[0]}
+        return self.write_blocks(name, blocks())
+
+    def update_rows(self, name, key, updates):
+        if self.fmt != 'csv':
+            raise ValueError(f'{self.fmt} partitions cannot be updated in place')
+        table = _Table(self, name, reset=False)
+        updates = list(updates)
+        columns = {k: [u[k] for u in updates] for k in (updates[0] if updates else {})}
+        total = 0
+        for entry in table.manifest['partitions']:
+            matched = update_csv(os.path.join(table.dir, entry['path']), key, updates, self.chunk_size)
+            if matched:
+                # Widened with every update: the bounds stay valid for pruning
+                table.add_stats(entry, columns)
+            total += matched
+        table.save()
+        return total
+
+    def merge(self, name, parts):
+        """Combine shard outputs (``(table_dir, rows)``) partition by partition, in shard order."""
+        table = _Table(self, name)
+        files = defaultdict(list)
+        for table_dir, rows in parts:
+            manifest = read_manifest(table_dir) if rows else None
+            for p in manifest['partitions'] if manifest else []:
+                part = tuple(p[k] for k in KEYS if k in p)
+                files[part].append((os.path.join(table_dir, p['path']), p['rows']))
+                entry = table.entry(part)
+                entry['rows'] += p['rows']
+                for col in p['min']:
+                    table.add_stats(entry, {col: [p['min'][col], p['max'][col]]})
+        for part, part_files in files.items():
+            filename = os.path.join(table.dir, table.entry(part)['path'])
+            if self.fmt != 'csv':
+                from datagen.columnar import ColumnarSink
+                ColumnarSink(os.path.dirname(filename), self.fmt, quiet=True).merge(PART, part_files)
+            elif self.compression:
+                compress.merge_frames(filename, part_files, quiet=True)
+            else:
+                merge_csv_parts(filename, part_files, quiet=True)
+            table.total += sum(rows for _, rows in part_files)
+        return table.close()
+
+    # Same lifecycle as the other file sinks
+    def prepare(self, names):
+        pass
+
+    def finish(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _take(column, rows):
+    if hasattr(column, 'dtype'):
+        return column[rows]
+    return [column[i] for i in rows]
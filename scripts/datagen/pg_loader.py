@@ -0,0 +1,446 @@
+"""Bulk load generated tables straight into Postgres with ``COPY FROM STDIN``.
+
+Replaces the CSV -> manual import / ``/api/seed`` row-by-row ``INSERT`` path.
+Only the columns that exist in the target table are copied (the generators
+emit a few extra ones, e.g. ``alunos.unidade`` on databases created from
+``supabase_schema.sql`` alone), and tables missing from the database are
+skipped.
+
+Requires psycopg 3 (``pip install "psycopg[binary]"``).
+"""
+import csv
+import io
+import queue
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from itertools import chain
+
+import psycopg
+
+from datagen import compress
+from datagen.writers import block_rows
+
+BATCH_ROWS = 5000
+
+_SECONDARY_INDEXES = """
+    SELECT c.relname, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = %s::regclass
+      AND NOT i.indisprimary
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+"""
+
+_FOREIGN_KEYS = """
+    SELECT DISTINCT conrelid::regclass::text, confrelid::regclass::text FROM pg_constraint WHERE contype = 'f'
+"""
+
+
+def _null_if_empty(v):
+    return None if v == '' else v
+
+
+def _parse_timestamp(v):
+    dt = datetime.fromisoformat(v.replace('Z', '+00:00'))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _parse_bool(v):
+    return v if isinstance(v, bool) else str(v).lower() == 'true'
+
+
+# Python-side conversions for FORMAT BINARY, keyed by information_schema data_type
+_BINARY_CONVERTERS = {
+    'uuid': lambda v: v if isinstance(v, uuid.UUID) else uuid.UUID(v),
+    'date': lambda v: v if isinstance(v, date) else date.fromisoformat(v),
+    'timestamp with time zone': lambda v: _parse_timestamp(str(v)),
+    'numeric': lambda v: Decimal(str(v)),
+    'integer': int,
+    'bigint': int,
+    'smallint': int,
+    'boolean': _parse_bool,
+}
+
+_BINARY_TYPES = {
+    'timestamp with time zone': 'timestamptz',
+    # char/varchar share text's binary wire format
+    'character': 'text',
+    'character varying': 'text',
+    'integer': 'int4',
+    'bigint': 'int8',
+    'smallint': 'int2',
+    'boolean': 'bool',
+}
+
+
+def _binary_converter(data_type):
+    conv = _BINARY_CONVERTERS.get(data_type, str)
+
+    def convert(v):
+        if v is None or v == '':
+            return None
+        return conv(v)
+    return convert
+
+
+class PgSink:
+    """Sink that streams each table into Postgres instead of a CSV file.
+
+    ``table_map`` renames generator tables to database tables (e.g.
+    ``dim_alunos`` -> ``alunos``). Tables referenced by a foreign key are
+    copied synchronously so their rows are committed before dependents
+    start; every other table is copied by a background thread over its own
+    connection, so independent tables load in parallel while the caller
+    keeps generating. ``fmt`` is ``'text'`` or ``'binary'`` COPY format;
+    text is the default because the generators produce strings and the
+    per-value conversions binary needs cost more than the server-side parse.
+    ``cascade`` lets ``prepare`` empty tables that reference the loaded
+    ones even when they hold rows.
+    """
+
+    def __init__(self, dsn, table_map=None, fmt='text', cascade=False):
+        self.dsn = dsn
+        self.table_map = table_map or {}
+        self.fmt = fmt
+        self.cascade = cascade
+        self._threads = []
+        self._errors = []
+        self._dropped_indexes = []
+        with psycopg.connect(dsn) as conn:
+            rows = conn.execute(
+                "SELECT table_name, column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = current_schema() ORDER BY table_name, ordinal_position"
+            ).fetchall()
+            foreign_keys = conn.execute(_FOREIGN_KEYS).fetchall()
+        self.references = {}
+        for child, parent in foreign_keys:
+            self.references.setdefault(child, set()).add(parent)
+        self.parents = {parent for _, parent in foreign_keys}
+        self.columns = {}
+        for table, column, data_type in rows:
+            self.columns.setdefault(table, {})[column] = data_type
+
+    def table(self, name):
+        return self.table_map.get(name, name)
+
+    def load_order(self, names):
+        """``names`` sorted so every table comes after the tables it references."""
+        by_table = {self.table(n): n for n in names}
+        order, seen = [], set()
+
+        def visit(table):
+            if table in seen:
+                return
+            seen.add(table)
+            for parent in sorted(self.references.get(table, ())):
+                visit(parent)
+            if table in by_table:
+                order.append(by_table[table])
+        for name in names:
+            visit(self.table(name))
+        return order
+
+    def dependents(self, tables):
+        """Tables outside ``tables`` that reference them through foreign keys, directly or not."""
+        found, todo = set(), set(tables)
+        while todo:
+            todo = {child for child, parents in self.references.items()
+                    if parents & todo and child not in found and child not in tables}
+            found |= todo
+        return sorted(found)
+
+    def check_dependents(self, tables, doing='truncating', effect='empty'):
+        """Dependent tables (``dependents``) holding rows; ``ValueError`` if there are any, unless ``cascade``."""
+        with psycopg.connect(self.dsn) as conn:
+            filled = [t for t in self.dependents(tables)
+                      if conn.execute(f'SELECT EXISTS (SELECT 1 FROM {t})').fetchone()[0]]
+        if filled and not self.cascade:
+            raise ValueError(f"{doing} {', '.join(tables)} would also {effect} {', '.join(filled)} "
+                             f"(foreign keys): load them in the same run or pass --truncate-cascade")
+        return filled
+
+    def prepare(self, names, truncate=True):
+        """Truncate the target tables and drop their secondary indexes.
+
+        Tables that reference the targets and are not loaded here are only
+        emptied along with them when they hold no rows, or with ``cascade``;
+        otherwise nothing is truncated and ``ValueError`` lists them. Call
+        once before loading (from the parent process when sharding);
+        ``finish`` recreates the indexes afterwards.
+        """
+        tables = [t for t in dict.fromkeys(self.table(n) for n in names) if t in self.columns]
+        if truncate and tables:
+            filled = self.check_dependents(tables, 'truncating', 'empty')
+            if filled:
+                print(f"Truncating {', '.join(filled)} too (they reference {', '.join(tables)})")
+        with psycopg.connect(self.dsn) as conn:
+            if truncate and tables:
+                conn.execute('TRUNCATE TABLE {}'.format(', '.join(tables + self.dependents(tables))))
+            for table in tables:
+                for index, definition in conn.execute(_SECONDARY_INDEXES, (table,)).fetchall():
+                    conn.execute(f'DROP INDEX IF EXISTS {index}')
+                    self._dropped_indexes.append((table, definition))
+        return tables
+
+    def delete_partition(self, name, columns, values, via=None):
+        """Delete the rows of table ``name`` in one partition of a partitioned output, before reloading it.
+
+        ``columns`` maps the partition keys to table columns (``partition_by``
+        in ``_partitions.json``) and ``values`` gives ``escola_id`` and/or
+        ``ano``; ``ano`` matches a year column or the year of a date column.
+        With ``via`` (``tenant_via``: parent ``table``, its ``key`` and its
+        tenant ``column``) the ``escola_id`` column references the parent, and
+        the rows referencing that school's parent rows are deleted. Foreign
+        keys with ``ON DELETE CASCADE`` remove dependent rows too: see
+        ``check_dependents``.
+        """
+        table = self.table(name)
+        where, params = [], []
+        for key, value in values.items():
+            column = columns.get(key)
+            if column is None:
+                raise ValueError(f'{table} has no column for {key}: reload it whole (or with --no-truncate)')
+            if key == 'escola_id' and via:
+                where.append(f'"{column}" IN (SELECT "{via["key"]}" FROM {self.table(via["table"])} '
+                             f'WHERE "{via["column"]}" = %s)')
+                params.append(value)
+            elif key == 'ano' and self.columns[table][column] not in ('integer', 'smallint', 'bigint'):
+                where.append(f'"{column}" >= %s AND "{column}" < %s')
+                params += [date(int(value), 1, 1), date(int(value) + 1, 1, 1)]
+            else:
+                where.append(f'"{column}" = %s')
+                params.append(int(value) if key == 'ano' else value)
+        with psycopg.connect(self.dsn) as conn:
+            deleted = conn.execute(f'DELETE FROM {table} WHERE ' + ' AND '.join(where), params).rowcount
+        print(f"Deleted {table} partition {', '.join(f'{k}={v}' for k, v in values.items())} ({deleted} rows)")
+        return deleted
+
+    def finish(self):
+        """Recreate the indexes dropped by ``prepare`` and refresh planner stats.
+
+        Runs even if a copy failed, so an aborted load never leaves the
+        tables without their indexes.
+        """
+        try:
+            self.close()
+        finally:
+            with psycopg.connect(self.dsn, autocommit=True) as conn:
+                for _, definition in self._dropped_indexes:
+                    conn.execute(definition)
+                for table in dict.fromkeys(t for t, _ in self._dropped_indexes):
+                    conn.execute(f'ANALYZE {table}')
+            self._dropped_indexes = []
+
+    def write_rows(self, name, rows):
+        rows = iter(rows)
+        first = next(rows, None)
+        table = self.table(name)
+        if first is None:
+            return 0
+        if table not in self.columns:
+            # Still drain the generator: later tables depend on the RNG state
+            total = 1 + sum(1 for _ in rows)
+            print(f"Skipped {name}: table {table} not found ({total} rows)")
+            return total
+
+        keys = [k for k in first if k in self.columns[table]]
+        dropped = [k for k in first if k not in self.columns[table]]
+        if dropped:
+            print(f"  {table}: ignoring columns not in the database: {', '.join(dropped)}")
+        convs = [self._converter(table, k) for k in keys]
+
+        def batches():
+            batch = []
+            for row in chain([first], rows):
+                batch.append(tuple(c(row[k]) for k, c in zip(keys, convs)))
+                if len(batch) >= BATCH_ROWS:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        if table in self.parents:
+            total = self._copy(table, keys, batches())
+            print(f"Loaded {table} ({total} rows)")
+            return total
+        return self._copy_in_background(table, keys, batches())
+
+    def write_blocks(self, name, blocks):
+        return self.write_rows(name, block_rows(blocks))
+
+    def update_rows(self, name, key, updates):
+        """Apply ``updates`` (dicts matched on column ``key``, or a tuple of columns) with ``UPDATE``.
+
+        Used by incremental runs for the few rows that change state (e.g.
+        an aluno becoming Evadido); columns not in the table are ignored.
+        """
+        table = self.table(name)
+        if not updates or table not in self.columns:
+            return 0
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        cols = [k for k in updates[0] if k not in keys and k in self.columns[table]]
+        convs = [self._converter(table, k) for k in cols]
+        sql = 'UPDATE {} SET {} WHERE {}'.format(
+            table, ', '.join(f'"{c}" = %s' for c in cols), ' AND '.join(f'"{k}" = %s' for k in keys))
+        with psycopg.connect(self.dsn) as conn:
+            conn.cursor().executemany(
+                sql, [tuple(c(u[k]) for k, c in zip(cols, convs)) + tuple(u[k] for k in keys) for u in updates])
+        print(f"Updated {table} ({len(updates)} rows)")
+        return len(updates)
+
+    def upsert_rows(self, name, key, rows):
+        """Insert ``rows``, replacing the rows with the same ``key`` (the primary key), in one transaction.
+
+        Used to refresh the rows of a few students (build_risk_features.py);
+        columns not in the table are ignored.
+        """
+        table = self.table(name)
+        rows = list(rows)
+        if not rows or table not in self.columns:
+            return 0
+        cols = [k for k in rows[0] if k in self.columns[table]]
+        convs = [self._converter(table, k) for k in cols]
+        sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ("{}") DO UPDATE SET {}'.format(
+            table, ', '.join(f'"{c}"' for c in cols), ', '.join(['%s'] * len(cols)), key,
+            ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in cols if c != key))
+        with psycopg.connect(self.dsn) as conn:
+            conn.cursor().executemany(sql, [tuple(c(r[k]) for k, c in zip(cols, convs)) for r in rows])
+        print(f"Upserted {table} ({len(rows)} rows)")
+        return len(rows)
+
+    def copy_file(self, name, filename, workers=1):
+        """Load a CSV written by the generators (plain, ``.gz`` or ``.zst``) into table ``name``.
+
+        With a ``.frames.json`` sidecar (see ``datagen.compress``) the frames
+        are split among ``workers`` threads, each decompressing and running
+        its own ``COPY``; otherwise the file is streamed through one ``COPY``.
+        When every CSV column exists in the table the decompressed bytes go
+        to the server as they are; else the rows are parsed and the extra
+        columns dropped.
+        """
+        table = self.table(name)
+        if table not in self.columns:
+            print(f"Skipped {name}: table {table} not found")
+            return 0
+        with compress.open_input(filename) as f:
+            header = next(csv.reader(f), None)
+        if header is None:
+            return 0
+        keep = [i for i, k in enumerate(header) if k in self.columns[table]]
+        dropped = [k for k in header if k not in self.columns[table]]
+        if dropped:
+            print(f"  {table}: ignoring columns not in the database: {', '.join(dropped)}")
+
+        frames = compress.read_index(filename) if compress.codec_for(filename) else None
+        if frames:
+            groups = [frames[1:][i::workers] for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                total = sum(pool.map(lambda g: self._copy_csv(table, header, keep, compress.read_frames(filename, g)),
+                                     [g for g in groups if g]))
+        else:
+            total = self._copy_csv(table, header, keep, _after_header(filename))
+        print(f"Loaded {table} ({total} rows)")
+        return total
+
+    def _copy_csv(self, table, header, keep, chunks):
+        """COPY CSV data (``chunks`` of bytes holding whole rows, no header) into ``table``."""
+        cols = [header[i] for i in keep]
+        # Empty unquoted fields are NULL in CSV COPY; keep them '' for text, as write_rows does
+        text = [k for k in cols if self.columns[table][k] in ('text', 'character varying', 'character')]
+        options = 'FORMAT csv' + (', FORCE_NOT_NULL ({})'.format(', '.join(f'"{k}"' for k in text)) if text else '')
+        sql = 'COPY {} ({}) FROM STDIN ({})'.format(table, ', '.join(f'"{k}"' for k in cols), options)
+        with psycopg.connect(self.dsn) as conn:
+            cur = conn.cursor()
+            with cur.copy(sql) as cp:
+                for chunk in chunks:
+                    if len(keep) < len(header):
+                        buf = io.StringIO()
+                        reader = csv.reader(io.StringIO(chunk.decode('utf-8'), newline=''))
+                        csv.writer(buf).writerows([r[i] for i in keep] for r in reader)
+                        chunk = buf.getvalue().encode('utf-8')
+                    cp.write(chunk)
+            return cur.rowcount
+
+    def close(self):
+        """Wait for background copies; re-raise the first failure."""
+        for t in self._threads:
+            t.join()
+        self._threads = []
+        if self._errors:
+            raise self._errors[0]
+
+    def _converter(self, table, column):
+        data_type = self.columns[table][column]
+        if self.fmt == 'binary':
+            return _binary_converter(data_type)
+        if data_type in ('text', 'character varying', 'character'):
+            return lambda v: v
+        return _null_if_empty
+
+    def _copy(self, table, keys, batches):
+        cols = ', '.join(f'"{k}"' for k in keys)
+        total = 0
+        with psycopg.connect(self.dsn) as conn:
+            with conn.cursor().copy(f'COPY {table} ({cols}) FROM STDIN (FORMAT {self.fmt.upper()})') as cp:
+                if self.fmt == 'binary':
+                    cp.set_types([_BINARY_TYPES.get(self.columns[table][k], self.columns[table][k]) for k in keys])
+                for batch in batches:
+                    for row in batch:
+                        cp.write_row(row)
+                    total += len(batch)
+        return total
+
+    def _copy_in_background(self, table, keys, batches):
+        # Rows are still produced (and the RNG consumed) in the caller's
+        # thread; only the COPY runs concurrently.
+        q = queue.Queue(maxsize=8)
+        failed = []
+
+        ended = False
+
+        def received():
+            nonlocal ended
+            yield from iter(q.get, None)
+            ended = True
+
+        def consume():
+            try:
+                total = self._copy(table, keys, received())
+                print(f"Loaded {table} ({total} rows)")
+            except Exception as e:
+                failed.append(e)
+                self._errors.append(e)
+                # Unblock the producer; the sentinel may already be consumed (COPY fails at the end)
+                while not ended and q.get() is not None:
+                    pass
+
+        t = threading.Thread(target=consume, name=f'copy-{table}')
+        t.start()
+        self._threads.append(t)
+        total = 0
+        for batch in batches:
+            if failed:
+                # The COPY failed mid-stream: stop producing rows and raise here rather than at close
+                q.put(None)
+                t.join()
+                self._threads.remove(t)
+                self._errors.remove(failed[0])
+                raise failed[0]
+            q.put(batch)
+            total += len(batch)
+        q.put(None)
+        return total
+
+
+def _after_header(filename, size=1 << 20):
+    # Decompressed bytes of ``filename`` after its header line, in chunks of whole lines
+    with compress.open_input(filename) as f:
+        f.readline()
+        while True:
+            lines = f.readlines(size)
+            if not lines:
+                return
+            yield ''.join(lines).encode('utf-8')
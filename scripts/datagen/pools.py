@@ -0,0 +1,89 @@
+"""Pre-built sampling pools for the Faker-derived text columns.
+
+Calling ``fake.name()`` / ``fake.sentence()`` per row costs ~15us each and
+importing Faker adds to startup. Instead the vocabularies (names, bairros,
+lorem words) are drawn from Faker once, cached as JSON and sampled with plain
+integer indices afterwards. Faker is only imported when the cache has to be
+(re)built.
+
+The cache lives in ``$DATAGEN_CACHE_DIR`` (default ``~/.cache/ensitec-datagen``)
+and is keyed by locale, pool size, seed and ``POOL_VERSION``; bump the version
+when the pool contents change.
+"""
+import json
+import os
+import random
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+POOL_VERSION = 1
+POOL_SIZE = 10000
+
+Pools = namedtuple('Pools', ['names', 'names_male', 'names_female', 'bairros', 'words'])
+
+
+def cache_dir():
+    return os.environ.get('DATAGEN_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'ensitec-datagen')
+
+
+def _build(locale, size, seed):
+    from faker import Faker
+
+    fake = Faker(locale)
+    fake.seed_instance(seed)
+    return Pools(
+        names=[fake.name() for _ in range(size)],
+        names_male=[fake.name_male() for _ in range(size)],
+        names_female=[fake.name_female() for _ in range(size)],
+        # Closed vocabularies: take the provider lists whole
+        bairros=sorted(set(fake.bairro() for _ in range(size))),
+        words=list(fake.get_words_list()),
+    )
+
+
+@lru_cache(maxsize=None)
+def load_pools(locale='pt_BR', size=POOL_SIZE, seed=0):
+    """Return the ``Pools`` for ``locale``, building and caching them on first use."""
+    path = os.path.join(cache_dir(), f'pools-{locale}-v{POOL_VERSION}-{size}-{seed}.json')
+    try:
+        with open(path, encoding='utf-8') as f:
+            return Pools(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        pass
+
+    pools = _build(locale, size, seed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename, so concurrent shard processes never read a partial file
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(pools._asdict(), f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return pools
+
+
+def sentence(words, nb_words=6, rng=random):
+    """Lorem sentence like ``Faker.sentence``: ``nb_words`` +/-40%, capitalized, with a period."""
+    n = max(1, rng.randint(nb_words * 60 // 100, nb_words * 140 // 100))
+    picked = rng.choices(words, k=n)
+    picked[0] = picked[0].title()
+    return ' '.join(picked) + '.'
+
+
+def date_of_birth(min_age, max_age, today, rng=random):
+    """Birth date for an age in ``[min_age, max_age]`` on ``today``.
+
+    Same range as ``Faker.date_of_birth``, but relative to a fixed date
+    instead of the clock, so output does not change from one day to the next.
+    """
+    end = _years_before(today, min_age)
+    start = _years_before(today, max_age + 1) + timedelta(days=1)
+    return start + timedelta(days=rng.randint(0, (end - start).days))
+
+
+def _years_before(d, years):
+    try:
+        return d.replace(year=d.year - years)
+    except ValueError:  # 29/02
+        return d.replace(year=d.year - years, day=28)
+
@@ -0,0 +1,413 @@
+"""Per-student risk features (aluno_risk_features) for the risk and evasion dashboards.
+
+The risco, evasão and health-score pages look at signals spread over three
+fact tables: the grade trend across bimestres, attendance and delivery
+(desempenho_academico), the run of late bills (financeiro_mensalidades)
+and the unit's NPS and health score (metricas_mensais). A ``RiskFacts``
+gathers them per student while the facts stream, as rows (the Python
+generators, CSVs, the database) or numpy blocks (the numpy engine), into
+fixed-size arrays:
+
+* per student and period (a bimestre of a year): the row count, the sums
+  of media_final, percentual_presenca and taxa_entrega_atividades and the
+  rows with media below 6.0;
+* per student and month: the status of the bill (0 when there is none);
+* per student: the rows the academic dashboard counts at risk (media
+  below 6.0 or presença below 75%, as app/api/dashboard/academico);
+* per unidade: the latest nps and health_score.
+
+``features`` computes every column for all students at once and ``blocks``
+yields the table for ``write_blocks``. Students are positions in the order
+they were added, and one student's features only depend on their own facts:
+partial facts (one per shard) combine with ``update``, and
+build_risk_features.py recomputes just the students whose facts changed.
+``collect`` reads the facts back from the CSVs (``csv_rows``) or the
+database (``db_rows``), for build_risk_features.py and the --append runs of
+generate_final_data.py.
+
+score_risco (0-100) weighs one component per signal (``SCORE``), each a
+linear ramp from 0 (no concern) to 1; a signal a student has no data for
+adds nothing. nivel_risco buckets the score (``NIVEIS``).
+"""
+import os
+from array import array
+from datetime import date
+
+import numpy as np
+
+from datagen.partitions import read_manifest
+from datagen.vectorized import format_fixed
+from datagen.writers import CsvSink, CsvSource, CHUNK_SIZE
+
+BIMESTRES = 4
+BILL_STATUS = ['Pago', 'Atrasado', 'Pendente']
+ATTRS = ('escola_id', 'unidade', 'segmento', 'turma', 'status_matricula')
+# Same rule as the academic dashboard's "Alunos em Risco"
+RISCO_NOTA, RISCO_PRESENCA = 6.0, 75
+# feature: (weight, value scoring 0, value scoring 1)
+SCORE = {
+    'media_atual': (0.30, 7.0, 2.0),
+    'tendencia_nota': (0.15, 0.0, -1.0),  # points per bimestre
+    'presenca_atual': (0.25, 90.0, 60.0),
+    'entrega_media': (0.10, 90.0, 40.0),
+    'atraso_consecutivo': (0.15, 0, 3),  # months
+    'nps_unidade': (0.05, 90.0, 60.0),
+}
+NIVEIS = [(50, 'Alto'), (25, 'Médio'), (0, 'Baixo')]
+METRICAS = ('nps', 'health_score')
+FLUSH_ROWS = 1 << 16
+BLOCK_STUDENTS = 50000
+# Columns read from each source table
+SOURCES = {
+    'alunos': ['id', 'escola_id', 'unidade', 'segmento', 'turma', 'status_matricula'],
+    'desempenho_academico': ['aluno_id', 'ano_letivo', 'bimestre', 'media_final', 'percentual_presenca',
+                             'taxa_entrega_atividades'],
+    'financeiro_mensalidades': ['aluno_id', 'mes_referencia', 'status_pagamento'],
+    'metricas_mensais': ['unidade_escolar', 'mes_referencia', 'tipo_metrica', 'valor'],
+}
+STUDENT_KEYS = {'alunos': 'id', 'desempenho_academico': 'aluno_id', 'financeiro_mensalidades': 'aluno_id'}
+
+# Grade channels per (student, period)
+_ROWS, _NOTA, _PRESENCA, _ENTREGA, _ABAIXO = range(5)
+
+
+def _month(value):
+    """Months since year 0 of a ``date`` or an ISO date string."""
+    if not isinstance(value, date):
+        value = date.fromisoformat(str(value)[:10])
+    return value.year * 12 + value.month - 1
+
+
+def _ramp(values, zero, one):
+    return np.nan_to_num(np.clip((values - zero) / (one - zero), 0, 1))
+
+
+def _fixed(values, decimals):
+    """``format_fixed`` with NaN as a blank."""
+    out = np.full(len(values), '', dtype=object)
+    ok = ~np.isnan(values)
+    if ok.any():
+        out[ok] = format_fixed(values[ok], decimals)
+    return out
+
+
+def _scatter_add(target, i, p, values):
+    """``target[i, p] += values`` for repeated (i, p) pairs."""
+    lo, hi = int(i.min()), int(i.max()) + 1
+    periods = target.shape[1]
+    if (hi - lo) * periods > 8 * len(i):
+        np.add.at(target, (i, p), values)
+        return
+    # Rows of a few neighbouring students (a block, a buffer of rows): bincount over their range
+    flat = (i - lo) * periods + p
+    view = target[lo:hi].reshape(-1, target.shape[2])
+    for c in range(values.shape[1]):
+        view[:, c] += np.bincount(flat, weights=values[:, c], minlength=len(view))
+
+
+class RiskFacts:
+    """The facts behind each student's risk features; periods and months count from ``start``."""
+
+    def __init__(self, start):
+        self.year, self.month = start.year, _month(start)
+        self.ids = []
+        self.attrs = {c: [] for c in ATTRS}
+        self.grades = np.zeros((0, BIMESTRES, 5), dtype=np.float32)
+        self.risco = np.zeros(0, dtype=np.int32)
+        self.bills = np.zeros((0, 0), dtype=np.uint8)
+        self.metricas = {}
+        self.latest = -1
+        self._index = None
+        self._grade_buf = [array('q'), array('q'), array('d'), array('d'), array('d')]
+        self._bill_buf = [array('q'), array('q'), array('B')]
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Students
+    def add_student(self, row):
+        """A student from an alunos row (``id``, escola_id, unidade, segmento, turma, status_matricula)."""
+        self.ids.append(str(row['id']))
+        for c in ATTRS:
+            self.attrs[c].append(str(row.get(c) or ''))
+        self._index = None
+
+    def add_dimension(self, alunos, escola_id):
+        """Every student of a ``StudentDimension``, in its order."""
+        self.ids += alunos.ids()
+        self.attrs['escola_id'] += [escola_id] * len(alunos)
+        for c in ATTRS[1:]:
+            values = alunos.categories[c]
+            self.attrs[c] += [values[k] for k in alunos[c]]
+        self._index = None
+
+    def position(self, aluno_id):
+        """Position of a student id, or None for a student not added."""
+        if self._index is None:
+            self._index = {s: i for i, s in enumerate(self.ids)}
+        return self._index.get(str(aluno_id))
+
+    def month_of(self, mes):
+        """Index of the month of ``mes`` (a date or ISO string) in ``bills``."""
+        return _month(mes) - self.month
+
+    # Facts of student ``i`` (a position); rows are buffered and added in bulk
+    def add_grade(self, i, ano, bimestre, nota, presenca, entrega):
+        for buf, v in zip(self._grade_buf, (i, (int(ano) - self.year) * BIMESTRES + int(bimestre) - 1,
+                                            nota, presenca, entrega)):
+            buf.append(v)
+        if len(self._grade_buf[0]) >= FLUSH_ROWS:
+            self._flush()
+
+    def add_bill(self, i, mes, status):
+        for buf, v in zip(self._bill_buf, (i, self.month_of(mes), BILL_STATUS.index(status) + 1)):
+            buf.append(v)
+        if len(self._bill_buf[0]) >= FLUSH_ROWS:
+            self._flush()
+
+    def add_grades(self, i, ano, bimestre, nota, presenca, entrega):
+        """A block of desempenho rows: one array per argument."""
+        period = (np.asarray(ano, dtype=np.int64) - self.year) * BIMESTRES + np.asarray(bimestre) - 1
+        keep = period >= 0
+        if not keep.all():
+            i, period, nota, presenca, entrega = (a[keep] for a in (i, period, nota, presenca, entrega))
+        if not len(i):
+            return
+        self._fit(periods=int(period.max()) + 1)
+        values = np.column_stack([np.ones(len(i)), nota, presenca, entrega, nota < RISCO_NOTA])
+        _scatter_add(self.grades, i, period, values.astype(np.float32))
+        risco = (nota < RISCO_NOTA) | (presenca < RISCO_PRESENCA)
+        self.risco += np.bincount(i, weights=risco, minlength=len(self)).astype(np.int32)
+
+    def add_bills(self, i, month, status):
+        """A block of mensalidades: ``month`` counts from ``start``, ``status`` indexes ``BILL_STATUS``."""
+        month = np.asarray(month, dtype=np.int64)
+        keep = month >= 0
+        i, month, status = i[keep], month[keep], np.asarray(status)[keep]
+        if not len(i):
+            return
+        self._fit(months=int(month.max()) + 1)
+        self.bills[i, month] = status + 1
+        self.latest = max(self.latest, int(month.max()))
+
+    def add_metrica(self, unidade, mes, tipo, valor):
+        """A metricas_mensais row; only the latest nps and health_score of each unidade ('' for all) are kept."""
+        if tipo not in METRICAS:
+            return
+        month = _month(mes)
+        if month >= self.metricas.get((unidade, tipo), (month, None))[0]:
+            self.metricas[(unidade, tipo)] = (month, float(valor))
+
+    def _fit(self, periods=0, months=0):
+        n = len(self)
+        if self.grades.shape[0] < n or self.grades.shape[1] < periods:
+            grown = np.zeros((n, max(periods, self.grades.shape[1]), 5), dtype=np.float32)
+            grown[:self.grades.shape[0], :self.grades.shape[1]] = self.grades
+            self.grades = grown
+        if len(self.risco) < n:
+            self.risco = np.concatenate([self.risco, np.zeros(n - len(self.risco), dtype=np.int32)])
+        if self.bills.shape[0] < n or self.bills.shape[1] < months:
+            grown = np.zeros((n, max(months, self.bills.shape[1])), dtype=np.uint8)
+            grown[:self.bills.shape[0], :self.bills.shape[1]] = self.bills
+            self.bills = grown
+
+    def _flush(self):
+        i, period, nota, presenca, entrega = self._grade_buf
+        if len(i):
+            period = np.frombuffer(period, dtype=np.int64)
+            self.add_grades(np.frombuffer(i, dtype=np.int64), self.year + period // BIMESTRES,
+                            period % BIMESTRES + 1, *(np.frombuffer(a, dtype=np.float64)
+                                                      for a in (nota, presenca, entrega)))
+            self._grade_buf = [array('q'), array('q'), array('d'), array('d'), array('d')]
+        i, month, status = self._bill_buf
+        if len(i):
+            self.add_bills(np.frombuffer(i, dtype=np.int64), np.frombuffer(month, dtype=np.int64),
+                           np.frombuffer(status, dtype=np.uint8) - 1)
+            self._bill_buf = [array('q'), array('q'), array('B')]
+        self._fit()
+
+    def update(self, other):
+        """Append the students (and facts) of another ``RiskFacts`` with the same ``start``."""
+        self._flush()
+        other._flush()
+        offset = len(self)
+        self.ids += other.ids
+        for c in ATTRS:
+            self.attrs[c] += other.attrs[c]
+        self._index = None
+        self._fit(periods=other.grades.shape[1], months=other.bills.shape[1])
+        self.grades[offset:, :other.grades.shape[1]] = other.grades
+        self.risco[offset:] = other.risco
+        self.bills[offset:, :other.bills.shape[1]] = other.bills
+        self.latest = max(self.latest, other.latest)
+        for key, (month, valor) in other.metricas.items():
+            self.add_metrica(key[0], date(month // 12, month % 12 + 1, 1), key[1], valor)
+        return self
+
+    # Features
+    def referencia(self):
+        """First day of the latest month with a bill (or a metrica)."""
+        latest = max([self.month + self.latest] + [m for m, _ in self.metricas.values()])
+        return date(latest // 12, latest % 12 + 1, 1) if latest >= self.month else None
+
+    def features(self):
+        """Every column but the student attributes, one array per column (NaN where there is no data)."""
+        self._flush()
+        n = len(self)
+        rows = np.arange(n)
+        g = self.grades.astype(np.float64)
+        count = g[..., _ROWS]
+        has = count > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = g[..., _NOTA] / count
+            presenca = g[..., _PRESENCA] / count
+            total = count.sum(axis=1)
+            presenca_media = g[..., _PRESENCA].sum(axis=1) / total
+            entrega_media = g[..., _ENTREGA].sum(axis=1) / total
+        periods = np.arange(g.shape[1])
+        last = np.where(has, periods, -1).max(axis=1, initial=-1)
+        prev = np.where(has & (periods < last[:, None]), periods, -1).max(axis=1, initial=-1)
+
+        def at(values, k):
+            return np.where(k >= 0, values[rows, np.maximum(k, 0)], np.nan)
+
+        # Least-squares slope of the period means over the periods with rows
+        periodos = has.sum(axis=1)
+        y = np.where(has, media, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mx = (has * periods).sum(axis=1) / periodos
+            my = y.sum(axis=1) / periodos
+            dx = np.where(has, periods - mx[:, None], 0)
+            slope = (dx * (y - my[:, None])).sum(axis=1) / (dx * dx).sum(axis=1)
+        tendencia = np.where(periodos >= 2, slope, np.nan)
+
+        # Late bills, and the run of them since the last paid one (open and missing months skipped)
+        s = self.bills[:n]
+        atrasado = s == BILL_STATUS.index('Atrasado') + 1
+        months = np.arange(s.shape[1])
+        last_paid = np.where(s == BILL_STATUS.index('Pago') + 1, months, -1).max(axis=1, initial=-1)
+        late = np.cumsum(atrasado, axis=1) if s.shape[1] else np.zeros((n, 1), dtype=np.int64)
+        streak = late[:, -1] - np.where(last_paid >= 0, late[rows, np.maximum(last_paid, 0)], 0)
+
+        unidade = np.array(self.attrs['unidade'], dtype=object)
+
+        def unit_metric(tipo):
+            # Metricas without a unidade_escolar (supabase_schema.sql) stand for every unit
+            out = np.full(n, np.nan)
+            for u in set(self.attrs['unidade']):
+                month, valor = self.metricas.get((u, tipo), self.metricas.get(('', tipo), (None, np.nan)))
+                out[unidade == u] = valor
+            return out
+
+        out = {
+            'periodos': periodos,
+            'media_atual': at(media, last),
+            'media_anterior': at(media, prev),
+            'tendencia_nota': tendencia,
+            'presenca_atual': at(presenca, last),
+            'presenca_media': presenca_media,
+            'entrega_media': entrega_media,
+            'disciplinas_abaixo': np.where(last >= 0, at(g[..., _ABAIXO], last), 0).astype(np.int64),
+            'registros_risco': self.risco[:n].astype(np.int64),
+            'mensalidades_atrasadas': atrasado.sum(axis=1).astype(np.int64),
+            'atraso_consecutivo': streak.astype(np.int64),
+            'nps_unidade': unit_metric('nps'),
+            'health_score_unidade': unit_metric('health_score'),
+        }
+        out['score_risco'] = 100 * sum(w * _ramp(out[f].astype(np.float64), zero, one)
+                                       for f, (w, zero, one) in SCORE.items())
+        return out
+
+    def blocks(self, block_students=BLOCK_STUDENTS):
+        """The aluno_risk_features rows, as column blocks of ``block_students`` students."""
+        f = self.features()
+        score = np.round(f['score_risco'], 2)
+        nivel = np.full(len(self), NIVEIS[-1][1], dtype=object)
+        for threshold, label in reversed(NIVEIS[:-1]):
+            nivel[score >= threshold] = label
+        referencia = self.referencia()
+        columns = {
+            'aluno_id': np.array(self.ids, dtype=object),
+            **{c: np.array(self.attrs[c], dtype=object) for c in ATTRS},
+            'periodos': f['periodos'],
+            **{c: _fixed(f[c], 2) for c in ('media_atual', 'media_anterior', 'tendencia_nota', 'presenca_atual',
+                                             'presenca_media', 'entrega_media')},
+            **{c: f[c] for c in ('disciplinas_abaixo', 'registros_risco', 'mensalidades_atrasadas',
+                                 'atraso_consecutivo')},
+            'nps_unidade': _fixed(f['nps_unidade'], 2),
+            'health_score_unidade': _fixed(f['health_score_unidade'], 2),
+            'score_risco': _fixed(score, 2),
+            'nivel_risco': nivel,
+            'em_risco': np.where(f['registros_risco'] > 0, 'true', 'false').astype(object),
+            'referencia': np.full(len(self), referencia.isoformat() if referencia else '', dtype=object),
+        }
+        for lo in range(0, len(self), block_students):
+            yield {c: v[lo:lo + block_students] for c, v in columns.items()}
+
+
+def _number(value):
+    return float('nan') if value in (None, '') else float(value)
+
+
+def csv_rows(out_dir, compression):
+    """Rows of each source table from the CSVs (``collect`` keeps the students it needs).
+
+    A table written partitioned (``datagen.partitions``) is read through its
+    ``_partitions.json``, partition by partition.
+    """
+    sink = CsvSink(out_dir, compression=compression)
+
+    def rows(table):
+        manifest = read_manifest(os.path.join(out_dir, table))
+        if manifest is None:
+            yield from CsvSource(sink.path(table))
+            return
+        for p in manifest['partitions']:
+            yield from CsvSource(os.path.join(out_dir, table, p['path']))
+    return {table: rows(table) for table in SOURCES}
+
+
+def db_rows(dsn, ids):
+    """Rows of each source table from the database, only the students ``ids`` (when given)."""
+    import psycopg
+
+    from datagen.pg_loader import PgSink
+    tables = PgSink(dsn).columns
+
+    def rows(table):
+        columns = [c for c in SOURCES[table] if c in tables.get(table, {})]
+        if not columns:
+            return
+        sql = 'SELECT {} FROM {}'.format(', '.join(f'"{c}"' for c in columns), table)
+        params = None
+        if ids is not None and table in STUDENT_KEYS:
+            sql += f' WHERE "{STUDENT_KEYS[table]}" = ANY(%s::uuid[])'
+            params = [sorted(ids)]
+        with psycopg.connect(dsn) as conn:
+            with conn.cursor(name=f'risk_{table}') as cur:
+                cur.itersize = CHUNK_SIZE
+                cur.execute(sql, params)
+                for values in cur:
+                    yield dict(zip(columns, values))
+    return {table: rows(table) for table in SOURCES}
+
+
+def collect(sources, start, ids=None):
+    """The ``RiskFacts`` (from ``start``) of the students ``ids`` (every student when None)."""
+    facts = RiskFacts(start)
+    for row in sources['alunos']:
+        if ids is None or str(row['id']) in ids:
+            facts.add_student(row)
+    print(f"Reading the facts of {len(facts)} alunos...")
+    for row in sources['desempenho_academico']:
+        i = facts.position(row['aluno_id'])
+        if i is not None:
+            facts.add_grade(i, row['ano_letivo'], row.get('bimestre') or 1, _number(row['media_final']),
+                            _number(row['percentual_presenca']), _number(row.get('taxa_entrega_atividades')))
+    for row in sources['financeiro_mensalidades']:
+        i = facts.position(row['aluno_id'])
+        if i is not None and row['status_pagamento'] in BILL_STATUS:
+            facts.add_bill(i, row['mes_referencia'], row['status_pagamento'])
+    for row in sources['metricas_mensais']:
+        facts.add_metrica(row.get('unidade_escolar') or '', row['mes_referencia'], row['tipo_metrica'], row['valor'])
+    return facts
@@ -0,0 +1,60 @@
+import hashlib
+import uuid
+from datetime import datetime, timezone
+
+
+def uuid_from(rng):
+    """Return a version 4 UUID string drawn from ``rng`` instead of os.urandom.
+
+    Keeps ids reproducible for a given seed without touching the RNG that
+    drives the table values.
+    """
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def derive_seed(master, *keys):
+    """Derive a 64-bit seed from ``master`` and a path of keys.
+
+    Stable across runs, processes and Python versions (unlike ``hash``), so
+    shard ``i`` always gets the same stream no matter how work is scheduled.
+    """
+    material = ':'.join(str(k) for k in (master,) + keys).encode('utf-8')
+    return int.from_bytes(hashlib.sha256(material).digest()[:8], 'big')
+
+
+class TimeOrderedIds:
+    """Version 7 (time-ordered) UUID strings, reproducible for a given ``rng``.
+
+    The RFC 9562 layout: a 48-bit Unix timestamp in ms, then a 42-bit
+    counter (12 bits before the variant, 30 after) and 32 random bits. The
+    timestamp is the row's own date, so ids sort like the rows' time; the
+    counter starts at a random value for each millisecond and steps by one,
+    so the ids of one millisecond ascend in the order they are issued.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self._counters = {}
+        self._ms = {}
+
+    def _millis(self, when):
+        if isinstance(when, str):
+            when = datetime.fromisoformat(when)
+        if not isinstance(when, datetime):
+            when = datetime(when.year, when.month, when.day)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return int(when.timestamp() * 1000) & (1 << 48) - 1
+
+    def __call__(self, when):
+        """Id for a row at ``when`` (a ``date``, a naive UTC ``datetime`` or an ISO string)."""
+        ms = self._ms.get(when)
+        if ms is None:
+            ms = self._ms[when] = self._millis(when)
+        counter = self._counters.get(ms)
+        # Random start in the lower half: room for 2**41 ids in the same millisecond
+        counter = self.rng.getrandbits(41) if counter is None else counter + 1
+        self._counters[ms] = counter
+        h = '%032x' % (ms << 80 | 0x7 << 76 | (counter >> 30) << 64 | 0b10 << 62
+                       | (counter & (1 << 30) - 1) << 32 | self.rng.getrandbits(32))
+        return f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}'
@@ -0,0 +1,51 @@
+"""Streaming GROUP BY for the rollup tables written next to the facts.
+
+The generators feed each fact row (or numpy block) into a ``GroupSums`` while
+it streams to the sink, so the aggregates cost no second scan. Groups keep a
+row count plus plain sums; averages are derived when the rollup is written,
+and partial rollups (one per shard) combine with ``update``.
+"""
+
+
+class GroupSums:
+    """Row count and per-measure sums for each ``keys`` tuple."""
+
+    def __init__(self, keys, measures):
+        self.keys = list(keys)
+        self.measures = list(measures)
+        self.groups = {}
+
+    def add(self, key, values, count=1):
+        acc = self.groups.get(key)
+        if acc is None:
+            acc = self.groups[key] = [0] * (len(self.measures) + 1)
+        acc[0] += count
+        for i, v in enumerate(values, 1):
+            acc[i] += v
+
+    def add_codes(self, codes, values, decode):
+        """Add a numpy block: ``codes`` is an int group code per row,
+        ``values`` one array per measure and ``decode(code)`` the key tuple.
+        """
+        import numpy as np
+
+        uniq, inverse = np.unique(codes, return_inverse=True)
+        counts = np.bincount(inverse).tolist()
+        sums = [np.bincount(inverse, weights=v).tolist() for v in values]
+        for j, code in enumerate(uniq.tolist()):
+            self.add(decode(code), [s[j] for s in sums], count=counts[j])
+
+    def update(self, other):
+        """Fold in another ``GroupSums`` with the same keys and measures."""
+        for key, acc in other.groups.items():
+            self.add(key, acc[1:], count=acc[0])
+        return self
+
+    def rows(self):
+        """Yield one dict per group, sorted by key: key columns, ``registros`` and the sums."""
+        for key in sorted(self.groups):
+            acc = self.groups[key]
+            row = dict(zip(self.keys, key))
+            row['registros'] = acc[0]
+            row.update(zip(self.measures, acc[1:]))
+            yield row
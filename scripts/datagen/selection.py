@@ -0,0 +1,45 @@
+"""Table selection for ``--tables``: short names and the tables each one needs.
+
+A generator whose tables each draw from their own RNG stream (see
+``derive_seed``) can build a subset of them and get the same rows as a full
+run, as long as it also builds what they are computed from: the facts need
+the students, the rollups need their facts.
+"""
+
+
+def parse_tables(value, tables):
+    """``'metricas,chamados'`` -> the matching names of ``tables``, in ``tables`` order.
+
+    Each item is a table name or one of the ``_``-separated words of exactly
+    one of them (a fact table wins over a rollup: ``desempenho`` is
+    ``desempenho_academico``, not ``rollup_desempenho``).
+    """
+    selected = set()
+    for item in (v.strip() for v in value.split(',')):
+        if not item:
+            continue
+        if item in tables:
+            selected.add(item)
+            continue
+        matches = [t for t in tables if item in t.split('_')]
+        facts = [t for t in matches if not t.startswith('rollup_')]
+        matches = facts or matches
+        if len(matches) != 1:
+            reason = f"ambiguous ({', '.join(matches)})" if matches else 'unknown'
+            raise ValueError(f'{reason} table: {item!r}')
+        selected.add(matches[0])
+    if not selected:
+        raise ValueError(f'no tables in {value!r}')
+    return [t for t in tables if t in selected]
+
+
+def with_dependencies(selected, depends):
+    """``selected`` plus every table they are built from (``depends``: table -> tables), transitively."""
+    needed = set()
+    pending = list(selected)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(depends.get(name, ()))
+    return needed
@@ -0,0 +1,89 @@
+"""Split per-student generation into fixed-size shards run on a process pool.
+
+Shards are cut by ``SHARD_SIZE`` only, never by the number of workers, and
+each shard seeds its own streams from ``derive_seed(master, 'shard', i)``.
+Without workers the same shards run one after another in the calling
+process. Part files are merged back in shard order, so the output is the
+same for any ``--workers`` value.
+"""
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from datagen.instrument import _reset_peak, _status_mb
+
+SHARD_SIZE = 10000
+SHARD_DIR = '_shards'
+
+
+def shard_ranges(total, shard_size=SHARD_SIZE):
+    """Return ``(index, start, count)`` for each shard covering ``total`` rows."""
+    return [(i, start, min(shard_size, total - start))
+            for i, start in enumerate(range(0, total, shard_size))]
+
+
+def shard_dir(out_dir, index):
+    path = os.path.join(out_dir, SHARD_DIR, f'part-{index:05d}')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _measured(fn, shard):
+    # In a worker: the shard's result and the worker's peak RSS while it ran (None off Linux)
+    tracked = _reset_peak()
+    result = fn(shard)
+    return result, _status_mb('VmHWM') if tracked else None
+
+
+def run_shards(fn, shards, workers, stage=None):
+    """Run ``fn`` over ``shards`` and return the results in shard order.
+
+    ``workers == 1`` runs inline, which keeps tracebacks simple when
+    debugging a generator. With a pool, the memory of the workers (which the
+    parent's own peak RSS does not include) goes on ``stage``, a
+    ``RunManifest.stage`` record: ``worker_peak_rss_mb`` is the largest peak
+    RSS of a worker while running one shard and ``workers_rss_mb`` the sum of
+    the ``workers`` largest, a bound on the whole pool's at any moment.
+    """
+    if workers <= 1:
+        return [fn(s) for s in shards]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if stage is None:
+            return list(pool.map(fn, shards))
+        measured = list(pool.map(partial(_measured, fn), shards))
+    peaks = sorted((peak for _, peak in measured if peak is not None), reverse=True)
+    if peaks:
+        stage['workers'] = workers
+        stage['worker_peak_rss_mb'] = peaks[0]
+        stage['workers_rss_mb'] = round(sum(peaks[:workers]), 1)
+    return [result for result, _ in measured]
+
+
+def merge_csv_parts(filename, parts, quiet=False):
+    """Concatenate CSV part files into ``filename``, keeping one header.
+
+    ``parts`` is a list of ``(path, rows)`` as returned by ``write_csv``;
+    parts with no rows (a shard with nothing for this table) are skipped.
+    Returns the number of data rows in the merged file.
+    """
+    total = 0
+    wrote_header = False
+    with open(filename, 'wb') as out:
+        for path, rows in parts:
+            if not rows:
+                continue
+            with open(path, 'rb') as f:
+                header = f.readline()
+                if not wrote_header:
+                    out.write(header)
+                    wrote_header = True
+                shutil.copyfileobj(f, out, 1 << 20)
+            total += rows
+    if not quiet:
+        print(f"Generated {filename} ({total} rows)")
+    return total
+
+
+def cleanup_shards(out_dir):
+    shutil.rmtree(os.path.join(out_dir, SHARD_DIR), ignore_errors=True)
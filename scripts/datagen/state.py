@@ -0,0 +1,34 @@
+"""State manifest for incremental (``--append``) runs.
+
+A full run records where it stopped: the last generated month and the
+roster of students still billed (the active ones, and those who left
+during the last month, whose bill for it is still open). An ``--append`` run generates only the
+months after ``last_month`` (its RNG streams are derived from ``seed`` and
+that month, not saved) and writes the manifest back.
+"""
+import json
+import os
+
+STATE_VERSION = 1
+STATE_FILE = 'datagen_state.json'
+
+
+def load_state(path):
+    """Read a manifest written by ``save_state``; ``None`` if there is none."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"{path}: unsupported state version {state.get('version')!r}")
+    return state
+
+
+def save_state(path, state):
+    state = dict(state, version=STATE_VERSION)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
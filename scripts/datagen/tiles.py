@@ -0,0 +1,104 @@
+"""Slippy-map tile aggregates for the map endpoints.
+
+Points (students, restaurants) are counted per web-mercator tile (the
+z/x/y scheme of OSM/Leaflet tiles) at several zoom levels, in a
+``GroupSums`` keyed by ``(*prefix, zoom, tile_x, tile_y)``. A map route can
+then serve the rows of the zoom closest to the view instead of every point,
+so the payload is bounded by the tiles on screen, not by the points.
+
+Each tile keeps the sum of its points' coordinates in integer micro-degrees,
+so the tile centroid (where the marker goes) is exact and the same however
+the points were split across shards.
+"""
+import math
+
+from datagen.rollups import GroupSums
+
+# City (10), district (12), neighbourhood (14) and street (16) views
+ZOOMS = (10, 12, 14, 16)
+MAX_LATITUDE = 85.0511287798  # web-mercator cut-off
+MICRO = 10 ** 6
+TILE_KEYS = ['zoom', 'tile_x', 'tile_y']
+CENTROID = ['soma_latitude', 'soma_longitude']
+
+ALUNO_MEASURES = ['ativos', 'evadidos', 'inadimplentes', 'bolsistas']
+RESTAURANTE_MEASURES = ['disponiveis', 'avaliados', 'soma_avaliacao']
+
+
+def parse_zooms(value):
+    """``'10,12,14'`` -> ``(10, 12, 14)``."""
+    zooms = tuple(sorted({int(z) for z in value.split(',') if z.strip()}))
+    if not zooms or not all(0 <= z <= 22 for z in zooms):
+        raise ValueError(f'invalid zoom levels: {value!r}')
+    return zooms
+
+
+def tile_xy(lat, lon, zoom):
+    """Tile ``(x, y)`` containing ``(lat, lon)`` at ``zoom``."""
+    n = 1 << zoom
+    lat = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, lat)))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom, x, y):
+    """``(south, west, north, east)`` of tile ``x, y`` at ``zoom``, in degrees."""
+    n = 1 << zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def new_tiles(keys, measures):
+    return GroupSums(list(keys) + TILE_KEYS, list(measures) + CENTROID)
+
+
+def add_point(tiles, prefix, lat, lon, values, zooms=ZOOMS):
+    """Count one point with ``values`` (one per measure) in its tile at every zoom."""
+    centroid = (round(lat * MICRO), round(lon * MICRO))
+    values = tuple(values) + centroid
+    for zoom in zooms:
+        tiles.add(prefix + (zoom,) + tile_xy(lat, lon, zoom), values)
+
+
+def _coords(row):
+    lat, lon = row.get('latitude'), row.get('longitude')
+    if lat in (None, '') or lon in (None, ''):
+        return None
+    return float(lat), float(lon)
+
+
+def _true(value):
+    # bools from the generators, 'true'/'True' from their CSVs, 't' from psql exports
+    return str(value).lower() in ('true', 't', '1')
+
+
+def add_aluno(tiles, prefix, aluno, zooms=ZOOMS):
+    """Count a student (a row of ``alunos``/``dim_alunos``) by enrollment status."""
+    coords = _coords(aluno)
+    if coords is None:
+        return
+    status = aluno['status_matricula']
+    add_point(tiles, prefix, *coords, (status == 'Ativo', status == 'Evadido', status == 'Inadimplente',
+                                       _true(aluno['bolsista'])), zooms)
+
+
+def add_restaurante(tiles, prefix, restaurante, zooms=ZOOMS):
+    """Count a restaurant (a row of ``amostra_restaurants``) with its availability and rating."""
+    coords = _coords(restaurante)
+    if coords is None:
+        return
+    rating = float(restaurante.get('user_rating') or 0)
+    add_point(tiles, prefix, *coords, (_true(restaurante.get('available')), rating > 0, rating), zooms)
+
+
+def tile_rows(tiles, count):
+    """Yield the tiles with the point count as ``count`` and the centroid as latitude/longitude."""
+    for row in tiles.rows():
+        n = row[count] = row.pop('registros')
+        lat, lon = row.pop('soma_latitude'), row.pop('soma_longitude')
+        row['latitude'] = round(lat / n / MICRO, 6) if n else None
+        row['longitude'] = round(lon / n / MICRO, 6) if n else None
+        yield row
@@ -0,0 +1,160 @@
+"""Query catalog replay for bench_queries.py.
+
+The catalog (``dashboard_queries.sql``) holds the SQL of the dashboard and
+ENEM routes, one statement per ``-- name:`` block, with ``%(param)s``
+placeholders. Each query is replayed the way its route sends it: extended
+protocol with bound parameters and, for the tenant routes
+(app/api/dashboard), inside a transaction with ``request.jwt.claims`` set as
+``queryWithTenant`` does. Latencies are measured client side (execute +
+fetch); ``explain`` adds one ``EXPLAIN (ANALYZE, BUFFERS)`` run for the plan
+and its shared-buffer hits and reads.
+"""
+import itertools
+import json
+import re
+import time
+from collections import namedtuple
+
+Query = namedtuple('Query', ['name', 'route', 'sql'])
+
+_HEADER = re.compile(r'^--\s*(name|route):\s*(.+?)\s*$')
+_PARAM = re.compile(r'%\((\w+)\)s')
+
+
+def load_catalog(path):
+    """Parse the catalog into ``Query`` tuples, in file order."""
+    queries, meta, lines = [], {}, []
+
+    def flush():
+        sql = '\n'.join(lines).strip().rstrip(';').strip()
+        if meta.get('name') and sql:
+            queries.append(Query(meta['name'], meta.get('route', ''), sql))
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            m = _HEADER.match(line)
+            if m and m.group(1) == 'name':
+                flush()
+                meta, lines = {}, []
+            if m:
+                meta[m.group(1)] = m.group(2)
+            elif meta and not line.lstrip().startswith('--'):
+                lines.append(line.rstrip('\n'))
+    flush()
+    return queries
+
+
+def tenant(query):
+    """Routes under app/api/dashboard query through ``queryWithTenant``."""
+    return '/api/dashboard/' in query.route
+
+
+def params(query):
+    return list(dict.fromkeys(_PARAM.findall(query.sql)))
+
+
+def cases(query, values):
+    """``(label, params)`` for each combination of the query's parameters.
+
+    ``values`` maps a parameter to its list of cases; a case that is itself a
+    list (e.g. bairros) is one list-valued parameter, expanded by ``bind``.
+    """
+    names = params(query)
+    missing = [n for n in names if n not in values]
+    if missing:
+        raise KeyError(f"{query.name}: no values for {', '.join(missing)}")
+    for combo in itertools.product(*(values[n] for n in names)):
+        bound = dict(zip(names, combo))
+        label = ','.join(f'{n}={_label(v)}' for n, v in bound.items() if len(values[n]) > 1)
+        yield label, bound
+
+
+def _label(value):
+    return 'null' if value is None else str(value)
+
+
+def bind(sql, bound):
+    """Expand list parameters into one placeholder per item, as the routes build ``IN (...)``."""
+    out = dict(bound)
+    for name, value in bound.items():
+        if isinstance(value, (list, tuple)):
+            keys = [f'{name}_{i}' for i in range(len(value))]
+            sql = sql.replace(f'%({name})s', ', '.join(f'%({k})s' for k in keys))
+            del out[name]
+            out.update(zip(keys, value))
+    return sql, out
+
+
+def _execute(conn, query, sql, bound, claims):
+    with conn.transaction():
+        if tenant(query):
+            conn.execute("SELECT set_config('request.jwt.claims', %s, true)", [json.dumps(claims)])
+        start = time.perf_counter()
+        rows = conn.execute(sql, bound).fetchall()
+        return time.perf_counter() - start, rows
+
+
+def time_query(conn, query, bound, claims, repeat, warmup=1):
+    """Run ``query`` ``warmup + repeat`` times; return the timed latencies (ms) and the row count."""
+    sql, bound = bind(query.sql, bound)
+    latencies, rows = [], []
+    for i in range(warmup + repeat):
+        seconds, rows = _execute(conn, query, sql, bound, claims)
+        if i >= warmup:
+            latencies.append(seconds * 1000)
+    return latencies, len(rows)
+
+
+def percentile(values, q):
+    """``q``-th percentile (0..100) of ``values``, interpolating between ranks."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(latencies):
+    return {
+        'runs': len(latencies),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        **{f'p{q}_ms': round(percentile(latencies, q), 3) for q in (50, 95, 99)},
+        'max_ms': round(max(latencies), 3),
+    }
+
+
+def _walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _walk(child)
+
+
+def explain(conn, query, bound, claims):
+    """``EXPLAIN (ANALYZE, BUFFERS)`` of ``query``: its text plan and the figures read off the JSON plan."""
+    sql, bound = bind(query.sql, bound)
+    with conn.transaction():
+        if tenant(query):
+            conn.execute("SELECT set_config('request.jwt.claims', %s, true)", [json.dumps(claims)])
+        doc = conn.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', bound).fetchone()[0]
+        text = '\n'.join(r[0] for r in conn.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', bound).fetchall())
+    if isinstance(doc, str):
+        doc = json.loads(doc)
+    plan = doc[0]
+    root = plan['Plan']
+    hit, read = root.get('Shared Hit Blocks', 0), root.get('Shared Read Blocks', 0)
+    nodes = list(_walk(root))
+    return text, {
+        'planning_ms': plan.get('Planning Time'),
+        'execution_ms': plan.get('Execution Time'),
+        'shared_hit': hit,
+        'shared_read': read,
+        'hit_ratio': round(hit / (hit + read), 4) if hit + read else None,
+        'temp_blocks': root.get('Temp Read Blocks', 0) + root.get('Temp Written Blocks', 0),
+        'seq_scans': sorted({n['Relation Name'] for n in nodes if n['Node Type'] == 'Seq Scan'}),
+        'index_scans': sorted({n['Relation Name'] for n in nodes if 'Index' in n['Node Type']
+                               and 'Relation Name' in n}),
+        'rows_scanned': sum(n.get('Actual Rows', 0) * n.get('Actual Loops', 1) for n in nodes
+                            if n['Node Type'] == 'Seq Scan'),
+    }
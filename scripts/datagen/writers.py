@@ -0,0 +1,286 @@
+import csv
+import io
+import os
+from itertools import chain, islice
+
+from datagen import compress
+from datagen.sharding import merge_csv_parts
+
+CHUNK_SIZE = 10000
+
+
+def write_csv(filename, rows, chunk_size=CHUNK_SIZE, quiet=False, append=False):
+    """Stream ``rows`` (any iterable of dicts) into ``filename``.
+
+    Rows are pulled and written ``chunk_size`` at a time, so a generator
+    never needs to be materialized. Returns the number of rows written;
+    ``quiet`` skips the progress line (used for shard part files).
+    ``append`` adds the rows to an existing file (header only if it is new).
+    A ``.gz``/``.zst`` filename is written compressed (see ``datagen.compress``).
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    total = 0
+    new_file = not (append and os.path.exists(filename) and os.path.getsize(filename))
+    with compress.open_output(filename, append=not new_file) as f:
+        writer = csv.DictWriter(f, fieldnames=first.keys())
+        if new_file:
+            writer.writeheader()
+        rows = chain([first], rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            total += len(chunk)
+    if not quiet:
+        print(f"{'Generated' if new_file else 'Appended to'} {filename} ({total} rows)")
+    return total
+
+
+def update_csv(filename, key, updates, chunk_size=CHUNK_SIZE):
+    """Rewrite ``filename`` applying ``updates`` (dicts matched on column ``key``).
+
+    ``key`` may also be a tuple of columns, matched together. Only the
+    columns present in each update change. Returns the number of rows
+    updated.
+    """
+    keys = (key,) if isinstance(key, str) else tuple(key)
+    changes = {tuple(u[k] for k in keys): u for u in updates}
+    if not changes:
+        return 0
+    # Same suffix as the target, so a compressed file stays compressed
+    tmp = os.path.join(os.path.dirname(filename), f'tmp-{os.path.basename(filename)}')
+    matched = 0
+    with compress.open_input(filename) as f:
+        reader = csv.DictReader(f)
+        with compress.open_output(tmp) as out:
+            writer = csv.DictWriter(out, fieldnames=reader.fieldnames)
+            writer.writeheader()
+            while True:
+                chunk = list(islice(reader, chunk_size))
+                if not chunk:
+                    break
+                for row in chunk:
+                    change = changes.get(tuple(row[k] for k in keys))
+                    if change:
+                        row.update((k, v) for k, v in change.items() if k in row)
+                        matched += 1
+                writer.writerows(chunk)
+    compress.replace(tmp, filename)
+    print(f"Updated {filename} ({matched} rows)")
+    return matched
+
+
+def _column_strings(col):
+    # Only reached for numpy blocks, so numpy is imported lazily here
+    import numpy as np
+
+    if isinstance(col, list):
+        return col
+    if not hasattr(col, 'dtype'):
+        return [str(v) for v in col]
+    if col.dtype.kind in 'iu' and col.size and int(col.max()) - int(col.min()) < 1 << 16:
+        # Small integer domains (bimestre, ano, faltas): render each value once
+        lo = int(col.min())
+        table = np.array([str(v) for v in range(lo, int(col.max()) + 1)], dtype=object)
+        return table[col - lo].tolist()
+    if col.dtype.kind == 'O':
+        # Object columns carry ready-made strings (ids, disciplinas, format_fixed)
+        return col.tolist()
+    return [str(v) for v in col.tolist()]
+
+
+def _encode_block(block, ncols):
+    cols = [_column_strings(c) for c in block.values()]
+    nrows = len(cols[0])
+    data = ('\r\n'.join(map(','.join, zip(*cols))) + '\r\n').encode('utf-8')
+    # Fast path is only valid when no field needs csv quoting
+    if _plain_csv(data, nrows, ncols):
+        return data, nrows
+    buf = io.StringIO()
+    csv.writer(buf).writerows(zip(*cols))
+    return buf.getvalue().encode('utf-8'), nrows
+
+
+def _plain_csv(data, nrows, ncols):
+    # True when the only separators, line ends and quotes in ``data`` are the
+    # joins'. Counted on the UTF-8 bytes (multi-byte characters never hold
+    # ASCII bytes) by numpy: str.count makes a slow pass per character
+    import numpy as np
+
+    view = np.frombuffer(data, dtype=np.uint8)
+    return (np.count_nonzero(view == ord(',')) == nrows * (ncols - 1)
+            and np.count_nonzero(view == ord('\n')) == nrows
+            and np.count_nonzero(view == ord('\r')) == nrows
+            and not np.count_nonzero(view == ord('"')))
+
+
+def block_rows(blocks):
+    """Row dicts of column blocks (dicts of equal-length arrays/lists)."""
+    for block in blocks:
+        cols = [c.tolist() if hasattr(c, 'tolist') else c for c in block.values()]
+        for values in zip(*cols):
+            yield dict(zip(block.keys(), values))
+
+
+def write_csv_blocks(filename, blocks, quiet=False, append=False):
+    """Write column blocks (dicts of equal-length arrays/lists) to ``filename``.
+
+    Used by the vectorized engines: each block is rendered column by column
+    and joined into CSV text in one go, without building a dict per row.
+    Output matches ``csv.writer`` (falls back to it when a block has fields
+    that need quoting). The header comes from the keys of the first block;
+    ``append`` works as in ``write_csv``. Returns the number of rows written.
+    """
+    blocks = iter(blocks)
+    first = next(blocks, None)
+    if first is None:
+        return 0
+
+    with CsvBlockWriter(filename, append) as writer:
+        for block in chain([first], blocks):
+            writer.write(block)
+    if not quiet:
+        print(f"{'Appended to' if writer.appending else 'Generated'} {filename} ({writer.rows} rows)")
+    return writer.rows
+
+
+class CsvBlockWriter:
+    """An open CSV file that column blocks are written to, as ``write_csv_blocks`` does.
+
+    For callers that feed one file a block at a time between other work
+    (the partitions of ``datagen.partitions``): the file, and for
+    ``.gz``/``.zst`` its compressor, stay open until ``close``. The header
+    comes from the first block's keys; ``append`` works as in ``write_csv``.
+    """
+
+    def __init__(self, filename, append=False):
+        self.appending = append and os.path.exists(filename) and os.path.getsize(filename) > 0
+        self.file = compress.open_output(filename, append=self.appending, binary=True)
+        self.header = not self.appending
+        self.rows = 0
+
+    def write(self, block):
+        if self.header:
+            header = io.StringIO()
+            csv.writer(header).writerow(block.keys())
+            self.file.write(header.getvalue().encode('utf-8'))
+            self.header = False
+        data, nrows = _encode_block(block, len(block))
+        self.file.write(data)
+        self.rows += nrows
+        return nrows
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSource:
+    """Re-iterable view over a CSV written by ``write_csv``.
+
+    Each iteration re-opens the file, so dimension tables can be scanned by
+    several fact generators without keeping them in memory. ``converters``
+    maps column names to callables applied to the raw string values.
+    """
+
+    def __init__(self, filename, converters=None):
+        self.filename = filename
+        self.converters = converters or {}
+
+    def __iter__(self):
+        with compress.open_input(self.filename) as f:
+            for row in csv.DictReader(f):
+                for col, conv in self.converters.items():
+                    row[col] = conv(row[col])
+                yield row
+
+
+def parse_bool(value):
+    return value in ('True', 'true')
+
+
+def output_path(out_dir, filename):
+    os.makedirs(out_dir, exist_ok=True)
+    return os.path.join(out_dir, filename)
+
+
+class CsvSink:
+    """Destination that writes each table to ``<out_dir>/<name>.csv``.
+
+    The generators hand their tables to a sink by name, so the same run can
+    target CSV files or a database (see ``datagen.pg_loader.PgSink``).
+    ``compression`` (``'gzip'`` or ``'zstd'``) writes ``<name>.csv.gz`` /
+    ``<name>.csv.zst`` instead.
+    """
+
+    def __init__(self, out_dir='.', chunk_size=CHUNK_SIZE, quiet=False, append=False, compression=None):
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+        self.quiet = quiet
+        self.append = append
+        self.compression = compression
+
+    def path(self, name):
+        suffix = compress.SUFFIXES[self.compression] if self.compression else ''
+        return output_path(self.out_dir, f'{name}.csv{suffix}')
+
+    def write_rows(self, name, rows):
+        return write_csv(self.path(name), rows, self.chunk_size, quiet=self.quiet, append=self.append)
+
+    def update_rows(self, name, key, updates):
+        return update_csv(self.path(name), key, updates, self.chunk_size)
+
+    def write_blocks(self, name, blocks):
+        return write_csv_blocks(self.path(name), blocks, quiet=self.quiet, append=self.append)
+
+    def merge(self, name, parts):
+        if self.compression:
+            return compress.merge_frames(self.path(name), parts)
+        return merge_csv_parts(self.path(name), parts)
+
+    # Same lifecycle as PgSink; nothing to set up or tear down for files
+    def prepare(self, names):
+        pass
+
+    def finish(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_sink(out_dir='.', chunk_size=CHUNK_SIZE, load=None, load_format='text', table_map=None,
+              fmt='csv', schemas=None, quiet=False, append=False, compression=None, partitions=None, tenant=None,
+              cascade=False):
+    """Return the sink for a run.
+
+    A ``PgSink`` when ``load`` (a Postgres DSN) is given, a ``ColumnarSink``
+    for ``fmt`` ``'parquet'``/``'arrow'`` (typed by ``schemas``), else a
+    ``CsvSink``. ``append`` makes the CSV sink add to existing files; a
+    ``PgSink`` always appends unless ``prepare`` truncates (``cascade``:
+    with the tables that reference them). ``compression``
+    applies to the CSV sink only. ``partitions`` (table -> tenant/period
+    columns) writes any file format partitioned by school and year instead;
+    see ``datagen.partitions``.
+    """
+    if load:
+        from datagen.pg_loader import PgSink
+        return PgSink(load, table_map=table_map, fmt=load_format, cascade=cascade)
+    if partitions:
+        from datagen.partitions import PartitionedSink
+        return PartitionedSink(out_dir, partitions, tenant, fmt, schemas, chunk_size, quiet=quiet, append=append,
+                               compression=compression)
+    if fmt != 'csv':
+        from datagen.columnar import ColumnarSink
+        return ColumnarSink(out_dir, fmt, schemas, chunk_size, quiet=quiet)
+    return CsvSink(out_dir, chunk_size, quiet=quiet, append=append, compression=compression)
@@ -1,14 +1,29 @@
 
-import csv
-import uuid
+import argparse
 import random
-from datetime import datetime, timedelta, date
-from faker import Faker
+from datetime import timedelta, date
 
-# Init Faker
-fake = Faker('pt_BR')
-Faker.seed(42)
-random.seed(42)
+from datagen.dimension import STATUS, StudentDimension
+from datagen.instrument import RunManifest
+from datagen.months import MonthCalendar
+from datagen.pools import date_of_birth, load_pools, sentence
+from datagen.rng import derive_seed, uuid_from
+from datagen.sharding import SHARD_SIZE, cleanup_shards, run_shards, shard_dir, shard_ranges
+from datagen.writers import open_sink, CHUNK_SIZE
+
+SEED = 42
+
+random.seed(SEED)
+# Ids come from their own stream so they are reproducible without shifting the values
+id_rng = random.Random(SEED)
+
+def new_id():
+    return uuid_from(id_rng)
+
+# Re-seed every stream (used per shard, so each shard is independent of the others)
+def seed_streams(seed):
+    random.seed(seed)
+    id_rng.seed(derive_seed(seed, 'ids'))
 
 # Constants
 UNIDADES = ['Centro', 'Sul', 'Norte']
@@ -38,6 +53,54 @@ START_DATE = date(2025, 2, 1)
 END_DATE = date(2026, 2, 28)
 CURRENT_DATE = date(2026, 2, 15)
 
+# Output tables, parents first. Only dim_alunos has a table in the app
+# database (alunos, extended by bi_schema.sql); --load skips the others
+# unless they have been created.
+TABLES = ['dim_alunos', 'fact_academico', 'fact_financeiro', 'fact_operacional_tickets',
+          'fact_recursos_consumo', 'fact_pesquisa_nps']
+PG_TABLES = {'dim_alunos': 'alunos'}
+
+# Column types for --format parquet/arrow: dim_alunos follows alunos
+# (supabase_schema.sql + bi_schema.sql), the facts mirror the matching app
+# tables. 'dict' marks low-cardinality text stored dictionary-encoded.
+SCHEMAS = {
+    'dim_alunos': {
+        'id': 'uuid', 'nome_completo': 'text', 'data_nascimento': 'date', 'genero': 'dict',
+        'cor_raca': 'dict', 'unidade': 'dict', 'segmento': 'dict', 'turma': 'dict',
+        'status_matricula': 'dict', 'data_matricula': 'date', 'data_evasao': 'date',
+        'bolsista': 'boolean', 'possui_irmaos': 'boolean', 'renda_familiar_sm': 'dict',
+        'bairro': 'text', 'cidade': 'dict', 'latitude': 'numeric(10,8)', 'longitude': 'numeric(11,8)'
+    },
+    'fact_academico': {
+        'id': 'uuid', 'aluno_id': 'uuid', 'disciplina': 'dict', 'bimestre': 'integer', 'ano': 'integer',
+        'nota_bimestral': 'numeric(4,2)', 'faltas': 'integer', 'percentual_presenca': 'numeric(5,2)',
+        'taxa_entrega_atividades': 'numeric(5,2)'
+    },
+    'fact_financeiro': {
+        'id': 'uuid', 'aluno_id': 'uuid', 'tipo': 'dict', 'categoria': 'dict', 'valor': 'numeric(10,2)',
+        'data_vencimento': 'date', 'data_pagamento': 'date', 'status': 'dict',
+        'mes_referencia': 'date', 'ano_referencia': 'integer'
+    },
+    'fact_operacional_tickets': {
+        'id': 'uuid', 'unidade': 'dict', 'setor': 'dict', 'assunto': 'dict', 'prioridade': 'dict',
+        'status': 'dict', 'data_abertura': 'timestamptz', 'data_resolucao': 'timestamptz',
+        'horas_ate_resolucao': 'numeric(6,2)'
+    },
+    'fact_recursos_consumo': {
+        'id': 'uuid', 'unidade': 'dict', 'mes_referencia': 'date', 'custo_impressao': 'numeric(10,2)',
+        'consumo_energia_kwh': 'numeric(10,2)', 'consumo_agua_m3': 'numeric(10,2)',
+        'taxa_desperdicio_alimento': 'numeric(5,2)', 'refeicoes_servidas': 'integer',
+        'custo_medio_refeicao': 'numeric(10,2)', 'absenteismo_docente': 'numeric(5,2)'
+    },
+    'fact_pesquisa_nps': {
+        'id': 'uuid', 'aluno_id': 'uuid', 'data_pesquisa': 'date', 'nota_nps': 'integer',
+        'health_score_familia': 'integer', 'comentario': 'dict'
+    },
+}
+
+MENSALIDADE_BASE = 1500
+EXPENSES_CATS = ['Energia', 'Água', 'Salários', 'Manutenção', 'Marketing', 'Materiais']
+
 # Helper functions
 def random_date(start, end):
     days = (end - start).days
@@ -49,290 +112,430 @@ def generate_coords(center_lat, center_lon, radius=0.02):
         center_lon + random.uniform(-radius, radius)
     )
 
+# dim_alunos as the fact generators see it (see datagen.dimension)
+def new_students(rows=()):
+    categories = {'unidade': UNIDADES, 'segmento': SEGMENTOS, 'status_matricula': STATUS,
+                  'turma': [t for turmas in TURMAS.values() for t in turmas]}
+    return StudentDimension.from_rows(rows, categories, flags=('bolsista', 'possui_irmaos'))
+
 # 1. Generate ALUNOS
-alunos = []
-print("Generating Alunos...")
-
-for _ in range(TOTAL_ALUNOS):
-    unidade = random.choice(UNIDADES)
-    segmento = random.choice(SEGMENTOS)
-    turma = random.choice(TURMAS[segmento])
-    
-    # Perfil Demographic
-    genero = random.choice(['M', 'F'])
-    nome = fake.name_male() if genero == 'M' else fake.name_female()
-    raca = random.choices(['Branca', 'Parda', 'Preta', 'Amarela', 'Indígena'], weights=[0.4, 0.4, 0.15, 0.04, 0.01])[0]
-    renda = random.choices(['Até 3', '3-6', '6-10', 'Acima de 10'], weights=[0.2, 0.4, 0.3, 0.1])[0]
-    
-    # Matricula logic
-    dt_matricula = random_date(date(2024, 11, 1), date(2025, 1, 31))
-    
-    # Status logic (Evasao 20%, Inadimplente 14%)
-    status_roll = random.random()
-    status = 'Ativo'
-    dt_evasao = ''
-    
-    if status_roll < 0.20:
-        status = 'Evadido'
-        # Evasion happens AFTER classes start
-        dt_evasao = random_date(START_DATE, CURRENT_DATE).isoformat()
-    elif status_roll < 0.34:
-        status = 'Inadimplente'
-    
-    lat, lon = generate_coords(*COORDS[unidade])
-    
-    alunos.append({
-        'id': str(uuid.uuid4()),
-        'nome_completo': nome,
-        'data_nascimento': fake.date_of_birth(minimum_age=4, maximum_age=18).isoformat(),
-        'genero': genero,
-        'cor_raca': raca,
-        'unidade': unidade,
-        'segmento': segmento,
-        'turma': turma,
-        'status_matricula': status,
-        'data_matricula': dt_matricula.isoformat(),
-        'data_evasao': dt_evasao,
-        'bolsista': random.random() < 0.15,
-        'possui_irmaos': random.random() < 0.30,
-        'renda_familiar_sm': renda,
-        'bairro': fake.bairro(),
-        'cidade': 'São Paulo',
-        'latitude': lat,
-        'longitude': lon
-    })
-
-# Write dim_alunos
-with open('dim_alunos.csv', 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=alunos[0].keys())
-    writer.writeheader()
-    writer.writerows(alunos)
+def generate_alunos(total=None):
+    pools = load_pools()
+    for _ in range(TOTAL_ALUNOS if total is None else total):
+        unidade = random.choice(UNIDADES)
+        segmento = random.choice(SEGMENTOS)
+        turma = random.choice(TURMAS[segmento])
+
+        # Perfil Demographic
+        genero = random.choice(['M', 'F'])
+        nome = random.choice(pools.names_male if genero == 'M' else pools.names_female)
+        raca = random.choices(['Branca', 'Parda', 'Preta', 'Amarela', 'Indígena'], weights=[0.4, 0.4, 0.15, 0.04, 0.01])[0]
+        renda = random.choices(['Até 3', '3-6', '6-10', 'Acima de 10'], weights=[0.2, 0.4, 0.3, 0.1])[0]
+
+        # Matricula logic
+        dt_matricula = random_date(date(2024, 11, 1), date(2025, 1, 31))
+
+        # Status logic (Evasao 20%, Inadimplente 14%)
+        status_roll = random.random()
+        status = 'Ativo'
+        dt_evasao = ''
+
+        if status_roll < 0.20:
+            status = 'Evadido'
+            # Evasion happens AFTER classes start
+            dt_evasao = random_date(START_DATE, CURRENT_DATE).isoformat()
+        elif status_roll < 0.34:
+            status = 'Inadimplente'
+
+        lat, lon = generate_coords(*COORDS[unidade])
+
+        yield {
+            'id': new_id(),
+            'nome_completo': nome,
+            'data_nascimento': date_of_birth(4, 18, CURRENT_DATE).isoformat(),
+            'genero': genero,
+            'cor_raca': raca,
+            'unidade': unidade,
+            'segmento': segmento,
+            'turma': turma,
+            'status_matricula': status,
+            'data_matricula': dt_matricula.isoformat(),
+            'data_evasao': dt_evasao,
+            'bolsista': random.random() < 0.15,
+            'possui_irmaos': random.random() < 0.30,
+            'renda_familiar_sm': renda,
+            'bairro': random.choice(pools.bairros),
+            'cidade': 'São Paulo',
+            'latitude': lat,
+            'longitude': lon
+        }
 
 # 2. Generate ACADEMICO
-notas = []
-print("Generating Academico...")
+def generate_academico(alunos):
+    status, segmento = alunos['status_matricula'], alunos['segmento']
+    evadido = alunos.code('status_matricula', 'Evadido')
+    for i in range(len(alunos)):
+        aluno_id = alunos.id(i)
+        if status[i] == evadido:
+            active_bimestres = random.randint(1, 2) # Dropout early
+        else:
+            active_bimestres = 4
 
-for aluno in alunos:
-    if aluno['status_matricula'] == 'Evadido':
-        active_bimestres = random.randint(1, 2) # Dropout early
-    else:
-        active_bimestres = 4
-        
-    grade_profile = 'high' if random.random() > 0.3 else 'low' # 30% bad students
-    
-    for bim in range(1, active_bimestres + 1):
-        year = 2025
-        
-        for disc in DISCIPLINAS[aluno['segmento']]:
-            # Grade logic
-            if grade_profile == 'high':
-                nota = random.uniform(6.5, 10)
-                presenca = random.uniform(75, 100)
-                entrega = random.uniform(80, 100)
-            else:
-                nota = random.uniform(2, 7)
-                presenca = random.uniform(50, 80)
-                entrega = random.uniform(40, 80)
-            
-            notas.append({
-                'id': str(uuid.uuid4()),
-                'aluno_id': aluno['id'],
-                'disciplina': disc,
-                'bimestre': bim,
-                'ano': year,
-                'nota_bimestral': round(nota, 2),
-                'faltas': int((100 - presenca) / 2), # approx
-                'percentual_presenca': round(presenca, 2),
-                'taxa_entrega_atividades': round(entrega, 2)
-            })
-
-with open('fact_academico.csv', 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=notas[0].keys())
-    writer.writeheader()
-    writer.writerows(notas)
+        grade_profile = 'high' if random.random() > 0.3 else 'low' # 30% bad students
+
+        for bim in range(1, active_bimestres + 1):
+            year = 2025
+
+            for disc in DISCIPLINAS[alunos.categories['segmento'][segmento[i]]]:
+                # Grade logic
+                if grade_profile == 'high':
+                    nota = random.uniform(6.5, 10)
+                    presenca = random.uniform(75, 100)
+                    entrega = random.uniform(80, 100)
+                else:
+                    nota = random.uniform(2, 7)
+                    presenca = random.uniform(50, 80)
+                    entrega = random.uniform(40, 80)
+
+                yield {
+                    'id': new_id(),
+                    'aluno_id': aluno_id,
+                    'disciplina': disc,
+                    'bimestre': bim,
+                    'ano': year,
+                    'nota_bimestral': round(nota, 2),
+                    'faltas': int((100 - presenca) / 2), # approx
+                    'percentual_presenca': round(presenca, 2),
+                    'taxa_entrega_atividades': round(entrega, 2)
+                }
+
+# Same rows as generate_academico, drawn in blocks by the numpy engine
+def generate_academico_blocks(alunos, seed=SEED):
+    from datagen.vectorized import AcademicEngine, GradeProfile, format_fixed, uuid_block
+    import numpy as np
+
+    def n_periods(status, rng):
+        # Evadidos drop out after 1 or 2 bimestres
+        return np.where(status == 'Evadido', rng.integers(1, 3, size=len(status)), 4)
+
+    engine = AcademicEngine(
+        DISCIPLINAS,
+        periods=[(1, 2025), (2, 2025), (3, 2025), (4, 2025)],
+        good=GradeProfile(nota=(6.5, 10), presenca=(75, 100), entrega=(80, 100)),
+        bad=GradeProfile(nota=(2, 7), presenca=(50, 80), entrega=(40, 80)),
+        p_good=0.7,
+        n_periods=n_periods,
+        seed=seed
+    )
+    for block in engine.blocks(alunos):
+        presenca = block['presenca']
+        yield {
+            'id': uuid_block(engine.rng, len(block['aluno_id'])),
+            'aluno_id': block['aluno_id'],
+            'disciplina': block['disciplina'],
+            'bimestre': block['bimestre'],
+            'ano': block['ano'],
+            'nota_bimestral': format_fixed(block['nota'], 2),
+            'faltas': ((100 - presenca) / 2).astype(np.int64), # approx
+            'percentual_presenca': format_fixed(presenca, 2),
+            'taxa_entrega_atividades': format_fixed(block['entrega'], 2)
+        }
 
 # 3. Generate FINANCEIRO
-financeiro = []
-print("Generating Financeiro...")
+def generate_receitas(alunos):
+    # Months from Feb 2025 to Feb 2026, laid out once for every student
+    cal = MonthCalendar(START_DATE, CURRENT_DATE)
+    vencimentos = cal.on_day(10)
+    status = alunos['status_matricula']
+    inadimplente = alunos.code('status_matricula', 'Inadimplente')
+    for i in range(len(alunos)):
+        # Active from the month of matrícula through the month of evasão
+        lo, hi = alunos.window(cal, i)
+        aluno_id = alunos.id(i)
+        is_bad_payer = (status[i] == inadimplente)
+        valor = MENSALIDADE_BASE if not alunos.flag('bolsista', i) else 0
 
-MENSALIDADE_BASE = 1500
+        for m in range(lo, hi):
+            # Monthly Fee
+            vencimento = vencimentos[m]
+            status_pg = 'Pago'
+            dt_pg = ''
 
-for aluno in alunos:
-    # Enrollment date check
-    dt_mat = datetime.fromisoformat(aluno['data_matricula']).date()
-    # Generate months from Feb 2025 to Feb 2026
-    current_date_iter = START_DATE
-    
-    while current_date_iter <= CURRENT_DATE:
-        # Check if student was active this month
-        if aluno['data_evasao']:
-            evasao_dt = datetime.fromisoformat(aluno['data_evasao']).date()
-            if current_date_iter > evasao_dt:
-                break
-        
-        # Monthly Fee
-        vencimento = current_date_iter.replace(day=10)
-        status_pg = 'Pago'
-        dt_pg = ''
-        
-        # Inadimplencia Logic
-        is_bad_payer = (aluno['status_matricula'] == 'Inadimplente')
-        if is_bad_payer and random.random() < 0.6:
-            status_pg = 'Atrasado'
-        elif not is_bad_payer and random.random() < 0.05:
-             status_pg = 'Atrasado' # Occasional slip
-             
-        if status_pg == 'Pago':
-            # Paid between 1st and 15th
-            dt_pg = (vencimento + timedelta(days=random.randint(-5, 5))).isoformat()
-            
-        financeiro.append({
-            'id': str(uuid.uuid4()),
-            'aluno_id': aluno['id'],
-            'tipo': 'Receita',
-            'categoria': 'Mensalidade',
-            'valor': MENSALIDADE_BASE if not aluno['bolsista'] else 0,
-            'data_vencimento': vencimento.isoformat(),
-            'data_pagamento': dt_pg,
-            'status': status_pg,
-            'mes_referencia': current_date_iter.isoformat(),
-            'ano_referencia': current_date_iter.year
-        })
-        
-        # Next month
-        if current_date_iter.month == 12:
-            current_date_iter = date(current_date_iter.year + 1, 1, 1)
-        else:
-            current_date_iter = date(current_date_iter.year, current_date_iter.month + 1, 1)
+            # Inadimplencia Logic
+            if is_bad_payer and random.random() < 0.6:
+                status_pg = 'Atrasado'
+            elif not is_bad_payer and random.random() < 0.05:
+                status_pg = 'Atrasado' # Occasional slip
 
-# Generate Expenses
-EXPENSES_CATS = ['Energia', 'Água', 'Salários', 'Manutenção', 'Marketing', 'Materiais']
-# ~1.8M total expenses vs ~2.5M revenue
-current_date_iter = START_DATE
-while current_date_iter <= CURRENT_DATE:
-    for cat in EXPENSES_CATS:
-        val = random.uniform(5000, 50000)
-        financeiro.append({
-            'id': str(uuid.uuid4()),
-            'aluno_id': '',
-            'tipo': 'Despesa',
-            'categoria': cat,
-            'valor': round(val, 2),
-            'data_vencimento': current_date_iter.replace(day=20).isoformat(),
-            'data_pagamento': current_date_iter.replace(day=20).isoformat(),
-            'status': 'Pago',
-            'mes_referencia': current_date_iter.isoformat(),
-            'ano_referencia': current_date_iter.year
-        })
-    if current_date_iter.month == 12:
-        current_date_iter = date(current_date_iter.year + 1, 1, 1)
-    else:
-         current_date_iter = date(current_date_iter.year, current_date_iter.month + 1, 1)
+            if status_pg == 'Pago':
+                # Paid between 1st and 15th
+                dt_pg = (vencimento + timedelta(days=random.randint(-5, 5))).isoformat()
+
+            yield {
+                'id': new_id(),
+                'aluno_id': aluno_id,
+                'tipo': 'Receita',
+                'categoria': 'Mensalidade',
+                'valor': valor,
+                'data_vencimento': vencimento.isoformat(),
+                'data_pagamento': dt_pg,
+                'status': status_pg,
+                'mes_referencia': cal.iso[m],
+                'ano_referencia': cal.years[m]
+            }
+
+# Same rows as generate_receitas for the numpy engine: one students × months
+# cross-join per block of students, masked by each student's active months
+def generate_receitas_blocks(alunos, seed=SEED):
+    from datagen.vectorized import BLOCK_STUDENTS, uuid_block
+    import numpy as np
 
-with open('fact_financeiro.csv', 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=financeiro[0].keys())
-    writer.writeheader()
-    writer.writerows(financeiro)
+    cal = MonthCalendar(START_DATE, CURRENT_DATE)
+    rng = np.random.default_rng(derive_seed(seed, 'receitas'))
+    iso = np.array(cal.iso, dtype=object)
+    years = np.array(cal.years)
+    vencimentos = cal.on_day(10)
+    vencimento_iso = np.array([d.isoformat() for d in vencimentos], dtype=object)
+    # Payment dates for every month and offset -5..5 from the due date
+    pagamentos = np.array([[(d + timedelta(days=k)).isoformat() for k in range(-5, 6)] for d in vencimentos],
+                          dtype=object)
+    statuses = np.array(['Pago', 'Atrasado'], dtype=object)
+
+    inadimplente = alunos.code('status_matricula', 'Inadimplente')
+
+    def block_of(first, last):
+        lo, hi = alunos.windows(cal, first, last)
+        student, month = np.nonzero(cal.active_mask(lo, hi))
+        n = len(student)
+        bad = (alunos.array('status_matricula', first, last) == inadimplente)[student]
+        bolsista = alunos.flag_array('bolsista', first, last)[student]
+        atrasado = rng.random(n) < np.where(bad, 0.6, 0.05)
+        pagamento = pagamentos[month, rng.integers(0, 11, size=n)]
+        pagamento[atrasado] = ''
+        return {
+            'id': uuid_block(rng, n),
+            'aluno_id': np.array(alunos.ids(first, last), dtype=object)[student],
+            'tipo': ['Receita'] * n,
+            'categoria': ['Mensalidade'] * n,
+            'valor': np.where(bolsista, 0, MENSALIDADE_BASE),
+            'data_vencimento': vencimento_iso[month],
+            'data_pagamento': pagamento,
+            'status': statuses[atrasado.astype(np.int64)],
+            'mes_referencia': iso[month],
+            'ano_referencia': years[month]
+        }
+
+    for first in range(0, len(alunos), BLOCK_STUDENTS):
+        yield block_of(first, min(first + BLOCK_STUDENTS, len(alunos)))
+
+# Generate Expenses
+def generate_despesas():
+    # ~1.8M total expenses vs ~2.5M revenue
+    cal = MonthCalendar(START_DATE, CURRENT_DATE)
+    for m, pagamento in enumerate(cal.on_day(20)):
+        for cat in EXPENSES_CATS:
+            val = random.uniform(5000, 50000)
+            yield {
+                'id': new_id(),
+                'aluno_id': '',
+                'tipo': 'Despesa',
+                'categoria': cat,
+                'valor': round(val, 2),
+                'data_vencimento': pagamento.isoformat(),
+                'data_pagamento': pagamento.isoformat(),
+                'status': 'Pago',
+                'mes_referencia': cal.iso[m],
+                'ano_referencia': cal.years[m]
+            }
 
 # 4. Generate OPERACIONAL TICKETS
-tickets = []
-print("Generating Tickets...")
-
-# Uniform distribution between Aug 2025 and Jan 2026 (or wider as requested)
-ticket_start = date(2025, 2, 1)
-total_days = (CURRENT_DATE - ticket_start).days
-
-for _ in range(300): # 300 tickets
-    open_dt = ticket_start + timedelta(days=random.randint(0, total_days))
-    
-    # Resolution SLA (avg 1.8 days)
-    sla_days = max(0.1, random.gauss(1.8, 1.0))
-    resolve_dt = open_dt + timedelta(days=sla_days)
-    
-    status = 'Resolvido'
-    if resolve_dt > CURRENT_DATE:
-        status = 'Aberto'
-        resolve_dt_str = ''
-    else:
-        resolve_dt_str = resolve_dt.isoformat()
-        
-    tickets.append({
-        'id': str(uuid.uuid4()),
-        'unidade': random.choice(UNIDADES),
-        'setor': random.choice(['TI', 'Manutenção', 'Secretaria', 'Segurança', 'Limpeza']),
-        'assunto': 'Solicitação de serviço padrão',
-        'prioridade': random.choice(['Baixa', 'Média', 'Alta']),
-        'status': status,
-        'data_abertura': open_dt.isoformat(),
-        'data_resolucao': resolve_dt_str,
-        'horas_ate_resolucao': round(sla_days * 24, 2) if status == 'Resolvido' else 0
-    })
-
-with open('fact_operacional_tickets.csv', 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=tickets[0].keys())
-    writer.writeheader()
-    writer.writerows(tickets)
+def generate_tickets():
+
+    # Uniform distribution between Aug 2025 and Jan 2026 (or wider as requested)
+    ticket_start = date(2025, 2, 1)
+    total_days = (CURRENT_DATE - ticket_start).days
 
+    for _ in range(300): # 300 tickets
+        open_dt = ticket_start + timedelta(days=random.randint(0, total_days))
+
+        # Resolution SLA (avg 1.8 days)
+        sla_days = max(0.1, random.gauss(1.8, 1.0))
+        resolve_dt = open_dt + timedelta(days=sla_days)
+
+        status = 'Resolvido'
+        if resolve_dt > CURRENT_DATE:
+            status = 'Aberto'
+            resolve_dt_str = ''
+        else:
+            resolve_dt_str = resolve_dt.isoformat()
+
+        yield {
+            'id': new_id(),
+            'unidade': random.choice(UNIDADES),
+            'setor': random.choice(['TI', 'Manutenção', 'Secretaria', 'Segurança', 'Limpeza']),
+            'assunto': 'Solicitação de serviço padrão',
+            'prioridade': random.choice(['Baixa', 'Média', 'Alta']),
+            'status': status,
+            'data_abertura': open_dt.isoformat(),
+            'data_resolucao': resolve_dt_str,
+            'horas_ate_resolucao': round(sla_days * 24, 2) if status == 'Resolvido' else 0
+        }
 
 # 5. Generate OPERACIONAL CONSUMO (for 2025-2026)
-recursos = []
-print("Generating Recursos...")
-
-current_date_iter = START_DATE
-while current_date_iter <= CURRENT_DATE:
-    for unit in UNIDADES:
-        base_size = 1.0 if unit == 'Centro' else 0.7
-        
-        recursos.append({
-            'id': str(uuid.uuid4()),
-            'unidade': unit,
-            'mes_referencia': current_date_iter.isoformat(),
-            'custo_impressao': round(random.uniform(500, 1500) * base_size, 2),
-            'consumo_energia_kwh': round(random.uniform(2000, 4000) * base_size, 2),
-            'consumo_agua_m3': round(random.uniform(100, 300) * base_size, 2),
-            'taxa_desperdicio_alimento': round(random.uniform(1, 5), 2),
-            'refeicoes_servidas': int(random.uniform(3000, 5000) * base_size),
-            'custo_medio_refeicao': round(random.uniform(10, 15), 2),
-            'absenteismo_docente': round(random.uniform(0, 5), 2)
-        })
-    if current_date_iter.month == 12:
-        current_date_iter = date(current_date_iter.year + 1, 1, 1)
-    else:
-         current_date_iter = date(current_date_iter.year, current_date_iter.month + 1, 1)
+def generate_recursos():
+
+    for mes in MonthCalendar(START_DATE, CURRENT_DATE).iso:
+        for unit in UNIDADES:
+            base_size = 1.0 if unit == 'Centro' else 0.7
 
-with open('fact_recursos_consumo.csv', 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=recursos[0].keys())
-    writer.writeheader()
-    writer.writerows(recursos)
+            yield {
+                'id': new_id(),
+                'unidade': unit,
+                'mes_referencia': mes,
+                'custo_impressao': round(random.uniform(500, 1500) * base_size, 2),
+                'consumo_energia_kwh': round(random.uniform(2000, 4000) * base_size, 2),
+                'consumo_agua_m3': round(random.uniform(100, 300) * base_size, 2),
+                'taxa_desperdicio_alimento': round(random.uniform(1, 5), 2),
+                'refeicoes_servidas': int(random.uniform(3000, 5000) * base_size),
+                'custo_medio_refeicao': round(random.uniform(10, 15), 2),
+                'absenteismo_docente': round(random.uniform(0, 5), 2)
+            }
 
 # 6. Generate NPS
-nps_data = []
-print("Generating NPS...")
+def generate_nps(alunos):
 
-for aluno in alunos:
-    if aluno['status_matricula'] == 'Evadido': continue
-    
     # 2 Surveys per year
     dates = [date(2025, 6, 15), date(2025, 11, 15)]
-    
-    for d in dates:
-        score = random.choices([9, 10, 7, 8, 5, 6, 0, 4], weights=[0.4, 0.3, 0.1, 0.1, 0.05, 0.03, 0.01, 0.01])[0]
-        # Health score impacted by financial status
-        hs_base = 90
-        if aluno['status_matricula'] == 'Inadimplente': hs_base -= 30
-        
-        nps_data.append({
-            'id': str(uuid.uuid4()),
-            'aluno_id': aluno['id'],
-            'data_pesquisa': d.isoformat(),
-            'nota_nps': score,
-            'health_score_familia': max(0, min(100, int(random.gauss(hs_base, 10)))),
-            'comentario': 'Gosto muito da escola' if score > 8 else 'Pode melhorar'
-        })
-
-with open('fact_pesquisa_nps.csv', 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=nps_data[0].keys())
-    writer.writeheader()
-    writer.writerows(nps_data)
-
-print("Done! CSV files generated.")
+
+    status = alunos['status_matricula']
+    evadido, inadimplente = alunos.code('status_matricula', 'Evadido'), alunos.code('status_matricula', 'Inadimplente')
+    for i in range(len(alunos)):
+        if status[i] == evadido: continue
+
+        aluno_id = alunos.id(i)
+        for d in dates:
+            score = random.choices([9, 10, 7, 8, 5, 6, 0, 4], weights=[0.4, 0.3, 0.1, 0.1, 0.05, 0.03, 0.01, 0.01])[0]
+            # Health score impacted by financial status
+            hs_base = 90
+            if status[i] == inadimplente: hs_base -= 30
+
+            yield {
+                'id': new_id(),
+                'aluno_id': aluno_id,
+                'data_pesquisa': d.isoformat(),
+                'nota_nps': score,
+                'health_score_familia': max(0, min(100, int(random.gauss(hs_base, 10)))),
+                'comentario': 'Gosto muito da escola' if score > 8 else 'Pode melhorar'
+            }
+
+
+# Per-student tables of one shard. File output goes to part files under
+# out_dir/_shards (merged by the parent); with --load each shard copies
+# straight into Postgres over its own connections. Run in the parent
+# (--workers 0 or 1), the writes are stages of its ``manifest``.
+def generate_shard(shard):
+    (index, start, count), args, manifest = shard
+    seed_streams(derive_seed(SEED, 'shard', index))
+    if args.load:
+        sink = open_sink(load=args.load, load_format=args.load_format, table_map=PG_TABLES)
+    else:
+        sink = open_sink(shard_dir(args.out_dir, index), args.chunk_size, fmt=args.format, schemas=SCHEMAS, quiet=True,
+                         compression=args.compress)
+    if manifest is not None:
+        sink = manifest.wrap(sink, shard=index)
+
+    alunos = new_students()
+    rows = {'dim_alunos': sink.write_rows('dim_alunos', alunos.collect(generate_alunos(count)))}
+    if args.engine == 'numpy':
+        blocks = generate_academico_blocks(alunos, seed=derive_seed(SEED, 'shard', index, 'academico'))
+        rows['fact_academico'] = sink.write_blocks('fact_academico', blocks)
+    else:
+        rows['fact_academico'] = sink.write_rows('fact_academico', generate_academico(alunos))
+    if args.engine == 'numpy':
+        blocks = generate_receitas_blocks(alunos, seed=derive_seed(SEED, 'shard', index))
+        rows['fact_financeiro'] = sink.write_blocks('fact_financeiro', blocks)
+    else:
+        rows['fact_financeiro'] = sink.write_rows('fact_financeiro', generate_receitas(alunos))
+    rows['fact_pesquisa_nps'] = sink.write_rows('fact_pesquisa_nps', generate_nps(alunos))
+    sink.close()
+    if args.load:
+        return {name: (None, n) for name, n in rows.items()}
+    return {name: (sink.path(name), n) for name, n in rows.items()}
+
+
+# The students are always drawn shard by shard, in this process or on a
+# pool: the output is the same for any --workers
+def generate_all(args, sink, manifest):
+    shards = shard_ranges(TOTAL_ALUNOS, SHARD_SIZE)
+    inline = args.workers <= 1
+    print(f"Generating {TOTAL_ALUNOS} alunos in {len(shards)} shards"
+          f"{'' if inline else f' ({args.workers} workers)'}...")
+    load_pools()  # build the pool cache once, before the workers need it
+    with manifest.stage('shards') as stage:
+        results = run_shards(generate_shard, [(s, args, manifest if inline else None) for s in shards], args.workers,
+                             stage=stage)
+        stage['rows'] = sum(n for r in results for _, n in r.values())
+
+    # School-wide tables are small: one stream of their own, in this process
+    seed_streams(derive_seed(SEED, 'global'))
+    if args.load:
+        sink.write_rows('fact_financeiro', generate_despesas())
+    else:
+        part = open_sink(shard_dir(args.out_dir, len(shards)), args.chunk_size, fmt=args.format, schemas=SCHEMAS, quiet=True,
+                         compression=args.compress)
+        despesas = (part.path('fact_financeiro'), part.write_rows('fact_financeiro', generate_despesas()))
+        for name in ('dim_alunos', 'fact_academico', 'fact_pesquisa_nps'):
+            sink.merge(name, [r[name] for r in results])
+        sink.merge('fact_financeiro', [r['fact_financeiro'] for r in results] + [despesas])
+        cleanup_shards(args.out_dir)
+
+    print("Generating Tickets...")
+    sink.write_rows('fact_operacional_tickets', generate_tickets())
+    print("Generating Recursos...")
+    sink.write_rows('fact_recursos_consumo', generate_recursos())
+
+
+def main():
+    global TOTAL_ALUNOS
+    parser = argparse.ArgumentParser(description='Gera os CSVs do modelo estrela de BI (dim_/fact_).')
+    parser.add_argument('--out-dir', default='.', help='Diretório de saída dos CSVs')
+    parser.add_argument('--alunos', type=int, default=TOTAL_ALUNOS, help=f'Número de alunos (padrão: {TOTAL_ALUNOS})')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por lote de escrita')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='numpy gera fact_academico e fact_financeiro em blocos vetorizados (requer numpy)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help=f'Gera os shards de {SHARD_SIZE} alunos num pool de N processos; 0 = neste processo '
+                             f'(resultado igual para qualquer N)')
+    parser.add_argument('--load', metavar='POSTGRES_URL',
+                        help='Carrega as tabelas direto no Postgres via COPY em vez de gerar CSVs (dim_alunos -> alunos, ver bi_schema.sql)')
+    parser.add_argument('--truncate-cascade', action='store_true',
+                        help='Com --load, esvazia também as tabelas que referenciam alunos (desempenho_academico, '
+                             'financeiro_mensalidades...), que não são recarregadas')
+    parser.add_argument('--load-format', choices=['text', 'binary'], default='text', help='Formato do COPY (com --load)')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Formato dos arquivos: colunas tipadas em parquet/arrow (requer pyarrow)')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                        help='Comprime cada CSV em frames independentes (.csv.gz/.csv.zst) enquanto gera; zstd requer zstandard')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help='Perfila cada etapa em <out-dir>/profiles (pyinstrument precisa estar instalado)')
+    args = parser.parse_args()
+    TOTAL_ALUNOS = args.alunos
+    if args.compress and (args.format != 'csv' or args.load):
+        parser.error('--compress só se aplica aos CSVs (parquet/arrow já saem comprimidos em zstd)')
+
+    manifest = RunManifest(args.out_dir, profile=args.profile)
+    sink = manifest.wrap(open_sink(args.out_dir, args.chunk_size, args.load, args.load_format, table_map=PG_TABLES,
+                                   fmt=args.format, schemas=SCHEMAS, compression=args.compress,
+                                   cascade=args.truncate_cascade))
+    sink.prepare(TABLES)
+    try:
+        generate_all(args, sink, manifest)
+    finally:
+        sink.finish()
+        manifest.save(seed=SEED, alunos=TOTAL_ALUNOS)
+
+    print("Done! Tables loaded." if args.load else f"Done! {args.format.upper()} files generated.")
+
+
+if __name__ == '__main__':
+    main()
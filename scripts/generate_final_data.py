@@ -1,14 +1,43 @@
-
-import csv
-import uuid
+import argparse
+import importlib.util
+import os
 import random
 from datetime import datetime, timedelta, date
-from faker import Faker
 
-# Init Faker
-fake = Faker('pt_BR')
-Faker.seed(42)
-random.seed(42)
+from datagen import cache as table_cache
+from datagen.compress import INDEX_SUFFIX
+from datagen.dimension import STATUS, StudentDimension
+from datagen.instrument import RunManifest
+from datagen.months import MonthCalendar, next_month
+from datagen.pools import date_of_birth, load_pools, sentence
+from datagen.rng import TimeOrderedIds, derive_seed, uuid_from
+from datagen.rollups import GroupSums
+from datagen.selection import parse_tables, with_dependencies
+from datagen.state import STATE_FILE, load_state, save_state
+from datagen import extsort, tiles
+from datagen.sharding import SHARD_SIZE, cleanup_shards, run_shards, shard_dir, shard_ranges
+from datagen.writers import block_rows, open_sink, CHUNK_SIZE
+
+SEED = 42
+
+random.seed(SEED)
+# Ids come from their own stream so they are reproducible without shifting the values
+id_rng = random.Random(SEED)
+
+def new_id():
+    return uuid_from(id_rng)
+
+# Re-seed every stream (used per shard, so each shard is independent of the others)
+def seed_streams(seed):
+    random.seed(seed)
+    id_rng.seed(derive_seed(seed, 'ids'))
+
+# Rows of table ``name`` drawn from streams of its own, derived from ``seed``
+# and the name: a table comes out the same whichever tables are generated
+# before it (--tables). Seeded when the first row is drawn.
+def table_rows(name, rows, seed=SEED):
+    seed_streams(derive_seed(seed, name))
+    yield from rows
 
 # Configuration matching App Schema
 UNIDADES = ['Centro', 'Sul', 'Norte']
@@ -36,8 +65,133 @@ START_DATE = date(2025, 2, 1)
 END_DATE = date(2026, 3, 1) # Including current year data
 CURRENT_DATE = date(2026, 2, 15)
 
+# Incremental (--append) runs: monthly evasion hazard (~20% over the first
+# year, as in generate_alunos) and chamados per new month (~200 per year)
+EVASAO_MENSAL = 0.02
+CHAMADOS_POR_MES = 15
+# Bimestres of the school year: (first day, day after the last) as (month, day)
+BIMESTRES = [((2, 2), (4, 18)), ((4, 20), (7, 1)), ((8, 3), (10, 9)), ((10, 13), (12, 16))]
+
 # Generate Escola ID (We need at least one to link)
-ESCOLA_ID = str(uuid.uuid4())
+ESCOLA_ID = new_id()
+# Output tables, parents first
+TABLES = ['escolas', 'alunos', 'desempenho_academico', 'financeiro_mensalidades',
+          'financeiro_despesas', 'operacional_chamados', 'metricas_mensais',
+          'rollup_desempenho', 'rollup_financeiro_mensal', 'rollup_mapa_alunos', 'aluno_risk_features']
+# --tables: what each table is built from (also built, but not written, when not selected)
+DEPENDS = {
+    'desempenho_academico': ['alunos'],
+    'financeiro_mensalidades': ['alunos'],
+    'rollup_desempenho': ['desempenho_academico'],
+    'rollup_financeiro_mensal': ['financeiro_mensalidades'],
+    'rollup_mapa_alunos': ['alunos'],
+    'aluno_risk_features': ['desempenho_academico', 'financeiro_mensalidades', 'metricas_mensais'],
+}
+
+# --partition: (tenant column, period column) of each table, for the
+# <table>/escola_id=<id>/ano=<year>/ layout. Tables without escola_id
+# belong to the run's school (ESCOLA_ID); None means no such level. The
+# student facts reach their school through aluno_id -> alunos.escola_id, so
+# load_data.py --escola-id reloads them with the school's alunos.
+VIA_ALUNO = ('aluno_id', 'alunos', 'id', 'escola_id')
+PARTITIONS = {
+    'escolas': ('id', None),
+    'alunos': ('escola_id', None),
+    'desempenho_academico': (VIA_ALUNO, 'ano_letivo'),
+    'financeiro_mensalidades': (VIA_ALUNO, 'mes_referencia'),
+    'financeiro_despesas': (None, 'data_despesa'),
+    'operacional_chamados': (None, 'data_abertura'),
+    'metricas_mensais': (None, 'mes_referencia'),
+    'rollup_desempenho': ('escola_id', 'ano_letivo'),
+    'rollup_financeiro_mensal': ('escola_id', 'mes_referencia'),
+    'rollup_mapa_alunos': ('escola_id', None),
+    'aluno_risk_features': ('escola_id', None),
+}
+
+# --cluster: the key each fact table's file is sorted on (--cluster-key
+# overrides it), so the rows of a month or a bimestre lie together in the
+# heap once loaded and BRIN indexes on these columns stay selective
+CLUSTER = {
+    'desempenho_academico': ['ano_letivo', 'bimestre', 'aluno_id', 'disciplina'],
+    'financeiro_mensalidades': ['mes_referencia', 'aluno_id'],
+    'financeiro_despesas': ['data_despesa'],
+    'operacional_chamados': ['data_abertura'],
+    'metricas_mensais': ['mes_referencia', 'unidade_escolar', 'tipo_metrica'],
+}
+# --cluster: (columns, function of their values) giving the time of a row,
+# for its time-ordered (UUIDv7) id. Only these tables get new ids: no other
+# table refers to their rows.
+ID_TIME = {
+    'desempenho_academico': (['ano_letivo', 'bimestre'],
+                             lambda ano, bim: date(int(ano), *BIMESTRES[int(bim) - 1][0])),
+    'financeiro_mensalidades': (['mes_referencia'], str),
+    'financeiro_despesas': (['data_despesa'], str),
+    'operacional_chamados': (['data_abertura'], str),
+    'metricas_mensais': (['mes_referencia'], str),
+}
+
+# Column types for --format parquet/arrow, following supabase_schema.sql
+# (bi_schema.sql for the alunos extras; columns neither has get the closest
+# type). 'dict' marks low-cardinality text stored dictionary-encoded.
+SCHEMAS = {
+    'escolas': {'id': 'uuid', 'nome': 'text', 'cidade': 'text', 'estado': 'char(2)'},
+    'alunos': {
+        'id': 'uuid', 'escola_id': 'uuid', 'nome_completo': 'text', 'data_nascimento': 'date',
+        'genero': 'dict', 'turma': 'dict', 'segmento': 'dict', 'unidade': 'dict',
+        'status_matricula': 'dict', 'cor_raca': 'dict', 'faixa_renda': 'dict',
+        'bolsista': 'boolean', 'tem_irmaos': 'boolean', 'cidade_aluno': 'dict',
+        'latitude': 'numeric(10,8)', 'longitude': 'numeric(11,8)',
+        'data_matricula': 'date', 'data_evasao': 'date'
+    },
+    'desempenho_academico': {
+        'id': 'uuid', 'aluno_id': 'uuid', 'disciplina': 'dict', 'media_final': 'numeric(4,2)',
+        'percentual_presenca': 'numeric(5,2)', 'taxa_entrega_atividades': 'numeric(5,2)',
+        'bimestre': 'integer', 'ano_letivo': 'integer'
+    },
+    'financeiro_mensalidades': {
+        'id': 'uuid', 'aluno_id': 'uuid', 'mes_referencia': 'date', 'valor': 'numeric(10,2)',
+        'status_pagamento': 'dict'
+    },
+    'financeiro_despesas': {
+        'id': 'uuid', 'categoria': 'dict', 'descricao': 'text', 'valor': 'numeric(10,2)',
+        'data_despesa': 'date', 'status': 'dict'
+    },
+    'operacional_chamados': {
+        'id': 'uuid', 'categoria': 'dict', 'descricao': 'text', 'prioridade': 'dict', 'status': 'dict',
+        'data_abertura': 'timestamptz', 'data_resolucao': 'timestamptz'
+    },
+    'metricas_mensais': {
+        'id': 'uuid', 'mes_referencia': 'date', 'unidade_escolar': 'dict', 'tipo_metrica': 'dict',
+        'valor': 'numeric(10,2)', 'unidade': 'dict'
+    },
+    'rollup_desempenho': {
+        'escola_id': 'uuid', 'unidade': 'dict', 'segmento': 'dict', 'disciplina': 'dict',
+        'ano_letivo': 'integer', 'bimestre': 'integer', 'registros': 'integer',
+        'media_final': 'numeric(4,2)', 'percentual_presenca': 'numeric(5,2)', 'aprovados': 'integer',
+        'soma_media_final': 'numeric(14,2)', 'soma_presenca': 'numeric(14,2)'
+    },
+    'rollup_financeiro_mensal': {
+        'escola_id': 'uuid', 'mes_referencia': 'date', 'unidade': 'dict', 'mensalidades': 'integer',
+        'receita_prevista': 'numeric(14,2)', 'receita_paga': 'numeric(14,2)',
+        'mensalidades_atrasadas': 'integer', 'mensalidades_pendentes': 'integer',
+        'taxa_inadimplencia': 'numeric(5,2)', 'evasoes': 'integer'
+    },
+    'rollup_mapa_alunos': {
+        'escola_id': 'uuid', 'zoom': 'integer', 'tile_x': 'integer', 'tile_y': 'integer', 'alunos': 'integer',
+        'ativos': 'integer', 'evadidos': 'integer', 'inadimplentes': 'integer', 'bolsistas': 'integer',
+        'latitude': 'numeric(9,6)', 'longitude': 'numeric(9,6)'
+    },
+    'aluno_risk_features': {
+        'aluno_id': 'uuid', 'escola_id': 'uuid', 'unidade': 'dict', 'segmento': 'dict', 'turma': 'dict',
+        'status_matricula': 'dict', 'periodos': 'integer', 'media_atual': 'numeric(4,2)',
+        'media_anterior': 'numeric(4,2)', 'tendencia_nota': 'numeric(5,2)', 'presenca_atual': 'numeric(5,2)',
+        'presenca_media': 'numeric(5,2)', 'entrega_media': 'numeric(5,2)', 'disciplinas_abaixo': 'integer',
+        'registros_risco': 'integer', 'mensalidades_atrasadas': 'integer', 'atraso_consecutivo': 'integer',
+        'nps_unidade': 'numeric(5,2)', 'health_score_unidade': 'numeric(4,2)', 'score_risco': 'numeric(5,2)',
+        'nivel_risco': 'dict', 'em_risco': 'boolean', 'referencia': 'date'
+    },
+}
+
 escolas_cnt = [{
     'id': ESCOLA_ID,
     'nome': 'Ensitec School',
@@ -57,196 +211,860 @@ def get_academic_performance(is_studious):
         entrega = random.uniform(40, 85)
     return nota, presenca, entrega
 
+def random_date(start, end):
+    return start + timedelta(days=random.randint(0, (end - start).days))
+
+# The students as the fact generators see them (see datagen.dimension)
+def new_students(rows=()):
+    categories = {'unidade': UNIDADES, 'segmento': SEGMENTOS, 'status_matricula': STATUS,
+                  'turma': [t for turmas in TURMAS.values() for t in turmas]}
+    return StudentDimension.from_rows(rows, categories, flags=('bolsista', 'tem_irmaos'))
+
 # 1. ALUNOS (Table: alunos)
-alunos = []
-print("Generating Alunos...")
-
-for _ in range(TOTAL_ALUNOS):
-    unidade = random.choice(UNIDADES)
-    segmento = random.choice(SEGMENTOS)
-    turma = random.choice(TURMAS[segmento])
-    
-    status_roll = random.random()
-    status = 'Ativo'
-    dt_evasao = ''
-    
-    if status_roll < 0.20:
-        status = 'Evadido'
-        dt_evasao = (START_DATE + timedelta(days=random.randint(30, 300))).isoformat()
-    elif status_roll < 0.34:
-        status = 'Inadimplente'
-        
-    lat, lon = COORDS[unidade]
-    
-    alunos.append({
-        'id': str(uuid.uuid4()),
-        'escola_id': ESCOLA_ID,
-        'nome_completo': fake.name(),
-        'data_nascimento': fake.date_of_birth(minimum_age=4, maximum_age=18).isoformat(),
-        'genero': random.choice(['M', 'F']),
-        'turma': turma,
-        'segmento': segmento,
-        'unidade': unidade, # Added Unidade
-        'status_matricula': status,
-        'cor_raca': random.choice(['Branca', 'Parda', 'Preta', 'Amarela', 'Indígena']),
-        'faixa_renda': random.choice(['Até 3 SM', '3-6 SM', '6-10 SM', 'Acima de 10 SM']),
-        'bolsista': str(random.random() < 0.15).lower(), # Postgres boolean
-        'tem_irmaos': str(random.random() < 0.30).lower(),
-        'cidade_aluno': 'São Paulo',
-        'latitude': lat + random.uniform(-0.02, 0.02),
-        'longitude': lon + random.uniform(-0.02, 0.02),
-        'data_matricula': (START_DATE - timedelta(days=random.randint(0, 60))).isoformat(),
-        'data_evasao': dt_evasao
-    })
+def generate_alunos(total=None):
+    pools = load_pools()
+    for _ in range(TOTAL_ALUNOS if total is None else total):
+        unidade = random.choice(UNIDADES)
+        segmento = random.choice(SEGMENTOS)
+        turma = random.choice(TURMAS[segmento])
+
+        status_roll = random.random()
+        status = 'Ativo'
+        dt_evasao = ''
+
+        if status_roll < 0.20:
+            status = 'Evadido'
+            dt_evasao = (START_DATE + timedelta(days=random.randint(30, 300))).isoformat()
+        elif status_roll < 0.34:
+            status = 'Inadimplente'
+
+        lat, lon = COORDS[unidade]
+
+        yield {
+            'id': new_id(),
+            'escola_id': ESCOLA_ID,
+            'nome_completo': random.choice(pools.names),
+            'data_nascimento': date_of_birth(4, 18, CURRENT_DATE).isoformat(),
+            'genero': random.choice(['M', 'F']),
+            'turma': turma,
+            'segmento': segmento,
+            'unidade': unidade, # Added Unidade
+            'status_matricula': status,
+            'cor_raca': random.choice(['Branca', 'Parda', 'Preta', 'Amarela', 'Indígena']),
+            'faixa_renda': random.choice(['Até 3 SM', '3-6 SM', '6-10 SM', 'Acima de 10 SM']),
+            'bolsista': str(random.random() < 0.15).lower(), # Postgres boolean
+            'tem_irmaos': str(random.random() < 0.30).lower(),
+            'cidade_aluno': 'São Paulo',
+            'latitude': lat + random.uniform(-0.02, 0.02),
+            'longitude': lon + random.uniform(-0.02, 0.02),
+            'data_matricula': (START_DATE - timedelta(days=random.randint(0, 60))).isoformat(),
+            'data_evasao': dt_evasao
+        }
+
+# The students of a run of ``total``, as generate_shard draws them: shard by
+# shard (SHARD_SIZE each), each shard from streams of its own
+def draw_alunos(total=None):
+    for index, _, count in shard_ranges(TOTAL_ALUNOS if total is None else total, SHARD_SIZE):
+        yield from table_rows('alunos', generate_alunos(count), derive_seed(SEED, 'shard', index))
 
 # 2. DESEMPENHO (Table: desempenho_academico)
-desempenho = []
-print("Generating Desempenho...")
-for aluno in alunos:
-    if aluno['status_matricula'] == 'Evadido': continue
-    
-    is_studious = random.random() > 0.25
-
-    # 2025: 4 Bimestres
-    for bim in range(1, 4): 
-        for disc in DISCIPLINAS[aluno['segmento']]:
-            nota, presenca, entrega = get_academic_performance(is_studious)
-            
-            desempenho.append({
-                'id': str(uuid.uuid4()),
-                'aluno_id': aluno['id'],
-                'disciplina': disc,
-                'media_final': round(nota, 1),
-                'percentual_presenca': round(presenca, 1),
-                'taxa_entrega_atividades': round(entrega, 1),
-                'bimestre': bim,
-                'ano_letivo': 2025
-            })
-
-    # 2026: 1 Bimestre (only)
-    if aluno['status_matricula'] != 'Evadido' or (aluno['data_evasao'] and aluno['data_evasao'] > '2026-02-01'):
-         for disc in DISCIPLINAS[aluno['segmento']]:
-            nota, presenca, entrega = get_academic_performance(is_studious)
-            desempenho.append({
-                'id': str(uuid.uuid4()),
-                'aluno_id': aluno['id'],
-                'disciplina': disc,
-                'media_final': round(nota, 1),
-                'percentual_presenca': round(presenca, 1),
-                'taxa_entrega_atividades': round(entrega, 1),
-                'bimestre': 1,
-                'ano_letivo': 2026
-            })
+def generate_desempenho(alunos, rollup=None, features=None):
+    status, segmento, evasao = alunos['status_matricula'], alunos['segmento'], alunos['data_evasao']
+    evadido = alunos.code('status_matricula', 'Evadido')
+    feb_2026 = alunos.day('2026-02-01')
+    for i in range(len(alunos)):
+        if status[i] == evadido: continue
+
+        aluno_id = alunos.id(i)
+        unidade, seg = alunos.value('unidade', i), alunos.categories['segmento'][segmento[i]]
+        is_studious = random.random() > 0.25
+
+        # 2025: 4 Bimestres
+        for bim in range(1, 4):
+            for disc in DISCIPLINAS[seg]:
+                nota, presenca, entrega = get_academic_performance(is_studious)
+
+                row = {
+                    'id': new_id(),
+                    'aluno_id': aluno_id,
+                    'disciplina': disc,
+                    'media_final': round(nota, 1),
+                    'percentual_presenca': round(presenca, 1),
+                    'taxa_entrega_atividades': round(entrega, 1),
+                    'bimestre': bim,
+                    'ano_letivo': 2025
+                }
+                if rollup is not None: add_desempenho(rollup, unidade, seg, row)
+                if features is not None: add_grade(features, i, row)
+                yield row
+
+        # 2026: 1 Bimestre (only)
+        if status[i] != evadido or evasao[i] > feb_2026:
+            for disc in DISCIPLINAS[seg]:
+                nota, presenca, entrega = get_academic_performance(is_studious)
+                row = {
+                    'id': new_id(),
+                    'aluno_id': aluno_id,
+                    'disciplina': disc,
+                    'media_final': round(nota, 1),
+                    'percentual_presenca': round(presenca, 1),
+                    'taxa_entrega_atividades': round(entrega, 1),
+                    'bimestre': 1,
+                    'ano_letivo': 2026
+                }
+                if rollup is not None: add_desempenho(rollup, unidade, seg, row)
+                if features is not None: add_grade(features, i, row)
+                yield row
+
+# Same rows as generate_desempenho, drawn in blocks by the numpy engine
+def generate_desempenho_blocks(alunos, seed=SEED, rollup=None, features=None):
+    from datagen.vectorized import AcademicEngine, GradeProfile, format_fixed, uuid_block
+    import numpy as np
+
+    engine = AcademicEngine(
+        DISCIPLINAS,
+        periods=[(1, 2025), (2, 2025), (3, 2025), (1, 2026)],
+        # Same bounds as get_academic_performance
+        good=GradeProfile(nota=(6.0, 10), presenca=(85, 100), entrega=(90, 100)),
+        bad=GradeProfile(nota=(2, 7.5), presenca=(60, 90), entrega=(40, 85)),
+        p_good=0.75,
+        n_periods=lambda status, rng: (status != 'Evadido') * 4,
+        seed=seed
+    )
+    # Rollup group code per row: (unidade, disciplina, period)
+    unidades = alunos.array('unidade').astype(np.int64)
+    n_disc = len(engine.segmentos) * engine.width
+    n_per = len(engine.periods)
+
+    def decode(code):
+        rest, period = divmod(code, n_per)
+        unidade, disc_code = divmod(rest, n_disc)
+        segmento, disciplina = engine.decode_disciplina(disc_code)
+        bimestre, ano = engine.periods[period].tolist()
+        return (ESCOLA_ID, alunos.categories['unidade'][unidade], segmento, disciplina, ano, bimestre)
+
+    for block in engine.blocks(alunos):
+        # Same rounding as the written columns
+        nota, presenca = np.rint(block['nota'] * 10) / 10, np.rint(block['presenca'] * 10) / 10
+        if rollup is not None:
+            unidade = unidades[block['first'] + block['student']]
+            rollup.add_codes((unidade * n_disc + block['disc_code']) * n_per + block['period'],
+                             [nota, presenca, (nota >= 6.0) & (presenca >= 75)], decode)
+        if features is not None:
+            features.add_grades(block['first'] + block['student'], block['ano'], block['bimestre'], nota, presenca,
+                                np.rint(block['entrega'] * 10) / 10)
+        yield {
+            'id': uuid_block(engine.rng, len(block['aluno_id'])),
+            'aluno_id': block['aluno_id'],
+            'disciplina': block['disciplina'],
+            'media_final': format_fixed(block['nota'], 1),
+            'percentual_presenca': format_fixed(block['presenca'], 1),
+            'taxa_entrega_atividades': format_fixed(block['entrega'], 1),
+            'bimestre': block['bimestre'],
+            'ano_letivo': block['ano']
+        }
 
 # 3. FINANCEIRO (Table: financeiro_mensalidades)
-mensalidades = []
-print("Generating Mensalidades...")
-curr = START_DATE
-while curr < CURRENT_DATE:
-    for aluno in alunos:
-        if aluno['data_evasao'] and curr.isoformat() > aluno['data_evasao']: continue
-        if aluno['bolsista'] == 'true': continue
-        
-        status_pg = 'Pago'
-        if aluno['status_matricula'] == 'Inadimplente' and random.random() < 0.7:
-             status_pg = 'Atrasado'
-        if curr.month == 2 and curr.year == 2026: # Current month
-             status_pg = 'Pendente'
-
-        mensalidades.append({
-            'id': str(uuid.uuid4()),
-            'aluno_id': aluno['id'],
-            'mes_referencia': curr.replace(day=1).isoformat(),
-            'valor': 1500.00,
-            'status_pagamento': status_pg
-        })
-    
-    if curr.month == 12: curr = date(curr.year + 1, 1, 1)
-    else: curr = date(curr.year, curr.month + 1, 1)
+# How a month's bill settles: inadimplentes fall behind 70% of the time
+def pagamento_status(inadimplente):
+    if inadimplente and random.random() < 0.7:
+        return 'Atrasado'
+    return 'Pago'
+
+def generate_mensalidades(alunos, start=START_DATE, end=None, rollup=None, features=None):
+    cal = MonthCalendar(start, end or CURRENT_DATE)
+    status = alunos['status_matricula']
+    inadimplente = alunos.code('status_matricula', 'Inadimplente')
+    # Students billed (not bolsistas) and their months (matrícula .. evasão), worked out once
+    billed = [i for i in range(len(alunos)) if not alunos.flag('bolsista', i)]
+    windows = [alunos.window(cal, i) for i in billed]
+    ids = {i: alunos.id(i) for i in billed}
+    for m, mes in enumerate(cal.iso):
+        current = m == len(cal) - 1
+        for i, (lo, hi) in zip(billed, windows):
+            if not lo <= m < hi: continue
+
+            status_pg = pagamento_status(status[i] == inadimplente)
+            if current:
+                status_pg = 'Pendente'
+
+            row = {
+                'id': new_id(),
+                'aluno_id': ids[i],
+                'mes_referencia': mes,
+                'valor': 1500.00,
+                'status_pagamento': status_pg
+            }
+            if rollup is not None: add_mensalidade(rollup, alunos.value('unidade', i), row)
+            if features is not None: features.add_bill(i, mes, status_pg)
+            yield row
+
+# Same rows as generate_mensalidades for the numpy engine: the students × months
+# cross-join is masked by the billing windows and drawn one month at a time
+def generate_mensalidades_blocks(alunos, start=START_DATE, end=None, seed=SEED, rollup=None, features=None):
+    from datagen.vectorized import uuid_block
+    import numpy as np
+
+    cal = MonthCalendar(start, end or CURRENT_DATE)
+    rng = np.random.default_rng(derive_seed(seed, 'mensalidades'))
+    billed = np.flatnonzero(~alunos.flag_array('bolsista'))
+    if not len(billed) or not len(cal):
+        return
+    lo, hi = alunos.windows(cal)
+    active = cal.active_mask(lo[billed], hi[billed])
+    ids = np.array(alunos.ids(), dtype=object)[billed]
+    inadimplente = alunos.array('status_matricula')[billed] == alunos.code('status_matricula', 'Inadimplente')
+    unidades = alunos.categories['unidade']
+    unidade = alunos.array('unidade')[billed].astype(np.int64)
+    statuses = np.array(['Pago', 'Atrasado', 'Pendente'], dtype=object)
+
+    def decode(code):
+        m, u = divmod(code, len(unidades))
+        return (ESCOLA_ID, cal.iso[m], unidades[u])
+
+    for m, mes in enumerate(cal.iso):
+        student = np.flatnonzero(active[:, m])
+        n = len(student)
+        if not n:
+            continue
+        if m == len(cal) - 1: # Current month
+            status = np.full(n, 2)
+        else:
+            status = (inadimplente[student] & (rng.random(n) < 0.7)).astype(np.int64)
+        valor = np.full(n, 1500.00)
+        if rollup is not None:
+            rollup.add_codes(m * len(unidades) + unidade[student],
+                             [valor, valor * (status == 0), status == 1, status == 2, np.zeros(n)], decode)
+        if features is not None:
+            features.add_bills(billed[student], np.full(n, features.month_of(mes)), status)
+        yield {
+            'id': uuid_block(rng, n),
+            'aluno_id': ids[student],
+            'mes_referencia': [mes] * n,
+            'valor': valor,
+            'status_pagamento': statuses[status]
+        }
 
 # 3b. DESPESAS OMITTED in original but requested to ensure volume
 # Adding simple expense generation to ensure 2026 isn't empty on charts if they use expenses
-despesas = []
-print("Generating Despesas...")
-curr = START_DATE
-while curr <= CURRENT_DATE:
-    for _ in range(random.randint(10, 20)): # volume
-        despesas.append({
-             'id': str(uuid.uuid4()),
-             'categoria': random.choice(['Pessoal', 'Infraestrutura', 'Tecnologia', 'Marketing', 'Alimentação']),
-             'descricao': fake.sentence(nb_words=4),
-             'valor': round(random.uniform(100.0, 5000.0), 2),
-             'data_despesa': (curr + timedelta(days=random.randint(0, 27))).isoformat(),
-             'status': 'Pago'
-        })
-    
-    if curr.month == 12: curr = date(curr.year + 1, 1, 1)
-    else: curr = date(curr.year, curr.month + 1, 1)
+def generate_despesas(start=START_DATE, end=None):
+    words = load_pools().words
+    for curr in MonthCalendar(start, end or CURRENT_DATE):
+        for _ in range(random.randint(10, 20)): # volume
+            yield {
+                'id': new_id(),
+                'categoria': random.choice(['Pessoal', 'Infraestrutura', 'Tecnologia', 'Marketing', 'Alimentação']),
+                'descricao': sentence(words, nb_words=4),
+                'valor': round(random.uniform(100.0, 5000.0), 2),
+                'data_despesa': (curr + timedelta(days=random.randint(0, 27))).isoformat(),
+                'status': 'Pago'
+            }
 
 # 4. OPERACIONAL (Table: operacional_chamados)
-chamados = []
-print("Generating Chamados...")
-for _ in range(200):
-    dt_open = fake.date_between(start_date=START_DATE, end_date=CURRENT_DATE)
-    chamados.append({
-        'id': str(uuid.uuid4()),
+# A ticket opened at ``dt_open`` (a date or datetime): a third stay open, the SLA is 1-5 days
+def new_chamado(dt_open, words):
+    return {
+        'id': new_id(),
         'categoria': random.choice(['Manutenção', 'TI', 'Limpeza', 'Secretaria']),
-        'descricao': fake.sentence(),
+        'descricao': sentence(words),
         'prioridade': random.choice(['Baixa', 'Média', 'Alta']),
         'status': random.choice(['Resolvido', 'Resolvido', 'Aberto']),
         'data_abertura': dt_open.isoformat(),
         'data_resolucao': (dt_open + timedelta(days=random.randint(1, 5))).isoformat()
-    })
+    }
+
+def generate_chamados(total=200, start=START_DATE, end=None):
+    words = load_pools().words
+    for _ in range(total):
+        yield new_chamado(random_date(start, end or CURRENT_DATE), words)
 
 # 5. METRICAS MENSAIS (Table: metricas_mensais)
-metricas = []
-print("Generating Metricas (Per Unit)...")
-curr = START_DATE
-while curr <= CURRENT_DATE:
-    mes_str = curr.replace(day=1).isoformat()
-    
-    for unidade in UNIDADES:
-        # Base factor/modifiers per unit
-        factor = 1.0
-        if unidade == 'Sul': factor = 0.8
-        if unidade == 'Norte': factor = 0.6
-
-        # NPS & Health Score
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'nps', 'valor': random.randint(70, 95), 'unidade': 'score'})
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'health_score', 'valor': round(random.uniform(7.5, 9.8), 1), 'unidade': 'score'})
-        
-        # Resources
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'consumo_energia', 'valor': round(random.uniform(2000, 3000) * factor, 2), 'unidade': 'kwh'})
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'absenteismo_docentes', 'valor': round(random.uniform(1, 4), 1), 'unidade': '%'})
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'taxa_desperdicio', 'valor': round(random.uniform(2, 5), 1), 'unidade': '%'})
-        
-        # New Food metrics
-        refeicoes = int(random.uniform(2500, 4000) * factor)
-        custo_unit = round(random.uniform(12.50, 16.00), 2)
-        
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'refeicoes_servidas', 'valor': refeicoes, 'unidade': 'qtd'})
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'custo_refeicao', 'valor': custo_unit, 'unidade': 'BRL'})
-        
-        # Uptime TI (Global or Per unit, putting per unit for consistency)
-        metricas.append({'id': str(uuid.uuid4()), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'uptime_ti', 'valor': random.choice([99.9, 99.5, 100.0]), 'unidade': '%'})
-
-    if curr.month == 12: curr = date(curr.year + 1, 1, 1)
-    else: curr = date(curr.year, curr.month + 1, 1)
-
-
-# WRITING CSVs
-def write_csv(filename, data):
-    if not data: return
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-    print(f"Generated {filename} ({len(data)} rows)")
-
-write_csv('escolas.csv', escolas_cnt)
-write_csv('alunos.csv', alunos)
-write_csv('desempenho_academico.csv', desempenho)
-write_csv('financeiro_mensalidades.csv', mensalidades)
-write_csv('financeiro_despesas.csv', despesas)
-write_csv('operacional_chamados.csv', chamados)
-write_csv('metricas_mensais.csv', metricas)
+def generate_metricas(start=START_DATE, end=None):
+    cal = MonthCalendar(start, end or CURRENT_DATE)
+    for mes_str in cal.iso:
+
+        for unidade in UNIDADES:
+            # Base factor/modifiers per unit
+            factor = 1.0
+            if unidade == 'Sul': factor = 0.8
+            if unidade == 'Norte': factor = 0.6
+
+            # NPS & Health Score
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'nps', 'valor': random.randint(70, 95), 'unidade': 'score'}
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'health_score', 'valor': round(random.uniform(7.5, 9.8), 1), 'unidade': 'score'}
+
+            # Resources
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'consumo_energia', 'valor': round(random.uniform(2000, 3000) * factor, 2), 'unidade': 'kwh'}
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'absenteismo_docentes', 'valor': round(random.uniform(1, 4), 1), 'unidade': '%'}
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'taxa_desperdicio', 'valor': round(random.uniform(2, 5), 1), 'unidade': '%'}
+
+            # New Food metrics
+            refeicoes = int(random.uniform(2500, 4000) * factor)
+            custo_unit = round(random.uniform(12.50, 16.00), 2)
+
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'refeicoes_servidas', 'valor': refeicoes, 'unidade': 'qtd'}
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'custo_refeicao', 'valor': custo_unit, 'unidade': 'BRL'}
+
+            # Uptime TI (Global or Per unit, putting per unit for consistency)
+            yield {'id': new_id(), 'mes_referencia': mes_str, 'unidade_escolar': unidade, 'tipo_metrica': 'uptime_ti', 'valor': random.choice([99.9, 99.5, 100.0]), 'unidade': '%'}
+
+# 6. EVASÃO (incremental runs): active students that drop out in [start, end]
+def generate_evasoes(roster, start, end):
+    status = roster['status_matricula']
+    evadido = roster.code('status_matricula', 'Evadido')
+    for curr in MonthCalendar(start, end):
+        for i in range(len(roster)):
+            if status[i] == evadido: continue
+            if random.random() < EVASAO_MENSAL:
+                data_evasao = min(curr + timedelta(days=random.randint(0, 27)), end)
+                roster.set('status_matricula', i, 'Evadido')
+                roster.set('data_evasao', i, data_evasao)
+                yield {'id': roster.id(i), 'status_matricula': 'Evadido', 'data_evasao': data_evasao.isoformat()}
+
+# Students still billed, as kept in the state manifest: the active ones in
+# later months, and those who left during ``last_month`` (the month the run
+# ends in), whose bill for it is settled by the next --append
+def active_roster(alunos, last_month):
+    evadido = alunos.code('status_matricula', 'Evadido')
+    last_month = last_month.replace(day=1)
+    return [{'id': alunos.id(i), 'status_matricula': alunos.value('status_matricula', i),
+             'data_evasao': alunos.iso('data_evasao', i), 'bolsista': str(alunos.flag('bolsista', i)).lower(),
+             'unidade': alunos.value('unidade', i)}
+            for i in range(len(alunos))
+            if alunos['status_matricula'][i] != evadido or (alunos.date('data_evasao', i) or date.min) >= last_month]
+
+# 7. ROLLUPS: pre-aggregated tables for the dashboards, summed while the facts stream
+def new_rollups(names=None):
+    rollups = {
+        'rollup_desempenho': GroupSums(
+            ['escola_id', 'unidade', 'segmento', 'disciplina', 'ano_letivo', 'bimestre'],
+            ['soma_media_final', 'soma_presenca', 'aprovados']),
+        'rollup_financeiro_mensal': GroupSums(
+            ['escola_id', 'mes_referencia', 'unidade'],
+            ['receita_prevista', 'receita_paga', 'mensalidades_atrasadas', 'mensalidades_pendentes', 'evasoes']),
+        'rollup_mapa_alunos': tiles.new_tiles(['escola_id'], tiles.ALUNO_MEASURES),
+    }
+    rollups = {k: v for k, v in rollups.items() if names is None or k in names}
+    if names is None or 'aluno_risk_features' in names:
+        # Per-student facts rather than groups (see datagen.risk); needs numpy
+        from datagen.risk import RiskFacts
+        rollups['aluno_risk_features'] = RiskFacts(START_DATE)
+    return rollups
+
+def add_desempenho(rollup, unidade, segmento, row):
+    # Approved: same rule as the academic dashboard (nota >= 6 and presença >= 75%)
+    nota, presenca = row['media_final'], row['percentual_presenca']
+    rollup.add((ESCOLA_ID, unidade, segmento, row['disciplina'], row['ano_letivo'], row['bimestre']),
+               (nota, presenca, nota >= 6.0 and presenca >= 75))
+
+def add_mensalidade(rollup, unidade, row):
+    status, valor = row['status_pagamento'], row['valor']
+    rollup.add((ESCOLA_ID, row['mes_referencia'], unidade),
+               (valor, valor if status == 'Pago' else 0, status == 'Atrasado', status == 'Pendente', 0))
+
+def add_grade(features, i, row):
+    features.add_grade(i, row['ano_letivo'], row['bimestre'], row['media_final'], row['percentual_presenca'],
+                       row['taxa_entrega_atividades'])
+
+def add_metricas(features, rows):
+    # Pass the metricas through, keeping each unit's latest NPS and health score
+    for row in rows:
+        features.add_metrica(row['unidade_escolar'], row['mes_referencia'], row['tipo_metrica'], row['valor'])
+        yield row
+
+def add_evasoes(rollup, alunos, rows=None):
+    # Evasões are not mensalidades: they add to the month's counter only
+    for i in range(len(alunos)) if rows is None else rows:
+        evasao = alunos.date('data_evasao', i)
+        if evasao:
+            rollup.add((ESCOLA_ID, evasao.replace(day=1).isoformat(), alunos.value('unidade', i)), (0, 0, 0, 0, 1),
+                       count=0)
+
+def add_mapa(rollup, alunos):
+    # Students per map tile at each zoom (see datagen.tiles)
+    ativo, evadido, inadimplente = (alunos.code('status_matricula', s) for s in STATUS)
+    status, lat, lon = alunos['status_matricula'], alunos['latitude'], alunos['longitude']
+    for i in range(len(alunos)):
+        if lat[i] != lat[i] or lon[i] != lon[i]: continue # no coordinates (NaN)
+        tiles.add_point(rollup, (ESCOLA_ID,), lat[i], lon[i],
+                        (status[i] == ativo, status[i] == evadido, status[i] == inadimplente,
+                         alunos.flag('bolsista', i)))
+
+def rollup_desempenho_rows(rollup):
+    for row in rollup.rows():
+        n = row['registros']
+        row['media_final'] = round(row['soma_media_final'] / n, 2) if n else 0
+        row['percentual_presenca'] = round(row['soma_presenca'] / n, 2) if n else 0
+        row['soma_media_final'] = round(row['soma_media_final'], 2)
+        row['soma_presenca'] = round(row['soma_presenca'], 2)
+        row['aprovados'] = int(row['aprovados'])
+        yield {k: row[k] for k in SCHEMAS['rollup_desempenho']}
+
+def rollup_financeiro_rows(rollup):
+    for row in rollup.rows():
+        n = row['mensalidades'] = row['registros']
+        for k in ('mensalidades_atrasadas', 'mensalidades_pendentes', 'evasoes'):
+            row[k] = int(row[k])
+        row['receita_prevista'] = round(row['receita_prevista'], 2)
+        row['receita_paga'] = round(row['receita_paga'], 2)
+        row['taxa_inadimplencia'] = round(100 * row['mensalidades_atrasadas'] / n, 2) if n else 0
+        yield {k: row[k] for k in SCHEMAS['rollup_financeiro_mensal']}
+
+def rollup_mapa_rows(rollup):
+    for row in tiles.tile_rows(rollup, 'alunos'):
+        yield {k: row[k] for k in SCHEMAS['rollup_mapa_alunos']}
+
+def write_rollups(sink, rollups):
+    if not rollups:
+        return
+    print("Generating Rollups...")
+    for name, rows in (('rollup_desempenho', rollup_desempenho_rows),
+                       ('rollup_financeiro_mensal', rollup_financeiro_rows),
+                       ('rollup_mapa_alunos', rollup_mapa_rows)):
+        if name in rollups:
+            sink.write_rows(name, rows(rollups[name]))
+    if 'aluno_risk_features' in rollups:
+        sink.write_blocks('aluno_risk_features', rollups['aluno_risk_features'].blocks())
+
+# Table ``name`` from its own streams. Written when selected (--tables); a
+# table only needed by others (e.g. for a rollup) is drawn but not written.
+def write_table(sink, args, name, rows, seed=SEED, blocks=False):
+    rows = table_rows(name, rows, seed)
+    if name not in args.tables:
+        for _ in rows: pass
+        return None
+    if blocks:
+        return sink.write_blocks(name, rows)
+    return sink.write_rows(name, rows)
+
+
+# Per-student tables of one shard. File output goes to part files under
+# out_dir/_shards (merged by the parent); with --load each shard copies
+# straight into Postgres over its own connections. Run in the parent
+# (--workers 0 or 1), the writes are stages of its ``manifest``.
+def generate_shard(shard):
+    (index, start, count), args, manifest = shard
+    seed = derive_seed(SEED, 'shard', index)
+    if args.load:
+        sink = open_sink(load=args.load, load_format=args.load_format)
+    else:
+        sink = open_sink(shard_dir(args.out_dir, index), args.chunk_size, fmt=args.format, schemas=SCHEMAS, quiet=True,
+                         compression=args.compress, partitions=args.partition and PARTITIONS, tenant=ESCOLA_ID)
+    if manifest is not None:
+        sink = manifest.wrap(sink, shard=index)
+
+    alunos = new_students()
+    rows = {'alunos': write_table(sink, args, 'alunos', alunos.collect(generate_alunos(count)), seed)}
+    rollups = new_rollups(args.build)
+    features = rollups.get('aluno_risk_features')
+    if features is not None:
+        features.add_dimension(alunos, ESCOLA_ID)
+    if 'desempenho_academico' in args.build:
+        if args.engine == 'numpy':
+            blocks = generate_desempenho_blocks(alunos, seed=derive_seed(SEED, 'shard', index, 'desempenho'),
+                                                rollup=rollups.get('rollup_desempenho'), features=features)
+            rows['desempenho_academico'] = write_table(sink, args, 'desempenho_academico', blocks, seed, blocks=True)
+        else:
+            rows['desempenho_academico'] = write_table(
+                sink, args, 'desempenho_academico',
+                generate_desempenho(alunos, rollup=rollups.get('rollup_desempenho'), features=features), seed)
+    if 'financeiro_mensalidades' in args.build:
+        if args.engine == 'numpy':
+            blocks = generate_mensalidades_blocks(alunos, seed=seed, rollup=rollups.get('rollup_financeiro_mensal'),
+                                                  features=features)
+            rows['financeiro_mensalidades'] = write_table(sink, args, 'financeiro_mensalidades', blocks, seed,
+                                                          blocks=True)
+        else:
+            rows['financeiro_mensalidades'] = write_table(
+                sink, args, 'financeiro_mensalidades',
+                generate_mensalidades(alunos, rollup=rollups.get('rollup_financeiro_mensal'), features=features), seed)
+    if 'rollup_financeiro_mensal' in rollups:
+        add_evasoes(rollups['rollup_financeiro_mensal'], alunos)
+    if 'rollup_mapa_alunos' in rollups:
+        add_mapa(rollups['rollup_mapa_alunos'], alunos)
+    sink.close()
+    rows = {name: n for name, n in rows.items() if n is not None}
+    if args.load:
+        return {name: (None, n) for name, n in rows.items()}, active_roster(alunos, CURRENT_DATE), rollups
+    return {name: (sink.path(name), n) for name, n in rows.items()}, active_roster(alunos, CURRENT_DATE), rollups
+
+
+# The students are always drawn shard by shard (see draw_alunos), in this
+# process or on a pool: the output is the same for any --workers
+def main_sharded(args, sink, manifest):
+    shards = shard_ranges(TOTAL_ALUNOS, SHARD_SIZE)
+    inline = args.workers <= 1
+    print(f"Generating {TOTAL_ALUNOS} alunos in {len(shards)} shards"
+          f"{'' if inline else f' ({args.workers} workers)'}...")
+    load_pools()  # build the pool cache once, before the workers need it
+    with manifest.stage('shards') as stage:
+        results, rosters, partials = zip(*run_shards(generate_shard, [(s, args, manifest if inline else None)
+                                                                      for s in shards], args.workers, stage=stage))
+        stage['rows'] = sum(n for r in results for _, n in r.values())
+    for name in ('alunos', 'desempenho_academico', 'financeiro_mensalidades'):
+        if name not in args.tables:
+            continue
+        if args.load:
+            print(f"Loaded {name} ({sum(r[name][1] for r in results)} rows)")
+        else:
+            sink.merge(name, [r[name] for r in results])
+    cleanup_shards(args.out_dir)
+
+    rollups = new_rollups(args.build)
+    for partial in partials:
+        for name, rollup in partial.items():
+            rollups[name].update(rollup)
+    # School-wide tables are small: generated in this process
+    generate_school_tables(sink, args, rollups.get('aluno_risk_features'))
+    write_rollups(sink, rollups)
+    return [a for roster in rosters for a in roster]
+
+
+def generate_school_tables(sink, args, features=None):
+    if 'financeiro_despesas' in args.tables:
+        print("Generating Despesas...")
+        write_table(sink, args, 'financeiro_despesas', generate_despesas())
+    if 'operacional_chamados' in args.tables:
+        print("Generating Chamados...")
+        write_table(sink, args, 'operacional_chamados', generate_chamados())
+    if 'metricas_mensais' in args.build:
+        print("Generating Metricas (Per Unit)...")
+        rows = generate_metricas()
+        write_table(sink, args, 'metricas_mensais', rows if features is None else add_metricas(features, rows))
+
+
+def generate_all(args, sink, manifest):
+    if 'escolas' in args.tables:
+        sink.write_rows('escolas', escolas_cnt)
+    if 'alunos' not in args.build:
+        # Only school-wide tables selected: no students to draw
+        generate_school_tables(sink, args)
+        return []
+    return main_sharded(args, sink, manifest)
+
+
+# The bills of the month a run ends in are left Pendente: --append settles
+# them (as generate_mensalidades does for past months) when it moves on, and
+# recomputes that month's rollup_financeiro_mensal rows (evasões unchanged)
+def settle_bills(roster, month, sink, seed):
+    cal = MonthCalendar(month, month)
+    mes = cal.iso[0]
+    status = roster['status_matricula']
+    inadimplente = roster.code('status_matricula', 'Inadimplente')
+    rollup = new_rollups(['rollup_financeiro_mensal'])['rollup_financeiro_mensal']
+
+    def bills():
+        for i in range(len(roster)):
+            lo, hi = roster.window(cal, i)
+            if roster.flag('bolsista', i) or not lo <= 0 < hi: continue
+            row = {'aluno_id': roster.id(i), 'mes_referencia': mes, 'valor': 1500.00,
+                   'status_pagamento': pagamento_status(status[i] == inadimplente)}
+            add_mensalidade(rollup, roster.value('unidade', i), row)
+            yield row
+    print(f"Settling the mensalidades of {mes[:7]}...")
+    updates = [{k: row[k] for k in ('aluno_id', 'mes_referencia', 'status_pagamento')}
+               for row in table_rows('financeiro_mensalidades', bills(), derive_seed(seed, 'settle'))]
+    sink.update_rows('financeiro_mensalidades', ('aluno_id', 'mes_referencia'), updates)
+    sink.update_rows('rollup_financeiro_mensal', ('escola_id', 'mes_referencia', 'unidade'),
+                     [{k: v for k, v in row.items() if k != 'evasoes'} for row in rollup_financeiro_rows(rollup)])
+
+
+# --append: only the months after the last run. Each table draws from streams
+# derived from the run's seed, its name and the first new month.
+def generate_increment(state, until, sink):
+    start = next_month(date.fromisoformat(state['last_month']))
+    if start > until:
+        print(f"Nothing to generate: already up to {state['last_month'][:7]}")
+        return state['roster']
+    months = len(MonthCalendar(start, until))
+    print(f"Generating {start:%Y-%m} .. {until:%Y-%m} ({months} months)...")
+    seed = derive_seed(state['seed'], 'append', start.isoformat())
+
+    roster = new_students(state['roster'])
+    settle_bills(roster, date.fromisoformat(state['last_month']), sink, seed)
+    # Only the new months' rows: rollup_desempenho covers the whole school year and is not appended;
+    # rollup_mapa_alunos is rebuilt from alunos.csv with build_map_tiles.py and aluno_risk_features
+    # afterwards by refresh_risk_features
+    rollups = new_rollups(['rollup_financeiro_mensal'])
+    print("Generating Evasões...")
+    evasoes = list(table_rows('alunos', generate_evasoes(roster, start, until), seed))
+    sink.update_rows('alunos', 'id', evasoes)
+    print("Generating Mensalidades...")
+    sink.write_rows('financeiro_mensalidades', table_rows(
+        'financeiro_mensalidades',
+        generate_mensalidades(roster, start, until, rollup=rollups['rollup_financeiro_mensal']), seed))
+    print("Generating Despesas...")
+    sink.write_rows('financeiro_despesas', table_rows('financeiro_despesas', generate_despesas(start, until), seed))
+    print("Generating Chamados...")
+    sink.write_rows('operacional_chamados', table_rows(
+        'operacional_chamados', generate_chamados(CHAMADOS_POR_MES * months, start, until), seed))
+    print("Generating Metricas (Per Unit)...")
+    sink.write_rows('metricas_mensais', table_rows('metricas_mensais', generate_metricas(start, until), seed))
+    add_evasoes(rollups['rollup_financeiro_mensal'], roster, [roster.index(e['id']) for e in evasoes])
+    write_rollups(sink, rollups)
+    return active_roster(roster, until)
+
+
+def refresh_risk_features(sink, args, manifest):
+    """Recompute aluno_risk_features after an --append from the facts written so far.
+
+    The new months' bills and metricas change every student's features
+    (the late-bill run, the unit's NPS), so all of them are recomputed:
+    replaced in place in the CSV (or its partitions) or upserted in the
+    database.
+    """
+    name = 'aluno_risk_features'
+    if not (name in sink.columns if args.load else os.path.exists(sink.path(name))):
+        return
+    if importlib.util.find_spec('numpy') is None:
+        print(f"{name} was not updated (numpy is not installed): run build_risk_features.py")
+        return
+    from datagen.risk import collect, csv_rows, db_rows
+
+    print("Generating Risk Features...")
+    # The appended rows are read back: wait for the background COPYs
+    sink.close()
+    with manifest.stage(name):
+        sources = db_rows(args.load, None) if args.load else csv_rows(args.out_dir, args.compress)
+        facts = collect(sources, START_DATE)
+        if args.load:
+            sink.upsert_rows(name, 'aluno_id', block_rows(facts.blocks()))
+        else:
+            sink.update_rows(name, 'aluno_id', list(block_rows(facts.blocks())))
+
+
+# Renumber the ``id`` column of ``name`` with time-ordered ids, in the order the rows are written
+def time_ordered_ids(name):
+    ids = TimeOrderedIds(random.Random(derive_seed(SEED, name, 'ids')))
+    columns, when = ID_TIME[name]
+
+    def transform(header):
+        i, at = header.index('id'), [header.index(c) for c in columns]
+        times = {}
+
+        def apply(row):
+            values = tuple(row[j] for j in at)
+            t = times.get(values)
+            if t is None:
+                t = times[values] = when(*values)
+            row[i] = ids(t)
+            return row
+        return apply
+    return transform
+
+
+# --cluster: sort the finished files of the tables written in this run
+def cluster_tables(sink, args, manifest):
+    for name in (n for n in TABLES if n in args.tables and n in args.cluster):
+        key = args.cluster[name]
+        with manifest.stage(f'cluster:{name}') as stage:
+            stats = extsort.sort_csv(sink.path(name), key, SCHEMAS[name], transform=time_ordered_ids(name),
+                                     memory_mb=args.cluster_mb)
+            stage['rows'] = stats['rows']
+        passes = f", {stats['passes']} merge passes" if stats['passes'] > 1 else ''
+        print(f"Clustered {name} by {', '.join(key)} ({stats['rows']} rows, {stats['runs']} runs{passes})")
+
+
+def parse_cluster_keys(values):
+    """``CLUSTER`` with the --cluster-key overrides (``tabela=col,col``) applied."""
+    keys = dict(CLUSTER)
+    for value in values or ():
+        name, _, columns = value.partition('=')
+        name = name.strip()
+        columns = [c.strip() for c in columns.split(',') if c.strip()]
+        if name not in CLUSTER:
+            raise ValueError(f"--cluster-key: {name or value} não é uma tabela de fatos ({', '.join(CLUSTER)})")
+        unknown = [c for c in columns if c not in SCHEMAS[name]]
+        if not columns or unknown:
+            raise ValueError(f"--cluster-key: colunas inválidas para {name}: {', '.join(unknown) or value} "
+                             f"(colunas: {', '.join(SCHEMAS[name])})")
+        keys[name] = columns
+    return keys
+
+
+# Cache keys (see datagen.cache): what each table's file depends on besides
+# the code and the tables it is built from
+def cache_config(args, name):
+    config = {
+        'seed': SEED, 'format': args.format, 'compress': args.compress, 'chunk_size': args.chunk_size,
+        'escola_id': ESCOLA_ID, 'unidades': UNIDADES, 'segmentos': SEGMENTOS, 'turmas': TURMAS,
+        'disciplinas': DISCIPLINAS, 'coords': COORDS, 'start_date': START_DATE, 'end_date': END_DATE,
+        'current_date': CURRENT_DATE, 'evasao_mensal': EVASAO_MENSAL, 'chamados_por_mes': CHAMADOS_POR_MES,
+    }
+    if name == 'alunos':
+        # Drawn shard by shard whatever --workers is (SHARD_SIZE is code, hashed with it)
+        config['alunos'] = TOTAL_ALUNOS
+    if name in ('desempenho_academico', 'financeiro_mensalidades'):
+        config['engine'] = args.engine
+    if name in args.cluster:
+        config['cluster'] = args.cluster[name]
+    return config
+
+
+def cache_keys(args):
+    # The state of a full run (the roster) is cached with alunos, for runs that reuse every student table
+    names = TABLES + [STATE_FILE]
+    code = table_cache.source_hash(os.path.abspath(__file__), os.path.dirname(os.path.abspath(table_cache.__file__)))
+    return table_cache.table_keys(names, dict(DEPENDS, **{STATE_FILE: ['alunos']}),
+                                  {name: cache_config(args, name) for name in names}, code)
+
+
+def output_files(sink, name):
+    path = sink.path(name)
+    return [path, path + INDEX_SUFFIX]
+
+
+# Reuse the cached files of the selected tables; return the tables restored
+def restore_cached(cache, keys, args, state_path):
+    restored = {name for name in args.tables if cache.restore(keys[name], args.out_dir)}
+    full = args.tables == set(TABLES)
+    if full and not with_dependencies(args.tables - restored, DEPENDS) & {'alunos'}:
+        # No student table left to generate: the roster of the state comes from the cache too
+        placed = cache.restore(keys[STATE_FILE], os.path.dirname(state_path) or '.')
+        if placed:
+            if placed[0] != state_path:
+                os.replace(placed[0], state_path)
+        else:
+            restored.discard('alunos')
+    for name in (n for n in TABLES if n in restored):
+        print(f"Reused {name} from the cache")
+    return restored
+
+
+def store_cached(cache, keys, sink, tables, state_path, keep):
+    for name in tables:
+        cache.store(keys[name], name, output_files(sink, name))
+    if 'alunos' in tables and os.path.exists(state_path):
+        cache.store(keys[STATE_FILE], STATE_FILE, [state_path])
+    dropped = cache.evict(keep=keep)
+    if dropped:
+        print(f"Evicted {len(dropped)} cache entries (limit {cache.max_bytes // 2**20} MB)")
+
+
+def main():
+    global TOTAL_ALUNOS
+    parser = argparse.ArgumentParser(description='Gera os CSVs do schema do app (supabase_schema.sql).')
+    parser.add_argument('--out-dir', default='.', help='Diretório de saída dos CSVs')
+    parser.add_argument('--alunos', type=int, default=TOTAL_ALUNOS, help=f'Número de alunos (padrão: {TOTAL_ALUNOS})')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por lote de escrita')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='numpy gera desempenho_academico e financeiro_mensalidades em blocos vetorizados (requer numpy)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help=f'Gera os shards de {SHARD_SIZE} alunos num pool de N processos; 0 = neste processo '
+                             f'(resultado igual para qualquer N)')
+    parser.add_argument('--load', metavar='POSTGRES_URL',
+                        help='Carrega as tabelas direto no Postgres via COPY em vez de gerar CSVs')
+    parser.add_argument('--load-format', choices=['text', 'binary'], default='text', help='Formato do COPY (com --load)')
+    parser.add_argument('--truncate-cascade', action='store_true',
+                        help='Com --load, esvazia também as tabelas que referenciam as carregadas '
+                             '(ex.: --tables alunos esvazia desempenho_academico), mesmo que não sejam recarregadas')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Formato dos arquivos: colunas tipadas conforme supabase_schema.sql em parquet/arrow (requer pyarrow)')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                        help='Comprime cada CSV em frames independentes (.csv.gz/.csv.zst) enquanto gera; zstd requer zstandard')
+    parser.add_argument('--partition', action='store_true',
+                        help='Grava cada tabela particionada em <tabela>/escola_id=.../ano=.../ (layout Hive), '
+                             'com contagens e min/max por partição em _partitions.json')
+    parser.add_argument('--tables', metavar='TABELAS',
+                        help='Só estas tabelas, separadas por vírgula (ex.: metricas,chamados), com as mesmas linhas '
+                             'de uma execução completa; as tabelas de que dependem (ex.: alunos) são geradas sem gravar')
+    parser.add_argument('--append', action='store_true',
+                        help='Incremental: gera só os meses novos desde a última execução e acrescenta aos CSVs/ao banco')
+    parser.add_argument('--current-date', type=date.fromisoformat,
+                        help='Data de referência do --append, AAAA-MM-DD (padrão: hoje)')
+    parser.add_argument('--state', help=f'Manifesto do modo incremental (padrão: <out-dir>/{STATE_FILE})')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help='Perfila cada etapa em <out-dir>/profiles (pyinstrument precisa estar instalado)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Gera todas as tabelas sem reaproveitar nem guardar arquivos no cache de tabelas')
+    parser.add_argument('--cache-dir', help='Diretório do cache de tabelas (padrão: $DATAGEN_CACHE_DIR/tables)')
+    parser.add_argument('--cache-max-mb', type=float, default=table_cache.MAX_MB,
+                        help=f'Tamanho máximo do cache; as entradas usadas há mais tempo saem primeiro '
+                             f'(padrão: {table_cache.MAX_MB})')
+    parser.add_argument('--cluster', action='store_true',
+                        help='Ordena cada tabela de fatos pela chave de clusterização (ordenação externa, memória '
+                             'limitada) e troca os ids por UUIDv7 em ordem de tempo, para índices BRIN')
+    parser.add_argument('--cluster-key', action='append', metavar='TABELA=COLUNAS',
+                        help='Chave de uma tabela (ex.: financeiro_mensalidades=aluno_id,mes_referencia); '
+                             'pode repetir e implica --cluster')
+    parser.add_argument('--cluster-mb', type=float, default=extsort.MEMORY_MB,
+                        help=f'Memória da ordenação do --cluster, em MB (padrão: {extsort.MEMORY_MB})')
+    args = parser.parse_args()
+    TOTAL_ALUNOS = args.alunos
+    if args.compress and (args.format != 'csv' or args.load):
+        parser.error('--compress só se aplica aos CSVs (parquet/arrow já saem comprimidos em zstd)')
+    if args.partition and args.load:
+        parser.error('--partition organiza os arquivos de saída: não combina com --load')
+    if args.append and (args.format != 'csv' or args.workers):
+        parser.error('--append só funciona com --format csv (ou --load) e sem --workers')
+    if args.tables and args.append:
+        parser.error('--tables gera tabelas de uma execução completa: não combina com --append')
+    if (args.cluster or args.cluster_key) and (args.load or args.format != 'csv' or args.partition or args.append):
+        parser.error('--cluster ordena os CSVs de uma execução completa: não combina com --load, --format '
+                     'parquet/arrow, --partition nem --append (para o banco, carregue os CSVs com load_data.py)')
+    try:
+        args.cluster = parse_cluster_keys(args.cluster_key) if args.cluster or args.cluster_key else {}
+        selected = parse_tables(args.tables, TABLES) if args.tables else TABLES
+    except ValueError as e:
+        parser.error(str(e))
+    args.tables = set(selected)
+    if 'aluno_risk_features' in args.tables and importlib.util.find_spec('numpy') is None:
+        if args.tables != set(TABLES):
+            parser.error('aluno_risk_features requer numpy')
+        print("Skipping aluno_risk_features: numpy is not installed")
+        args.tables.discard('aluno_risk_features')
+    args.build = with_dependencies(args.tables, DEPENDS)
+    state_path = args.state or os.path.join(args.out_dir, STATE_FILE)
+    state = load_state(state_path) if args.append else None
+    if args.append and state is None:
+        parser.error(f'--append precisa do manifesto de uma execução completa: {state_path} não existe')
+
+    # Files only: the cache holds whole table files, which appends and partitions do not produce
+    cache = None
+    if not (args.no_cache or args.append or args.load or args.partition):
+        cache = table_cache.TableCache(args.cache_dir, args.cache_max_mb)
+        keys = cache_keys(args)
+        cached = restore_cached(cache, keys, args, state_path)
+        args.tables -= cached
+        args.build = with_dependencies(args.tables, DEPENDS)
+
+    manifest = RunManifest(args.out_dir, profile=args.profile)
+    sink = manifest.wrap(open_sink(args.out_dir, args.chunk_size, args.load, args.load_format, fmt=args.format,
+                                   schemas=SCHEMAS, append=args.append, compression=args.compress,
+                                   partitions=args.partition and PARTITIONS, tenant=ESCOLA_ID,
+                                   cascade=args.truncate_cascade))
+    if not args.load and not args.partition:
+        # Files restored from the cache share their inode with it: never write through them
+        for name in TABLES if args.append else args.tables:
+            for path in output_files(sink, name):
+                (table_cache.unshare if args.append else table_cache.release)(path)
+    try:
+        if args.append:
+            until = args.current_date or date.today()
+            roster = generate_increment(state, until, sink)
+            refresh_risk_features(sink, args, manifest)
+        else:
+            until = CURRENT_DATE
+            if args.tables:
+                sink.prepare([name for name in selected if name in args.tables])
+                roster = generate_all(args, sink, manifest)
+                if args.cluster:
+                    cluster_tables(sink, args, manifest)
+    finally:
+        sink.finish()
+        manifest.save(seed=SEED, alunos=TOTAL_ALUNOS, tables=selected,
+                      **({'cached': [n for n in selected if n not in args.tables]} if cache else {}))
+    if selected == TABLES and 'alunos' in args.build:
+        # The state describes a full run, which --append continues (restored with alunos when it was cached)
+        last_month = max(until.replace(day=1).isoformat(), state['last_month']) if state else until.replace(day=1).isoformat()
+        save_state(state_path, {
+            'seed': SEED,
+            'last_month': last_month,
+            'roster': roster,
+        })
+    if cache:
+        store_cached(cache, keys, sink, args.tables, state_path, keep=set(keys.values()))
+
+
+if __name__ == '__main__':
+    main()
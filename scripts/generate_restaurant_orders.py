@@ -0,0 +1,402 @@
+"""Generate restaurant orders for the restaurant dashboards (restaurante_schema.sql).
+
+    python generate_restaurant_orders.py --pedidos 20000000 --workers 8 --compress zstd --out-dir out_pedidos/
+    python generate_restaurant_orders.py --restaurantes amostra_restaurants.csv --load postgresql://...
+
+Writes the orders (amostra_pedidos), their lines (amostra_pedido_itens), the
+stores they belong to (amostra_lojas) and daily rollups for the faturamento,
+pagamentos, cardápio/CMV, cancelamentos, horários and NPS pages. Orders are
+drawn a day at a time by the numpy engine of ``datagen.orders`` (requires
+numpy), with weekday, month and time-of-day seasonality.
+``--restaurantes`` takes the stores from an export of amostra_restaurants
+(``\\copy amostra_restaurants TO ... CSV HEADER``) instead of a synthetic chain.
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+from datagen import orders
+from datagen.instrument import RunManifest
+from datagen.pools import load_pools
+from datagen.rng import derive_seed, uuid_from
+from datagen.rollups import GroupSums
+from datagen.sharding import cleanup_shards, run_shards, shard_dir, shard_ranges
+from datagen.writers import CsvSource, open_sink, CHUNK_SIZE
+
+SEED = 42
+
+TOTAL_PEDIDOS = 100000
+LOJAS = 20
+INICIO = date(2025, 4, 1)
+FIM = date(2026, 3, 31)
+# Days per shard (with --workers)
+SHARD_DAYS = 7
+
+# Output tables, parents first
+TABLES = ['amostra_lojas', 'amostra_pedidos', 'amostra_pedido_itens',
+          'amostra_pedidos_diario', 'amostra_pagamentos_diario', 'amostra_cardapio_diario',
+          'amostra_cancelamentos_diario', 'amostra_pedidos_hora', 'amostra_nps_diario']
+
+# Column types for --format parquet/arrow, following restaurante_schema.sql
+_DIA_LOJA = {'dia': 'date', 'merchant_id': 'dict'}
+SCHEMAS = {
+    'amostra_lojas': {'merchant_id': 'text', 'nome': 'text', 'peso': 'numeric(8,6)'},
+    'amostra_pedidos': {
+        'id': 'uuid', 'merchant_id': 'dict', 'criado_em': 'timestamptz', 'canal': 'dict',
+        'forma_pagamento': 'dict', 'status': 'dict', 'itens': 'integer', 'valor_itens': 'numeric(10,2)',
+        'desconto': 'numeric(10,2)', 'taxa_entrega': 'numeric(10,2)', 'valor_total': 'numeric(10,2)',
+        'taxa_plataforma': 'numeric(10,2)', 'tempo_preparo_min': 'integer', 'tempo_entrega_min': 'integer',
+        'motivo_cancelamento': 'dict', 'nota_nps': 'integer', 'avaliacao': 'integer'
+    },
+    'amostra_pedido_itens': {
+        'id': 'uuid', 'pedido_id': 'uuid', 'item_nome': 'dict', 'categoria': 'dict', 'quantidade': 'integer',
+        'preco_unitario': 'numeric(10,2)', 'custo_unitario': 'numeric(10,2)'
+    },
+    'amostra_pedidos_diario': {
+        **_DIA_LOJA, 'canal': 'dict', 'pedidos': 'integer', 'cancelados': 'integer',
+        'faturamento_bruto': 'numeric(14,2)', 'faturamento_liquido': 'numeric(14,2)', 'itens': 'integer',
+        'ticket_medio': 'numeric(10,2)', 'tempo_preparo_medio': 'numeric(6,2)', 'tempo_entrega_medio': 'numeric(6,2)',
+        'soma_tempo_preparo': 'bigint', 'soma_tempo_entrega': 'bigint', 'entregas': 'integer'
+    },
+    'amostra_pagamentos_diario': {**_DIA_LOJA, 'forma_pagamento': 'dict', 'pedidos': 'integer',
+                                  'valor': 'numeric(14,2)'},
+    'amostra_cardapio_diario': {
+        **_DIA_LOJA, 'item_nome': 'dict', 'categoria': 'dict', 'quantidade': 'integer', 'receita': 'numeric(14,2)',
+        'custo': 'numeric(14,2)', 'cmv': 'numeric(5,2)'
+    },
+    'amostra_cancelamentos_diario': {**_DIA_LOJA, 'canal': 'dict', 'motivo': 'dict', 'pedidos': 'integer',
+                                     'valor_perdido': 'numeric(14,2)'},
+    'amostra_pedidos_hora': {'dia': 'date', 'hora': 'integer', 'canal': 'dict', 'pedidos': 'integer',
+                             'faturamento': 'numeric(14,2)'},
+    'amostra_nps_diario': {
+        **_DIA_LOJA, 'respostas': 'integer', 'promotores': 'integer', 'neutros': 'integer', 'detratores': 'integer',
+        'nps': 'numeric(6,2)', 'avaliacao_media': 'numeric(3,2)', 'soma_avaliacao': 'integer'
+    },
+}
+
+
+# 1. LOJAS: a synthetic chain, or the stores of an amostra_restaurants export
+def generate_lojas(total=LOJAS, csv=None):
+    if csv:
+        rows = [r for r in CsvSource(csv) if r.get('merchant_id')]
+        # Busier stores have more ratings
+        return [{'merchant_id': r['merchant_id'], 'nome': r.get('name', ''),
+                 'peso': 1 + float(r.get('user_rating_count') or 0)} for r in rows]
+    rng = random.Random(derive_seed(SEED, 'amostra_lojas'))
+    bairros = load_pools().bairros
+    return [{'merchant_id': uuid_from(rng), 'nome': f'Unidade {i + 1:03d} - {rng.choice(bairros)}',
+             'peso': rng.lognormvariate(0, 0.5)} for i in range(total)]
+
+
+def loja_rows(lojas):
+    total = sum(loja['peso'] for loja in lojas)
+    for loja in lojas:
+        yield dict(loja, peso=round(loja['peso'] / total, 6))
+
+
+def new_engine(lojas):
+    return orders.OrderEngine([loja['merchant_id'] for loja in lojas], [loja['peso'] for loja in lojas], SEED)
+
+
+# 2. PEDIDOS (Table: amostra_pedidos), a block per day
+def generate_pedidos(engine, days, rollups=None):
+    import numpy as np
+
+    money = orders.Money()
+    canais = np.array(orders.CANAIS, dtype=object)
+    pagamentos = np.array(orders.PAGAMENTOS, dtype=object)
+    motivos = np.array(orders.MOTIVOS, dtype=object)
+    status = np.array(['Concluído', 'Cancelado'], dtype=object)
+    for day, n in days:
+        if not n:
+            continue
+        d = engine.day(day, n)
+        if rollups is not None:
+            add_rollups(rollups, engine, d)
+        cancelado, entregue, responde = d['pedido_cancelado'], d['pedido_entregue'], d['pedido_responde']
+        criado_em = np.datetime64(day) + d['pedido_segundo'].astype('timedelta64[s]')
+        motivo = np.full(n, '', dtype=object)
+        motivo[cancelado] = motivos[d['pedido_motivo'][cancelado]]
+        yield {
+            'id': d['pedido_id'],
+            'merchant_id': engine.lojas[d['pedido_loja']],
+            'criado_em': np.datetime_as_string(criado_em, unit='s').astype(object),
+            'canal': canais[d['pedido_canal']],
+            'forma_pagamento': pagamentos[d['pedido_pagamento']],
+            'status': status[cancelado.astype(np.int64)],
+            'itens': d['pedido_itens'],
+            'valor_itens': money(d['pedido_valor_itens']),
+            'desconto': money(d['pedido_desconto']),
+            'taxa_entrega': money(d['pedido_taxa_entrega']),
+            'valor_total': money(d['pedido_valor_total']),
+            'taxa_plataforma': money(d['pedido_taxa_plataforma']),
+            'tempo_preparo_min': d['pedido_preparo'],
+            'tempo_entrega_min': orders.optional(d['pedido_entrega'], entregue & ~cancelado),
+            'motivo_cancelamento': motivo,
+            'nota_nps': orders.optional(d['pedido_nps'], responde),
+            'avaliacao': orders.optional(d['pedido_estrelas'], responde),
+        }
+
+
+# 3. ITENS (Table: amostra_pedido_itens): the same days drawn again, for their lines
+def generate_itens(engine, days):
+    import numpy as np
+
+    money = orders.Money()
+    nomes = np.array([c[0] for c in orders.CARDAPIO], dtype=object)
+    categorias = np.array([c[1] for c in orders.CARDAPIO], dtype=object)
+    precos, custos = money(engine.preco), money(engine.custo)
+    for day, n in days:
+        if not n:
+            continue
+        d = engine.day(day, n)
+        item = d['linha_item']
+        yield {
+            'id': d['linha_id'],
+            'pedido_id': d['pedido_id'][d['linha_pedido']],
+            'item_nome': nomes[item],
+            'categoria': categorias[item],
+            'quantidade': d['linha_quantidade'],
+            'preco_unitario': precos[item],
+            'custo_unitario': custos[item],
+        }
+
+
+# 4. ROLLUPS: daily aggregates per page, summed while the orders stream
+def new_rollups():
+    return {
+        'amostra_pedidos_diario': GroupSums(
+            ['dia', 'merchant_id', 'canal'],
+            ['cancelados', 'faturamento_bruto', 'faturamento_liquido', 'itens', 'soma_tempo_preparo',
+             'soma_tempo_entrega', 'entregas']),
+        'amostra_pagamentos_diario': GroupSums(['dia', 'merchant_id', 'forma_pagamento'], ['valor']),
+        'amostra_cardapio_diario': GroupSums(['dia', 'merchant_id', 'item_nome', 'categoria'],
+                                             ['quantidade', 'receita', 'custo']),
+        'amostra_cancelamentos_diario': GroupSums(['dia', 'merchant_id', 'canal', 'motivo'], ['valor_perdido']),
+        'amostra_pedidos_hora': GroupSums(['dia', 'hora', 'canal'], ['faturamento']),
+        'amostra_nps_diario': GroupSums(['dia', 'merchant_id'],
+                                        ['promotores', 'neutros', 'detratores', 'soma_avaliacao']),
+    }
+
+
+def add_rollups(rollups, engine, d):
+    # Revenue, times, payments and menu count completed orders only
+    import numpy as np
+
+    dia = d['day'].isoformat()
+    lojas = engine.lojas
+    n_canais, n_pag, n_itens, n_motivos = (len(orders.CANAIS), len(orders.PAGAMENTOS), len(orders.CARDAPIO),
+                                           len(orders.MOTIVOS))
+    loja, canal = d['pedido_loja'], d['pedido_canal']
+    ok = ~d['pedido_cancelado']
+    total = d['pedido_valor_total'] * ok
+    entregue = d['pedido_entregue'] & ok
+
+    rollups['amostra_pedidos_diario'].add_codes(
+        loja * n_canais + canal,
+        [~ok, total, total - d['pedido_taxa_plataforma'] * ok, d['pedido_itens'] * ok, d['pedido_preparo'] * ok,
+         d['pedido_entrega'] * entregue, entregue],
+        lambda c: (dia, lojas[c // n_canais], orders.CANAIS[c % n_canais]))
+    rollups['amostra_pagamentos_diario'].add_codes(
+        (loja * n_pag + d['pedido_pagamento'])[ok], [total[ok]],
+        lambda c: (dia, lojas[c // n_pag], orders.PAGAMENTOS[c % n_pag]))
+    linha_ok = ok[d['linha_pedido']]
+    item, quantidade = d['linha_item'][linha_ok], d['linha_quantidade'][linha_ok]
+    rollups['amostra_cardapio_diario'].add_codes(
+        loja[d['linha_pedido']][linha_ok] * n_itens + item,
+        [quantidade, quantidade * engine.preco[item], quantidade * engine.custo[item]],
+        lambda c: (dia, lojas[c // n_itens], *orders.CARDAPIO[c % n_itens][:2]))
+    cancelado = ~ok
+    rollups['amostra_cancelamentos_diario'].add_codes(
+        ((loja * n_canais + canal) * n_motivos + d['pedido_motivo'])[cancelado], [d['pedido_valor_total'][cancelado]],
+        lambda c: (dia, lojas[c // (n_canais * n_motivos)], orders.CANAIS[c // n_motivos % n_canais],
+                   orders.MOTIVOS[c % n_motivos]))
+    rollups['amostra_pedidos_hora'].add_codes(
+        d['pedido_hora'] * n_canais + canal, [total],
+        lambda c: (dia, c // n_canais, orders.CANAIS[c % n_canais]))
+    responde = d['pedido_responde']
+    nps = d['pedido_nps'][responde]
+    rollups['amostra_nps_diario'].add_codes(
+        loja[responde], [nps >= 9, (nps >= 7) & (nps <= 8), nps <= 6, d['pedido_estrelas'][responde]],
+        lambda c: (dia, lojas[c]))
+
+
+def _rounded(row, *columns):
+    for k in columns:
+        row[k] = round(row[k], 2)
+
+
+def _ints(row, *columns):
+    for k in columns:
+        row[k] = int(row[k])
+
+
+def pedidos_diario_rows(rollup):
+    for row in rollup.rows():
+        n = row['pedidos'] = row['registros']
+        _ints(row, 'cancelados', 'itens', 'soma_tempo_preparo', 'soma_tempo_entrega', 'entregas')
+        concluidos = n - row['cancelados']
+        row['ticket_medio'] = round(row['faturamento_bruto'] / concluidos, 2) if concluidos else 0
+        row['tempo_preparo_medio'] = round(row['soma_tempo_preparo'] / concluidos, 2) if concluidos else None
+        row['tempo_entrega_medio'] = round(row['soma_tempo_entrega'] / row['entregas'], 2) if row['entregas'] else None
+        _rounded(row, 'faturamento_bruto', 'faturamento_liquido')
+        yield {k: row[k] for k in SCHEMAS['amostra_pedidos_diario']}
+
+
+def pagamentos_diario_rows(rollup):
+    for row in rollup.rows():
+        row['pedidos'] = row['registros']
+        _rounded(row, 'valor')
+        yield {k: row[k] for k in SCHEMAS['amostra_pagamentos_diario']}
+
+
+def cardapio_diario_rows(rollup):
+    for row in rollup.rows():
+        _ints(row, 'quantidade')
+        row['cmv'] = round(100 * row['custo'] / row['receita'], 2) if row['receita'] else None
+        _rounded(row, 'receita', 'custo')
+        yield {k: row[k] for k in SCHEMAS['amostra_cardapio_diario']}
+
+
+def cancelamentos_diario_rows(rollup):
+    for row in rollup.rows():
+        row['pedidos'] = row['registros']
+        _rounded(row, 'valor_perdido')
+        yield {k: row[k] for k in SCHEMAS['amostra_cancelamentos_diario']}
+
+
+def pedidos_hora_rows(rollup):
+    for row in rollup.rows():
+        row['pedidos'] = row['registros']
+        _rounded(row, 'faturamento')
+        yield {k: row[k] for k in SCHEMAS['amostra_pedidos_hora']}
+
+
+def nps_diario_rows(rollup):
+    for row in rollup.rows():
+        n = row['respostas'] = row['registros']
+        _ints(row, 'promotores', 'neutros', 'detratores', 'soma_avaliacao')
+        row['nps'] = round(100 * (row['promotores'] - row['detratores']) / n, 2) if n else None
+        row['avaliacao_media'] = round(row['soma_avaliacao'] / n, 2) if n else None
+        yield {k: row[k] for k in SCHEMAS['amostra_nps_diario']}
+
+
+ROLLUP_ROWS = {
+    'amostra_pedidos_diario': pedidos_diario_rows,
+    'amostra_pagamentos_diario': pagamentos_diario_rows,
+    'amostra_cardapio_diario': cardapio_diario_rows,
+    'amostra_cancelamentos_diario': cancelamentos_diario_rows,
+    'amostra_pedidos_hora': pedidos_hora_rows,
+    'amostra_nps_diario': nps_diario_rows,
+}
+
+
+def write_rollups(sink, rollups):
+    print("Generating Rollups...")
+    for name, rows in ROLLUP_ROWS.items():
+        sink.write_rows(name, rows(rollups[name]))
+
+
+def calendar(start, end, total):
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return list(zip(days, orders.daily_counts(days, total)))
+
+
+# The orders and items of a shard of days, as part files under out_dir/_shards
+# (merged by the parent) or, with --load, copied straight into Postgres
+def generate_shard(shard):
+    (index, start, count), args, lojas, days = shard
+    days = days[start:start + count]
+    if args.load:
+        sink = open_sink(load=args.load, load_format=args.load_format)
+    else:
+        sink = open_sink(shard_dir(args.out_dir, index), args.chunk_size, fmt=args.format, schemas=SCHEMAS, quiet=True,
+                         compression=args.compress)
+    engine = new_engine(lojas)
+    rollups = new_rollups()
+    rows = {'amostra_pedidos': sink.write_blocks('amostra_pedidos', generate_pedidos(engine, days, rollups)),
+            'amostra_pedido_itens': sink.write_blocks('amostra_pedido_itens', generate_itens(engine, days))}
+    sink.close()
+    if args.load:
+        return {name: (None, n) for name, n in rows.items()}, rollups
+    return {name: (sink.path(name), n) for name, n in rows.items()}, rollups
+
+
+def main_sharded(args, sink, manifest, lojas, days):
+    shards = shard_ranges(len(days), args.shard_days)
+    print(f"Generating {args.pedidos} pedidos in {len(shards)} shards of {args.shard_days} days "
+          f"({args.workers} workers)...")
+    with manifest.stage('shards') as stage:
+        results, partials = zip(*run_shards(generate_shard, [(s, args, lojas, days) for s in shards], args.workers,
+                                            stage=stage))
+        stage['rows'] = sum(n for r in results for _, n in r.values())
+    for name in ('amostra_pedidos', 'amostra_pedido_itens'):
+        if args.load:
+            print(f"Loaded {name} ({sum(r[name][1] for r in results)} rows)")
+        else:
+            sink.merge(name, [r[name] for r in results])
+    cleanup_shards(args.out_dir)
+    rollups = new_rollups()
+    for partial in partials:
+        for name, rollup in partial.items():
+            rollups[name].update(rollup)
+    return rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera pedidos de restaurante (restaurante_schema.sql) para os dashboards de restaurante.')
+    parser.add_argument('--out-dir', default='.', help='Diretório de saída dos CSVs')
+    parser.add_argument('--pedidos', type=int, default=TOTAL_PEDIDOS, help=f'Total de pedidos (padrão: {TOTAL_PEDIDOS})')
+    parser.add_argument('--inicio', type=date.fromisoformat, default=INICIO, help=f'Primeiro dia, AAAA-MM-DD (padrão: {INICIO})')
+    parser.add_argument('--fim', type=date.fromisoformat, default=FIM, help=f'Último dia, AAAA-MM-DD (padrão: {FIM})')
+    parser.add_argument('--lojas', type=int, default=LOJAS, help=f'Lojas da rede sintética (padrão: {LOJAS})')
+    parser.add_argument('--restaurantes', metavar='CSV',
+                        help='Usa as lojas de um export de amostra_restaurants (merchant_id, name, user_rating_count)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Linhas por lote de escrita')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Gera os dias em shards num pool de N processos (resultado igual para qualquer N)')
+    parser.add_argument('--shard-days', type=int, default=SHARD_DAYS, help='Dias por shard (com --workers)')
+    parser.add_argument('--load', metavar='POSTGRES_URL',
+                        help='Carrega as tabelas direto no Postgres via COPY em vez de gerar CSVs')
+    parser.add_argument('--load-format', choices=['text', 'binary'], default='text', help='Formato do COPY (com --load)')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Formato dos arquivos: colunas tipadas conforme restaurante_schema.sql em parquet/arrow (requer pyarrow)')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                        help='Comprime cada CSV em frames independentes (.csv.gz/.csv.zst) enquanto gera; zstd requer zstandard')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help='Perfila cada etapa em <out-dir>/profiles (pyinstrument precisa estar instalado)')
+    args = parser.parse_args()
+    if args.fim < args.inicio:
+        parser.error('--fim é anterior a --inicio')
+    if args.compress and (args.format != 'csv' or args.load):
+        parser.error('--compress só se aplica aos CSVs (parquet/arrow já saem comprimidos em zstd)')
+
+    lojas = generate_lojas(args.lojas, args.restaurantes)
+    if not lojas:
+        parser.error(f'nenhuma loja com merchant_id em {args.restaurantes}')
+    days = calendar(args.inicio, args.fim, args.pedidos)
+
+    manifest = RunManifest(args.out_dir, profile=args.profile)
+    sink = manifest.wrap(open_sink(args.out_dir, args.chunk_size, args.load, args.load_format, fmt=args.format,
+                                   schemas=SCHEMAS, compression=args.compress))
+    try:
+        sink.prepare(TABLES)
+        sink.write_rows('amostra_lojas', loja_rows(lojas))
+        if args.workers:
+            rollups = main_sharded(args, sink, manifest, lojas, days)
+        else:
+            engine = new_engine(lojas)
+            rollups = new_rollups()
+            print(f"Generating Pedidos ({args.inicio} .. {args.fim})...")
+            sink.write_blocks('amostra_pedidos', generate_pedidos(engine, days, rollups))
+            print("Generating Itens...")
+            sink.write_blocks('amostra_pedido_itens', generate_itens(engine, days))
+        write_rollups(sink, rollups)
+    finally:
+        sink.finish()
+        manifest.save(seed=SEED, pedidos=args.pedidos)
+    print("Done!")
+
+
+if __name__ == '__main__':
+    main()
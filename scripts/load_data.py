@@ -0,0 +1,129 @@
+"""Load generated CSVs (plain, .csv.gz or .csv.zst) into Postgres with COPY.
+
+    python load_data.py out/ --load postgresql://... --workers 4
+    python load_data.py out/ --load postgresql://... --escola-id <uuid> --ano 2025
+
+For files written with ``--compress`` the frames listed in the
+``.frames.json`` sidecar are decompressed and copied by ``--workers``
+threads in parallel (see ``datagen.compress``). Each file goes to the table
+of the same name; tables referenced by foreign keys load first.
+
+Output written with ``--partition`` (``<table>/escola_id=.../ano=.../``,
+see ``datagen.partitions``) loads the same way. ``--escola-id``/``--ano``
+prune it to the matching partitions and replace only their rows, leaving
+the other schools and years in the tables untouched. The student facts
+find their school through alunos (``tenant_via`` in ``_partitions.json``);
+tables with no column for a key are skipped, and a delete that would
+cascade into tables not being reloaded is refused.
+"""
+import argparse
+import os
+import re
+
+from datagen import partitions
+from datagen.pg_loader import PgSink
+
+_CSV = re.compile(r'^(\w+)\.csv(\.gz|\.zst)?$')
+
+
+def find_files(paths):
+    """``{table: (manifest, files)}`` for the CSVs in ``paths``.
+
+    ``paths`` are files, directories of CSVs, partitioned table directories
+    or directories holding them. ``manifest`` is the ``_partitions.json`` of
+    a partitioned table (``None`` for a flat file).
+    """
+    tables = {}
+    for path in paths:
+        if os.path.isdir(path):
+            manifest = partitions.read_manifest(path)
+            if manifest:
+                tables[manifest['table']] = (manifest, [os.path.join(path, p['path']) for p in manifest['partitions']])
+                continue
+            names = sorted(os.listdir(path))
+            subdirs = [os.path.join(path, n) for n in names if os.path.isdir(os.path.join(path, n))]
+            tables.update({t: v for t, v in find_files(subdirs).items() if v[0]})
+        else:
+            path, names = os.path.dirname(path), [os.path.basename(path)]
+        for name in names:
+            m = _CSV.match(name)
+            if m:
+                tables[m.group(1)] = (None, [os.path.join(path, name)])
+    return tables
+
+
+def prune(tables, escola_id, ano):
+    """Keep the partitions of ``escola_id``/``ano``; flat files cannot be pruned and are dropped."""
+    skipped = sorted(name for name, (manifest, _) in tables.items() if manifest is None)
+    if skipped:
+        print(f"Skipped (not partitioned): {', '.join(skipped)}")
+    pruned = {}
+    for name, (manifest, files) in tables.items():
+        if manifest is None:
+            continue
+        selected = partitions.select(manifest, escola_id, ano)
+        files = [f for p, f in zip(manifest['partitions'], files) if p in selected]
+        if files:
+            pruned[name] = (manifest, files)
+    return pruned
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carrega CSVs gerados (também .csv.gz/.csv.zst) no Postgres via COPY.')
+    parser.add_argument('paths', nargs='+', help='Arquivos ou diretórios com os CSVs (ou saída de --partition)')
+    parser.add_argument('--load', metavar='POSTGRES_URL', required=True, help='Banco de destino')
+    parser.add_argument('--workers', type=int, default=4, help='COPYs em paralelo por tabela (arquivos com frames)')
+    parser.add_argument('--table', action='append', default=[], metavar='ARQUIVO=TABELA',
+                        help='Carrega o arquivo numa tabela de outro nome (ex.: dim_alunos=alunos)')
+    parser.add_argument('--no-truncate', action='store_true', help='Acrescenta às tabelas em vez de esvaziá-las antes')
+    parser.add_argument('--truncate-cascade', action='store_true',
+                        help='Esvazia também as tabelas que referenciam as carregadas (chaves estrangeiras), '
+                             'mesmo que não sejam recarregadas')
+    parser.add_argument('--escola-id', help='Só as partições desta escola (saída de --partition): '
+                                            'apaga e recarrega apenas as linhas dela')
+    parser.add_argument('--ano', type=int, help='Só as partições deste ano (saída de --partition): '
+                                                'apaga e recarrega apenas as linhas dele')
+    args = parser.parse_args()
+
+    tables = find_files(args.paths)
+    keys = {k: v for k, v in (('escola_id', args.escola_id), ('ano', args.ano)) if v is not None}
+    if keys:
+        tables = prune(tables, args.escola_id, args.ano)
+    if not tables:
+        parser.error('nenhum CSV encontrado' + (' nas partições pedidas' if keys else ''))
+    delete = keys and not args.no_truncate
+    if delete:
+        # Rows of tables with no column for the key (e.g. despesas per escola) cannot be told apart
+        missing = [name for name, (manifest, _) in sorted(tables.items())
+                   if any(manifest['partition_by'].get(k) is None for k in keys)]
+        if missing:
+            print(f"Skipped (no column for {'/'.join(keys)}; load them whole): {', '.join(missing)}")
+            tables = {name: v for name, v in tables.items() if name not in missing}
+        if not tables:
+            parser.error(f"nenhuma tabela com coluna para {'/'.join(keys)}")
+
+    sink = PgSink(args.load, table_map=dict(t.split('=', 1) for t in args.table), cascade=args.truncate_cascade)
+    order = sink.load_order(sorted(tables))
+    if delete:
+        # Deleting a partition cascades to the tables that reference it: they must be reloaded too
+        try:
+            sink.check_dependents([sink.table(n) for n in order], 'deleting partitions of', 'delete rows of')
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        sink.prepare(order, truncate=not (args.no_truncate or keys))
+        if delete:
+            # Children first: their tenant may be looked up through a parent (tenant_via)
+            for name in reversed(order):
+                manifest = tables[name][0]
+                sink.delete_partition(name, manifest['partition_by'], keys, manifest.get('tenant_via'))
+        for name in order:
+            for filename in tables[name][1]:
+                sink.copy_file(name, filename, workers=args.workers)
+    finally:
+        sink.finish()
+    print("Done!")
+
+
+if __name__ == '__main__':
+    main()
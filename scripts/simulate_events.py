@@ -0,0 +1,303 @@
+"""Stream live changes to the school tables at a controlled rate.
+
+    python simulate_events.py --taxa 500 --duracao 60 --ndjson eventos.ndjson
+    python simulate_events.py --alunos 10000 --taxa 2000 --load postgresql://localhost/ensitec
+    python simulate_events.py --replay eventos.ndjson --taxa 0 --socket localhost:9000
+
+generate_final_data.py writes a snapshot as of CURRENT_DATE, so the
+dashboards only ever see static data. This carries the school on from
+--inicio as an ordered stream of row changes on a simulated clock, to
+load-test the dashboards while data keeps arriving:
+
+* mensalidade_emitida / mensalidade_paga / mensalidade_atrasada: each
+  month's bills are issued Pendente on its first day and settle during the
+  month, late (Atrasado) as often as in the snapshot (``pagamento_status``).
+  The Pendente bills of the starting month settle the same way.
+* chamado_aberto / chamado_resolvido: CHAMADOS_POR_MES tickets a month,
+  drawn by ``new_chamado``; the ones it resolves close 1-5 days later.
+* presenca: every school day, the attendance of each active student in the
+  running bimestre, per disciplina. A student attends with the chance
+  ``get_academic_performance`` gives their presença; desempenho_aberto
+  inserts the rows of a new bimestre.
+* evasao: active students drop out at the EVASAO_MENSAL hazard.
+
+The students are the ones ``generate_final_data.py --alunos N`` writes
+without --workers (redrawn from the same seed), or read from --alunos-csv.
+Events go to an NDJSON file, a socket or the database (--load) through
+``datagen.events.deliver``, at --taxa events/s with backpressure; --replay
+re-sends a recorded NDJSON stream instead of simulating.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import random
+import sys
+from datetime import date, datetime, time, timedelta
+
+from datagen.events import BATCH, QUEUE_SIZE, REPORT_EVERY, NdjsonSink, PgEventSink, SocketSink, deliver, event, \
+    read_ndjson
+from datagen.months import next_month
+from datagen.pools import load_pools
+from datagen.rng import derive_seed
+from datagen.writers import CsvSource
+from generate_final_data import BIMESTRES, CHAMADOS_POR_MES, CURRENT_DATE, DISCIPLINAS, EVASAO_MENSAL, SEED, \
+    TOTAL_ALUNOS, draw_alunos, get_academic_performance, new_chamado, new_id, new_students, pagamento_status, \
+    seed_streams
+
+TAXA = 100
+# Attendance is taken during these hours
+AULAS = (7, 18)
+DIA = timedelta(days=1)
+
+
+def bimestre(d):
+    """The bimestre ``d`` falls in (1-4), or None in the holidays."""
+    for n, (start, end) in enumerate(BIMESTRES, 1):
+        if date(d.year, *start) <= d < date(d.year, *end):
+            return n
+    return None
+
+
+def bimestre_start(d):
+    return date(d.year, *BIMESTRES[bimestre(d) - 1][0])
+
+
+def school_days(start, end):
+    return sum(1 for k in range((end - start).days) if (start + k * DIA).weekday() < 5)
+
+
+def load_students(args):
+    if args.alunos_csv:
+        print(f"Loading alunos from {args.alunos_csv}...")
+        return new_students(CsvSource(args.alunos_csv))
+    print(f"Generating Alunos ({args.alunos})...")
+    alunos = new_students()
+    for _ in alunos.collect(draw_alunos(args.alunos)):
+        pass
+    return alunos
+
+
+class SchoolSimulator:
+    """Discrete-event simulation of the school after the snapshot.
+
+    A heap holds ``(time, order, action)``: processes (the day tick, ticket
+    arrivals, drop-outs) reschedule themselves, and the row changes they
+    decide on are scheduled at their own time. Actions return the events
+    to emit, numbered in time order by ``events``.
+    """
+
+    def __init__(self, alunos, start):
+        self.alunos = alunos
+        self.start = start
+        self.evadido = alunos.code('status_matricula', 'Evadido')
+        self.inadimplente = alunos.code('status_matricula', 'Inadimplente')
+        self.words = load_pools().words
+        self.heap = []
+        self.order = itertools.count()
+        n = len(alunos)
+        self.active = sum(1 for i in range(n) if not self.evaded(i))
+        # Each student's chance of attending a class, and per disciplina the classes of the bimestre and attended
+        self.studious = [random.random() > 0.25 for _ in range(n)]
+        self.presenca = [get_academic_performance(s)[1] / 100 for s in self.studious]
+        self.aulas = [None] * n
+        self.daily_evasao = 1 - (1 - EVASAO_MENSAL) ** (1 / 30)
+
+    def evaded(self, i):
+        return self.alunos['status_matricula'][i] == self.evadido
+
+    def disciplinas(self, i):
+        return DISCIPLINAS[self.alunos.value('segmento', i)]
+
+    def at(self, when, action):
+        heapq.heappush(self.heap, (when, next(self.order), action))
+
+    def after(self, t, rate):
+        """The next arrival of a Poisson process of ``rate`` a day, to the second."""
+        return t + timedelta(seconds=max(1, round(random.expovariate(rate) * 86400)))
+
+    def at_random(self, start, end, action):
+        """Schedule ``action`` at a whole second drawn in [start, end)."""
+        seconds = int((end - start).total_seconds())
+        self.at(start + timedelta(seconds=random.randrange(max(seconds, 1))), action)
+
+    def events(self, until=None):
+        t0 = datetime.combine(self.start, time())
+        self.at(t0, lambda t: self.day(t, first=True))
+        self.at(self.after(t0, CHAMADOS_POR_MES / 30), self.chamado)
+        self.schedule_evasao(t0)
+        seq = itertools.count(1)
+        while self.heap:
+            t, _, action = heapq.heappop(self.heap)
+            if until is not None and t.date() >= until:
+                return
+            for tipo, table, op, key, values in action(t):
+                yield event(next(seq), t, tipo, table, op, key, values)
+
+    # The day tick: bills, bimestres and the day's classes
+    def day(self, t, first=False):
+        d = t.date()
+        self.at(t + DIA, self.day)
+        out = []
+        if d.day == 1:
+            out += self.bill(t)
+        elif first:
+            # The month's bills are in the snapshot, still Pendente
+            self.settle(t, [i for i in range(len(self.alunos)) if self.billed(i)])
+        bim = bimestre(d)
+        if bim is not None and (first or bimestre(d - DIA) != bim):
+            out += self.open_bimestre(d, bim, first)
+        if bim is not None and d.weekday() < 5:
+            start, end = t + timedelta(hours=AULAS[0]), t + timedelta(hours=AULAS[1])
+            for i in range(len(self.alunos)):
+                if not self.evaded(i):
+                    self.at_random(start, end, lambda when, i=i: self.presenca_update(when, i))
+        return out
+
+    def billed(self, i):
+        return not self.evaded(i) and not self.alunos.flag('bolsista', i)
+
+    def bill(self, t):
+        mes = t.date().isoformat()
+        students = [i for i in range(len(self.alunos)) if self.billed(i)]
+        self.settle(t, students)
+        return [('mensalidade_emitida', 'financeiro_mensalidades', 'insert', {'id': new_id()},
+                 {'aluno_id': self.alunos.id(i), 'mes_referencia': mes, 'valor': 1500.00,
+                  'status_pagamento': 'Pendente'}) for i in students]
+
+    def settle(self, t, students):
+        mes = t.date().replace(day=1)
+        end = datetime.combine(next_month(mes), time())
+        for i in students:
+            self.at_random(t, end, lambda when, i=i, mes=mes.isoformat(): self.pagamento(i, mes))
+
+    def pagamento(self, i, mes):
+        status = pagamento_status(self.alunos['status_matricula'][i] == self.inadimplente)
+        tipo = 'mensalidade_atrasada' if status == 'Atrasado' else 'mensalidade_paga'
+        return [(tipo, 'financeiro_mensalidades', 'update', {'aluno_id': self.alunos.id(i), 'mes_referencia': mes},
+                 {'status_pagamento': status})]
+
+    def open_bimestre(self, d, bim, first):
+        """Reset the attendance counts; a new bimestre also gets its desempenho rows."""
+        # The snapshot holds the running bimestre, with the classes given so far
+        given = school_days(bimestre_start(d), d) if first else 0
+        out = []
+        for i in range(len(self.alunos)):
+            if self.evaded(i):
+                continue
+            p = self.presenca[i]
+            self.aulas[i] = {disc: [given, round(given * p)] for disc in self.disciplinas(i)}
+            if first:
+                continue
+            for disc in self.disciplinas(i):
+                nota, presenca, entrega = get_academic_performance(self.studious[i])
+                out.append(('desempenho_aberto', 'desempenho_academico', 'insert', {'id': new_id()},
+                            {'aluno_id': self.alunos.id(i), 'disciplina': disc, 'media_final': round(nota, 1),
+                             'percentual_presenca': 100.0, 'taxa_entrega_atividades': round(entrega, 1),
+                             'bimestre': bim, 'ano_letivo': d.year}))
+        return out
+
+    def presenca_update(self, t, i):
+        if self.evaded(i) or self.aulas[i] is None:
+            return []
+        out = []
+        bim = bimestre(t.date())
+        for disc, counts in self.aulas[i].items():
+            counts[0] += 1
+            counts[1] += random.random() < self.presenca[i]
+            out.append(('presenca', 'desempenho_academico', 'update',
+                        {'aluno_id': self.alunos.id(i), 'disciplina': disc, 'bimestre': bim, 'ano_letivo': t.year},
+                        {'percentual_presenca': round(100 * counts[1] / counts[0], 1)}))
+        return out
+
+    def chamado(self, t):
+        self.at(self.after(t, CHAMADOS_POR_MES / 30), self.chamado)
+        row = new_chamado(t, self.words)
+        if row['status'] == 'Resolvido':
+            self.at(datetime.fromisoformat(row['data_resolucao']),
+                    lambda when, chamado=row['id']: [('chamado_resolvido', 'operacional_chamados', 'update',
+                                                      {'id': chamado},
+                                                      {'status': 'Resolvido',
+                                                       'data_resolucao': when.isoformat()})])
+        values = {k: v for k, v in row.items() if k != 'id'}
+        values.update(status='Aberto', data_resolucao='')
+        return [('chamado_aberto', 'operacional_chamados', 'insert', {'id': row['id']}, values)]
+
+    def schedule_evasao(self, t):
+        if self.active:
+            self.at(self.after(t, self.active * self.daily_evasao), self.evasao)
+
+    def evasao(self, t):
+        n = len(self.alunos)
+        i = random.randrange(n)
+        while self.evaded(i):
+            i = random.randrange(n)
+        self.alunos.set('status_matricula', i, 'Evadido')
+        self.alunos.set('data_evasao', i, t.date())
+        self.active -= 1
+        self.schedule_evasao(t)
+        return [('evasao', 'alunos', 'update', {'id': self.alunos.id(i)},
+                 {'status_matricula': 'Evadido', 'data_evasao': t.date().isoformat()})]
+
+
+def open_event_sink(args):
+    if args.load:
+        return PgEventSink(args.load)
+    if args.socket:
+        return SocketSink(args.socket)
+    return NdjsonSink(args.ndjson, args.rotacao)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simula eventos ao vivo (mensalidades, chamados, presença, evasões) '
+                                                 'a uma taxa controlada, para testar os dashboards sob ingestão.')
+    parser.add_argument('--taxa', type=float, default=TAXA, help=f'Eventos por segundo; 0 = sem limite (padrão: {TAXA})')
+    parser.add_argument('--eventos', type=int, help='Para após N eventos')
+    parser.add_argument('--duracao', type=float, help='Para após N segundos')
+    parser.add_argument('--inicio', type=date.fromisoformat, default=CURRENT_DATE,
+                        help=f'Início do relógio simulado, AAAA-MM-DD (padrão: {CURRENT_DATE})')
+    parser.add_argument('--fim', type=date.fromisoformat, help='Para ao chegar a este dia simulado, AAAA-MM-DD')
+    parser.add_argument('--alunos', type=int, default=TOTAL_ALUNOS,
+                        help=f'Alunos, os mesmos de generate_final_data.py --alunos N (padrão: {TOTAL_ALUNOS})')
+    parser.add_argument('--alunos-csv', metavar='CSV', help='Lê os alunos deste alunos.csv em vez de gerá-los')
+    parser.add_argument('--replay', metavar='NDJSON', help='Reenvia um fluxo gravado em vez de simular')
+    out = parser.add_mutually_exclusive_group()
+    out.add_argument('--ndjson', default='eventos.ndjson', help='Arquivo NDJSON de saída; - = stdout (padrão: eventos.ndjson)')
+    out.add_argument('--socket', metavar='HOST:PORTA', help='Envia NDJSON a um socket TCP (host:porta) ou unix (caminho)')
+    out.add_argument('--load', metavar='POSTGRES_URL', help='Aplica os eventos no banco (upserts em lote)')
+    parser.add_argument('--rotacao', type=int, default=0, help='Eventos por arquivo NDJSON (0 = um só arquivo)')
+    parser.add_argument('--lote', type=int, default=BATCH, help='Máximo de eventos por escrita/transação')
+    parser.add_argument('--fila', type=int, default=QUEUE_SIZE, help='Eventos em fila antes de bloquear o gerador')
+    parser.add_argument('--relatorio', type=float, default=REPORT_EVERY, help='Segundos entre relatórios de vazão')
+    parser.add_argument('--resumo', metavar='JSON', help='Grava o resumo da execução neste arquivo')
+    args = parser.parse_args()
+
+    if args.replay:
+        events = read_ndjson(args.replay)
+    else:
+        alunos = load_students(args)
+        seed_streams(derive_seed(SEED, 'eventos', args.inicio.isoformat()))
+        events = SchoolSimulator(alunos, args.inicio).events(args.fim)
+
+    sink = open_event_sink(args)
+    # Progress goes to stderr when the events go to stdout
+    log = sys.stderr if args.ndjson == '-' and not (args.load or args.socket) else sys.stdout
+    print(f"Streaming events at {f'{args.taxa:g}/s' if args.taxa else 'full speed'}...", file=log)
+    try:
+        summary = deliver(events, sink, args.taxa, args.eventos, args.duracao, args.lote, args.fila,
+                          args.relatorio, log)
+    finally:
+        sink.close()
+    print(f"Sent {summary['events']} events in {summary['seconds']:.1f}s ({summary['events_per_s']} ev/s); "
+          f"max lag {summary['max_lag_s']}s, blocked {summary['blocked_s']}s, "
+          f"{summary['writes']} writes of {summary['mean_batch']} events ({summary['mean_write_ms']} ms)", file=log)
+    for tipo, n in sorted(summary['tipos'].items()):
+        print(f"  {tipo:22} {n}", file=log)
+    if args.resumo:
+        with open(args.resumo, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), **summary}, f, indent=2, default=str)
+    print("Done!", file=log)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Fixtures for the generator tests.
+
+    python -m pytest scripts/tests
+
+The generators run in a fresh process each, on ``ALUNOS`` students and a
+scratch output directory, without Postgres. Module globals a test needs
+changed (``SHARD_SIZE``) are set before ``main`` runs.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS)
+
+ALUNOS = 200
+# Per-run timings: never the same twice
+SKIP_FILES = {'run_manifest.json'}
+
+
+@pytest.fixture(scope='session')
+def cache_dir(tmp_path_factory):
+    # The sampling pools are built once for the whole session
+    return str(tmp_path_factory.mktemp('cache'))
+
+
+@pytest.fixture(scope='session')
+def run(cache_dir):
+    """``run(script, out_dir, *args, **globals)``: run ``script`` (a module name) and return its stdout."""
+    def run(script, out_dir, *args, **overrides):
+        code = f'import {script} as g\n'
+        code += ''.join(f'g.{name.upper()} = {value!r}\n' for name, value in overrides.items())
+        code += 'g.main()\n'
+        argv = ['--out-dir', str(out_dir), *map(str, args)]
+        result = subprocess.run([sys.executable, '-c', code, *argv], cwd=SCRIPTS, capture_output=True, text=True,
+                                env={**os.environ, 'DATAGEN_CACHE_DIR': cache_dir})
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+    return run
+
+
+@pytest.fixture(scope='session')
+def read_tree():
+    """``read_tree(path)``: ``{relative path: bytes}`` of the files under ``path``."""
+    def read_tree(path):
+        files = {}
+        for root, _, names in os.walk(path):
+            for name in names:
+                if name not in SKIP_FILES:
+                    filename = os.path.join(root, name)
+                    with open(filename, 'rb') as f:
+                        files[os.path.relpath(filename, path)] = f.read()
+        return files
+    return read_tree
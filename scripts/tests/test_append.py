@@ -0,0 +1,79 @@
+"""--append: the new months only, settling the month the last run left Pendente."""
+import csv
+from collections import Counter, defaultdict
+
+import pytest
+
+from conftest import ALUNOS
+
+# The full run ends in February 2026 (CURRENT_DATE); the append adds March and April
+UNTIL = '2026-04-20'
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture(scope='module')
+def appended(run, tmp_path_factory):
+    out = tmp_path_factory.mktemp('append')
+    run('generate_final_data', out, '--alunos', ALUNOS, '--no-cache')
+    before = read_csv(out / 'financeiro_mensalidades.csv')
+    run('generate_final_data', out, '--append', '--current-date', UNTIL)
+    return out, before
+
+
+def test_settles_the_previous_month(appended):
+    out, before = appended
+    assert {r['status_pagamento'] for r in before if r['mes_referencia'] == '2026-02-01'} == {'Pendente'}
+    rows = read_csv(out / 'financeiro_mensalidades.csv')
+    pendentes = {r['mes_referencia'] for r in rows if r['status_pagamento'] == 'Pendente'}
+    assert pendentes == {'2026-04-01'}
+    assert {r['mes_referencia'] for r in rows} >= {'2026-02-01', '2026-03-01', '2026-04-01'}
+    # Settling only changes the status of February's bills
+    settled = {r['id']: r for r in rows}
+    for row in before:
+        assert {k: v for k, v in settled[row['id']].items() if k != 'status_pagamento'} == \
+            {k: v for k, v in row.items() if k != 'status_pagamento'}
+
+
+def test_no_duplicates(appended):
+    out, _ = appended
+    for table, keys in (('alunos', ['id']), ('financeiro_mensalidades', ['id']),
+                        ('financeiro_mensalidades', ['aluno_id', 'mes_referencia']),
+                        ('desempenho_academico', ['id']), ('operacional_chamados', ['id']),
+                        ('rollup_financeiro_mensal', ['escola_id', 'mes_referencia', 'unidade'])):
+        counts = Counter(tuple(r[k] for k in keys) for r in read_csv(out / f'{table}.csv'))
+        assert not [key for key, n in counts.items() if n > 1], (table, keys)
+
+
+def test_rollup_matches_the_facts(appended):
+    out, _ = appended
+    alunos = {r['id']: r for r in read_csv(out / 'alunos.csv')}
+    expected = defaultdict(Counter)
+    for row in read_csv(out / 'financeiro_mensalidades.csv'):
+        totals = expected[row['mes_referencia'], alunos[row['aluno_id']]['unidade']]
+        totals['mensalidades'] += 1
+        totals['receita_prevista'] += float(row['valor'])
+        totals['receita_paga'] += float(row['valor']) if row['status_pagamento'] == 'Pago' else 0
+        totals['mensalidades_atrasadas'] += row['status_pagamento'] == 'Atrasado'
+        totals['mensalidades_pendentes'] += row['status_pagamento'] == 'Pendente'
+    for aluno in alunos.values():
+        if aluno['data_evasao']:
+            expected[aluno['data_evasao'][:8] + '01', aluno['unidade']]['evasoes'] += 1
+
+    rollup = {(r['mes_referencia'], r['unidade']): r for r in read_csv(out / 'rollup_financeiro_mensal.csv')}
+    assert set(rollup) == set(expected)
+    for key, totals in expected.items():
+        for column in ('mensalidades', 'mensalidades_atrasadas', 'mensalidades_pendentes', 'evasoes'):
+            assert int(rollup[key][column]) == totals[column], (key, column)
+        for column in ('receita_prevista', 'receita_paga'):
+            assert float(rollup[key][column]) == pytest.approx(totals[column]), (key, column)
+
+
+def test_append_again_is_a_no_op(appended, run, read_tree):
+    out, _ = appended
+    files = read_tree(out)
+    assert 'Nothing to generate' in run('generate_final_data', out, '--append', '--current-date', UNTIL)
+    assert read_tree(out) == files
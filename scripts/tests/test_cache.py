@@ -0,0 +1,26 @@
+"""The table cache: a second run restores the files, and never writes through them."""
+import os
+
+from conftest import ALUNOS
+from generate_final_data import TABLES
+
+
+def test_restore_then_append(run, read_tree, tmp_path):
+    tables = tmp_path / 'tables'
+    args = ['--alunos', ALUNOS, '--cache-dir', tables]
+    assert 'from the cache' not in run('generate_final_data', tmp_path / 'first', *args)
+    stored = read_tree(tables)
+    assert stored
+
+    out = tmp_path / 'second'
+    stdout = run('generate_final_data', out, *args)
+    assert all(f'Reused {name} from the cache' in stdout for name in TABLES)
+    assert read_tree(out) == read_tree(tmp_path / 'first')
+    # Hard links into the cache entries
+    assert all(os.stat(out / f'{name}.csv').st_nlink > 1 for name in TABLES)
+
+    # The restored files get inodes of their own before the append writes to them
+    run('generate_final_data', out, '--append', '--current-date', '2026-04-20')
+    assert read_tree(tables) == stored
+    assert all(os.stat(path).st_nlink == 1 for path in out.iterdir())
+    assert read_tree(out) != read_tree(tmp_path / 'first')
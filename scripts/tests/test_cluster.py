@@ -0,0 +1,104 @@
+"""--cluster: the external sort, and the time-ordered (UUIDv7) ids it writes."""
+import csv
+import random
+import re
+from datetime import date, datetime, timezone
+
+import pytest
+
+from conftest import ALUNOS
+from datagen import compress, extsort
+from datagen.rng import TimeOrderedIds
+
+
+def read_rows(path):
+    with compress.open_input(str(path)) as f:
+        return list(csv.reader(f))
+
+
+def write_rows(path, rows):
+    with compress.open_output(str(path)) as f:
+        csv.writer(f).writerows(rows)
+
+
+def check_uuid7(value):
+    h = value.replace('-', '')
+    assert len(h) == 32 and [len(p) for p in value.split('-')] == [8, 4, 4, 4, 12], value
+    assert h[12] == '7' and h[16] in '89ab', value
+    return int(h[:12], 16)
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.csv.gz'])
+@pytest.mark.parametrize('memory_mb, fan_in', [(extsort.MEMORY_MB, extsort.FAN_IN), (0.004, 2)])
+def test_sort_is_typed_and_stable(tmp_path, suffix, memory_mb, fan_in):
+    rng = random.Random(1)
+    header = ['seq', 'n', 'k']
+    rows = [[str(i), rng.choice(['', '-3', '2', '10', '9.5', '100']), rng.choice('abc')] for i in range(3000)]
+    path = tmp_path / f'table{suffix}'
+    write_rows(path, [header] + rows)
+
+    stats = extsort.sort_csv(str(path), ['n', 'k'], {'n': 'numeric(5,1)'}, memory_mb=memory_mb, fan_in=fan_in)
+    # Blanks first, numbers by value, ties in input order (sorted() is stable)
+    expected = sorted(rows, key=lambda r: (float(r[1]) if r[1] else float('-inf'), r[2]))
+    assert read_rows(path) == [header] + expected
+    assert stats['rows'] == len(rows)
+    if memory_mb < 1:
+        assert stats['runs'] > fan_in and stats['passes'] > 1
+    else:
+        assert stats['runs'] == stats['passes'] == 1
+
+
+def test_unknown_sort_column(tmp_path):
+    path = tmp_path / 'table.csv'
+    write_rows(path, [['a'], ['1']])
+    with pytest.raises(ValueError, match='no column b'):
+        extsort.sort_csv(str(path), ['b'])
+
+
+def test_time_ordered_ids():
+    times = [date(2025, 2, 1), date(2025, 2, 1), '2025-03-01', datetime(2025, 3, 1, 12, 30), date(2026, 1, 1)]
+    make = TimeOrderedIds(random.Random(7))
+    ids = [make(t) for t in times]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert [check_uuid7(i) for i in ids] == [
+        int(datetime(2025, 2, 1, tzinfo=timezone.utc).timestamp() * 1000)] * 2 + [
+        int(datetime.fromisoformat(t).replace(tzinfo=timezone.utc).timestamp() * 1000)
+        for t in ('2025-03-01', '2025-03-01T12:30', '2026-01-01')]
+    # Reproducible for a seed
+    make = TimeOrderedIds(random.Random(7))
+    assert [make(t) for t in times] == ids
+
+
+@pytest.fixture(scope='module')
+def clustered(run, tmp_path_factory):
+    plain, out = tmp_path_factory.mktemp('plain'), tmp_path_factory.mktemp('cluster')
+    run('generate_final_data', plain, '--alunos', ALUNOS, '--no-cache')
+    # A few kB per run: several runs to merge even at this scale
+    stdout = run('generate_final_data', out, '--alunos', ALUNOS, '--no-cache', '--cluster', '--cluster-mb', 0.05)
+    return plain, out, stdout
+
+
+def test_cluster_sorts_and_renumbers(clustered):
+    import generate_final_data as g
+
+    plain, out, stdout = clustered
+    assert int(re.search(r'Clustered desempenho_academico .* (\d+) runs', stdout).group(1)) > 1
+    for name, columns in g.CLUSTER.items():
+        header, *rows = read_rows(out / f'{name}.csv')
+        plain_header, *plain_rows = read_rows(plain / f'{name}.csv')
+        assert header == plain_header
+        i = header.index('id')
+        key = extsort.key_function(header, columns, g.SCHEMAS[name])
+        # The plain run's rows, stable-sorted on the key, with new ids
+        without_id = [r[:i] + r[i + 1:] for r in sorted(plain_rows, key=key)]
+        assert [r[:i] + r[i + 1:] for r in rows] == without_id, name
+
+        ids = [r[i] for r in rows]
+        assert len(set(ids)) == len(ids), name
+        stamps = [check_uuid7(v) for v in ids]
+        time_columns, when = g.ID_TIME[name]
+        at = [header.index(c) for c in time_columns]
+        make = TimeOrderedIds(random.Random(0))
+        assert stamps == [check_uuid7(make(when(*(r[j] for j in at)))) for r in rows], name
+        # Time is the leading sort column: the ids ascend with the rows
+        assert ids == sorted(ids), name
@@ -0,0 +1,57 @@
+"""--partition: the _partitions.json manifests, and the pruning of load_data --escola-id/--ano."""
+import csv
+import os
+
+import pytest
+
+from conftest import ALUNOS
+from datagen import partitions
+
+OTHER_SCHOOL = '00000000-0000-4000-8000-000000000000'
+
+
+@pytest.fixture(scope='module')
+def partitioned(run, tmp_path_factory):
+    out = tmp_path_factory.mktemp('partition')
+    run('generate_final_data', out, '--alunos', ALUNOS, '--no-cache', '--partition')
+    manifests = {name: partitions.read_manifest(out / name) for name in os.listdir(out) if os.path.isdir(out / name)}
+    with open(out / 'escolas' / manifests['escolas']['partitions'][0]['path'], encoding='utf-8') as f:
+        escola_id = next(csv.DictReader(f))['id']
+    return out, manifests, escola_id
+
+
+def test_manifest_matches_the_files(partitioned):
+    out, manifests, escola_id = partitioned
+    assert all(manifests.values())
+    for name, manifest in manifests.items():
+        tenant, period = (manifest['partition_by'][k] for k in partitions.KEYS)
+        for entry in manifest['partitions']:
+            with open(out / name / entry['path'], newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            assert entry['rows'] == len(rows) > 0, entry['path']
+            assert entry['escola_id'] == escola_id
+            if 'tenant_via' not in manifest and tenant:
+                assert {r[tenant] for r in rows} == {escola_id}
+            if period:
+                assert {partitions.year_of(r[period]) for r in rows} == {entry['ano']}
+            for col, lo in entry['min'].items():
+                # Typed as the manifest stores them: numbers for numeric columns, ISO text for dates
+                values = [type(lo)(r[col]) for r in rows if r[col] != '']
+                assert (min(values), max(values)) == pytest.approx((lo, entry['max'][col])), (entry['path'], col)
+
+
+def test_prune_to_one_school_and_year(partitioned):
+    import load_data
+
+    out, manifests, escola_id = partitioned
+    tables = load_data.find_files([str(out)])
+    assert set(tables) == set(manifests)
+    assert load_data.prune(tables, escola_id, None) == tables
+    assert load_data.prune(tables, OTHER_SCHOOL, None) == {}
+
+    pruned = load_data.prune(tables, escola_id, 2025)
+    # Tables without a year column have no ano= level and cannot be pruned by year
+    assert set(pruned) == {name for name, m in manifests.items() if m['partition_by']['ano']}
+    for name, (_, files) in pruned.items():
+        assert files == [str(out / name / p['path']) for p in manifests[name]['partitions'] if p['ano'] == '2025']
+        assert all(f'escola_id={escola_id}{os.sep}ano=2025{os.sep}' in f for f in files)
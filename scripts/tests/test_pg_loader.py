@@ -0,0 +1,142 @@
+"""PgSink against a scratch Postgres database.
+
+    DATAGEN_TEST_DSN=postgresql://localhost/scratch python -m unittest discover -s scripts/tests
+
+Creates and drops tables of its own (``datagen_test_*``); skipped when
+DATAGEN_TEST_DSN is not set.
+"""
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DSN = os.environ.get('DATAGEN_TEST_DSN')
+TIMEOUT = 30
+
+
+@unittest.skipUnless(DSN, 'DATAGEN_TEST_DSN not set')
+class PgSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        import psycopg
+        with psycopg.connect(DSN) as conn:
+            conn.execute('DROP TABLE IF EXISTS datagen_test_child, datagen_test_parent')
+            conn.execute('CREATE TABLE datagen_test_parent (id integer PRIMARY KEY, nome text)')
+            conn.execute('CREATE TABLE datagen_test_child (id integer PRIMARY KEY, '
+                         'parent_id integer REFERENCES datagen_test_parent(id))')
+
+    def tearDown(self):
+        import psycopg
+        with psycopg.connect(DSN) as conn:
+            conn.execute('DROP TABLE IF EXISTS datagen_test_child, datagen_test_parent')
+
+    def sink(self, **kwargs):
+        from datagen.pg_loader import PgSink
+        return PgSink(DSN, **kwargs)
+
+    def count(self, table):
+        import psycopg
+        with psycopg.connect(DSN) as conn:
+            return conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+
+    def run_bounded(self, fn):
+        """Run ``fn`` in a thread; fail if it has not returned within TIMEOUT. Return what it raised."""
+        raised = []
+
+        def target():
+            try:
+                fn()
+            except Exception as e:
+                raised.append(e)
+        t = threading.Thread(target=target, daemon=True)
+        t.start()
+        t.join(TIMEOUT)
+        self.assertFalse(t.is_alive(), 'load did not return (background COPY deadlock)')
+        return raised[0] if raised else None
+
+    def test_failing_background_copy_raises_from_finish(self):
+        import psycopg
+        sink = self.sink()
+        sink.prepare(['datagen_test_child'])
+        rows = [{'id': '1', 'parent_id': ''}, {'id': '1', 'parent_id': ''}]
+
+        def load():
+            try:
+                sink.write_rows('datagen_test_child', rows)
+            finally:
+                sink.finish()
+        error = self.run_bounded(load)
+        self.assertIsInstance(error, psycopg.errors.UniqueViolation)
+        self.assertEqual(self.count('datagen_test_child'), 0)
+
+    def test_failing_background_copy_mid_stream(self):
+        import psycopg
+        from datagen import pg_loader
+        sink = self.sink()
+        # Many batches after the bad one: the producer must not block on the full queue
+        rows = ({'id': str(i if i != 1 else 0), 'parent_id': ''} for i in range(pg_loader.BATCH_ROWS * 20))
+
+        def load():
+            try:
+                sink.write_rows('datagen_test_child', rows)
+            finally:
+                sink.finish()
+        error = self.run_bounded(load)
+        self.assertIsInstance(error, psycopg.Error)
+
+    def test_producer_stops_when_copy_fails(self):
+        import psycopg
+        from datagen import pg_loader
+        sink = self.sink()
+        produced = []
+        total = pg_loader.BATCH_ROWS * 200
+
+        def rows():
+            for i in range(total):
+                produced.append(i)
+                yield {'id': str(i), 'parent_id': ''}
+
+        def lost_connection(table, keys, batches):
+            next(iter(batches))
+            raise psycopg.OperationalError('connection lost')
+        sink._copy = lost_connection
+
+        def load():
+            try:
+                sink.write_rows('datagen_test_child', rows())
+            finally:
+                sink.finish()
+        error = self.run_bounded(load)
+        self.assertIsInstance(error, psycopg.OperationalError)
+        self.assertLess(len(produced), total // 10)
+
+    def test_prepare_refuses_to_empty_referencing_tables(self):
+        sink = self.sink()
+        sink.write_rows('datagen_test_parent', [{'id': '1', 'nome': 'a'}])
+        sink.write_rows('datagen_test_child', [{'id': '1', 'parent_id': '1'}])
+        sink.finish()
+        with self.assertRaisesRegex(ValueError, 'datagen_test_child'):
+            self.sink().prepare(['datagen_test_parent'])
+        self.assertEqual(self.count('datagen_test_child'), 1)
+        self.assertEqual(self.count('datagen_test_parent'), 1)
+
+        sink = self.sink(cascade=True)
+        sink.prepare(['datagen_test_parent'])
+        sink.finish()
+        self.assertEqual(self.count('datagen_test_child'), 0)
+        self.assertEqual(self.count('datagen_test_parent'), 0)
+
+    def test_prepare_truncates_empty_referencing_tables(self):
+        sink = self.sink()
+        sink.write_rows('datagen_test_parent', [{'id': '1', 'nome': 'a'}])
+        sink.finish()
+        sink = self.sink()
+        sink.prepare(['datagen_test_parent'])
+        sink.finish()
+        self.assertEqual(self.count('datagen_test_parent'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
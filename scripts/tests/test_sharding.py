@@ -0,0 +1,48 @@
+"""Sharded generation: the output depends on the seed only, not on --workers."""
+import csv
+
+import pytest
+
+from conftest import ALUNOS
+
+# Four shards for ALUNOS students
+SHARD_SIZE = 60
+
+
+@pytest.mark.parametrize('script, args', [
+    ('generate_final_data', ['--no-cache']),
+    ('generate_final_data', ['--no-cache', '--engine', 'numpy']),
+    ('generate_final_data', ['--no-cache', '--partition']),
+    ('generate_bi_data', []),
+    ('generate_bi_data', ['--engine', 'numpy']),
+])
+def test_same_output_for_any_workers(run, read_tree, tmp_path, script, args):
+    outputs = {}
+    for workers in (0, 1, 3):
+        out = tmp_path / f'workers{workers}'
+        run(script, out, '--alunos', ALUNOS, '--workers', workers, *args, shard_size=SHARD_SIZE)
+        outputs[workers] = read_tree(out)
+    assert outputs[0]
+    assert outputs[0] == outputs[1] == outputs[3]
+
+
+def test_shard_size_is_not_an_option(run, read_tree, tmp_path):
+    run('generate_final_data', tmp_path / 'a', '--alunos', ALUNOS, '--no-cache')
+    run('generate_final_data', tmp_path / 'b', '--alunos', ALUNOS, '--no-cache', '--workers', 2)
+    assert read_tree(tmp_path / 'a') == read_tree(tmp_path / 'b')
+    with pytest.raises(AssertionError, match='unrecognized arguments'):
+        run('generate_final_data', tmp_path / 'c', '--alunos', ALUNOS, '--shard-size', 50)
+
+
+def test_draw_alunos_matches_the_shards(run, tmp_path, monkeypatch):
+    # simulate_events draws its students with draw_alunos: they must be the run's alunos.csv
+    import generate_final_data
+
+    run('generate_final_data', tmp_path, '--alunos', ALUNOS, '--no-cache', '--tables', 'alunos',
+        shard_size=SHARD_SIZE)
+    monkeypatch.setattr(generate_final_data, 'SHARD_SIZE', SHARD_SIZE)
+    with open(tmp_path / 'alunos.csv', newline='', encoding='utf-8') as f:
+        written = [row['id'] for row in csv.DictReader(f)]
+    drawn = [row['id'] for row in generate_final_data.draw_alunos(ALUNOS)]
+    assert drawn == written
+    assert len(set(drawn)) == ALUNOS
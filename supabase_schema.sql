@@ -87,29 +87,177 @@ CREATE INDEX IF NOT EXISTS idx_desempenho_aluno_id ON desempenho_academico(aluno
 CREATE INDEX IF NOT EXISTS idx_financeiro_aluno_id ON financeiro_mensalidades(aluno_id);
 CREATE INDEX IF NOT EXISTS idx_mes_referencia_despesas ON financeiro_despesas(data_despesa);
 CREATE INDEX IF NOT EXISTS idx_metricas_tipo_mes ON metricas_mensais(tipo_metrica, mes_referencia);
+-- BRIN nas datas: pequenos e seletivos quando as linhas estão ordenadas por data
+-- (generate_final_data.py --cluster)
+CREATE INDEX IF NOT EXISTS idx_financeiro_mes_brin ON financeiro_mensalidades USING BRIN (mes_referencia);
+CREATE INDEX IF NOT EXISTS idx_desempenho_ano_brin ON desempenho_academico USING BRIN (ano_letivo);
+CREATE INDEX IF NOT EXISTS idx_chamados_abertura_brin ON operacional_chamados USING BRIN (data_abertura);
 
 -- 3. Tabelas para o Dashboard do ENEM
+-- Por estado e por cidade (scripts/aggregate_enem.py): médias e contagens por área e tipo de escola,
+-- no mesmo layout de enem_agregado_escola/bairro. O layout antigo (NU_NOTA_*, total_alunos) dos CSVs
+-- estáticos sai com aggregate_enem.py --layout legado; bancos criados antes desta versão precisam
+-- recriar estas duas tabelas.
 CREATE TABLE IF NOT EXISTS enem_agregado_estado (
-    "SG_UF_PROVA" CHAR(2) PRIMARY KEY,
-    "NU_NOTA_CN" NUMERIC(6,2),
-    "NU_NOTA_CH" NUMERIC(6,2),
-    "NU_NOTA_LC" NUMERIC(6,2),
-    "NU_NOTA_MT" NUMERIC(6,2),
-    "NU_NOTA_REDACAO" NUMERIC(6,2),
-    "total_alunos" INTEGER
+    "SG_UF_PROVA" CHAR(2) NOT NULL,
+    "tp_escola_label" TEXT NOT NULL,
+    "avg_cn" NUMERIC(6,2),
+    "count_cn" INTEGER,
+    "avg_ch" NUMERIC(6,2),
+    "count_ch" INTEGER,
+    "avg_lc" NUMERIC(6,2),
+    "count_lc" INTEGER,
+    "avg_mt" NUMERIC(6,2),
+    "count_mt" INTEGER,
+    "avg_redacao" NUMERIC(6,2),
+    "count_redacao" INTEGER,
+    "total_inscritos" INTEGER,
+    PRIMARY KEY ("SG_UF_PROVA", "tp_escola_label")
 );
 
 CREATE TABLE IF NOT EXISTS enem_agregado_cidade (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-    "CO_MUNICIPIO_PROVA" INTEGER,
+    "SG_UF_PROVA" CHAR(2) NOT NULL,
+    "CO_MUNICIPIO_PROVA" INTEGER NOT NULL,
     "NO_MUNICIPIO_PROVA" TEXT,
-    "SG_UF_PROVA" CHAR(2),
-    "NU_NOTA_CN" NUMERIC(6,2),
-    "NU_NOTA_CH" NUMERIC(6,2),
-    "NU_NOTA_LC" NUMERIC(6,2),
-    "NU_NOTA_MT" NUMERIC(6,2),
-    "NU_NOTA_REDACAO" NUMERIC(6,2),
-    "total_alunos" INTEGER
+    "tp_escola_label" TEXT NOT NULL,
+    "avg_cn" NUMERIC(6,2),
+    "count_cn" INTEGER,
+    "avg_ch" NUMERIC(6,2),
+    "count_ch" INTEGER,
+    "avg_lc" NUMERIC(6,2),
+    "count_lc" INTEGER,
+    "avg_mt" NUMERIC(6,2),
+    "count_mt" INTEGER,
+    "avg_redacao" NUMERIC(6,2),
+    "count_redacao" INTEGER,
+    "total_inscritos" INTEGER,
+    PRIMARY KEY ("CO_MUNICIPIO_PROVA", "tp_escola_label")
 );
 
 CREATE INDEX IF NOT EXISTS idx_enem_cidade_uf ON enem_agregado_cidade("SG_UF_PROVA");
+
+-- Por escola e por bairro, no mesmo layout; as rotas /api/enem recombinam as médias como
+-- SUM(avg * count) / SUM(count)
+CREATE TABLE IF NOT EXISTS enem_agregado_escola (
+    "SG_UF_PROVA" CHAR(2) NOT NULL,
+    "CO_MUNICIPIO_PROVA" INTEGER NOT NULL,
+    "NO_MUNICIPIO_PROVA" TEXT,
+    "tp_escola_label" TEXT NOT NULL,
+    "CO_ESCOLA" INTEGER NOT NULL,
+    "NO_ENTIDADE" TEXT,
+    "NO_BAIRRO" TEXT,
+    "avg_cn" NUMERIC(6,2),
+    "count_cn" INTEGER,
+    "avg_ch" NUMERIC(6,2),
+    "count_ch" INTEGER,
+    "avg_lc" NUMERIC(6,2),
+    "count_lc" INTEGER,
+    "avg_mt" NUMERIC(6,2),
+    "count_mt" INTEGER,
+    "avg_redacao" NUMERIC(6,2),
+    "count_redacao" INTEGER,
+    "total_inscritos" INTEGER,
+    PRIMARY KEY ("CO_MUNICIPIO_PROVA", "tp_escola_label", "CO_ESCOLA")
+);
+
+CREATE TABLE IF NOT EXISTS enem_agregado_bairro (
+    "SG_UF_PROVA" CHAR(2) NOT NULL,
+    "CO_MUNICIPIO_PROVA" INTEGER NOT NULL,
+    "NO_MUNICIPIO_PROVA" TEXT,
+    "tp_escola_label" TEXT NOT NULL,
+    "NO_BAIRRO" TEXT NOT NULL,
+    "avg_cn" NUMERIC(6,2),
+    "count_cn" INTEGER,
+    "avg_ch" NUMERIC(6,2),
+    "count_ch" INTEGER,
+    "avg_lc" NUMERIC(6,2),
+    "count_lc" INTEGER,
+    "avg_mt" NUMERIC(6,2),
+    "count_mt" INTEGER,
+    "avg_redacao" NUMERIC(6,2),
+    "count_redacao" INTEGER,
+    "total_inscritos" INTEGER,
+    PRIMARY KEY ("CO_MUNICIPIO_PROVA", "tp_escola_label", "NO_BAIRRO")
+);
+
+CREATE INDEX IF NOT EXISTS idx_enem_escola_uf_municipio ON enem_agregado_escola("SG_UF_PROVA", "NO_MUNICIPIO_PROVA");
+CREATE INDEX IF NOT EXISTS idx_enem_bairro_uf_municipio ON enem_agregado_bairro("SG_UF_PROVA", "NO_MUNICIPIO_PROVA");
+
+-- 4. Rollups pré-agregados (gerados junto com os fatos por scripts/generate_final_data.py)
+-- Cobre: médias/aprovação por unidade, segmento, disciplina e bimestre
+CREATE TABLE IF NOT EXISTS rollup_desempenho (
+    escola_id UUID REFERENCES escolas(id) ON DELETE CASCADE,
+    unidade TEXT NOT NULL,
+    segmento TEXT NOT NULL,
+    disciplina TEXT NOT NULL,
+    ano_letivo INTEGER NOT NULL,
+    bimestre INTEGER NOT NULL,
+    registros INTEGER NOT NULL,
+    media_final NUMERIC(4,2),
+    percentual_presenca NUMERIC(5,2),
+    aprovados INTEGER NOT NULL, -- media_final >= 6 e percentual_presenca >= 75
+    soma_media_final NUMERIC(14,2),
+    soma_presenca NUMERIC(14,2),
+    PRIMARY KEY (escola_id, unidade, segmento, disciplina, ano_letivo, bimestre)
+);
+
+-- Cobre: receita prevista/paga, inadimplência e evasões por mês e unidade
+CREATE TABLE IF NOT EXISTS rollup_financeiro_mensal (
+    escola_id UUID REFERENCES escolas(id) ON DELETE CASCADE,
+    mes_referencia DATE NOT NULL,
+    unidade TEXT NOT NULL,
+    mensalidades INTEGER NOT NULL,
+    receita_prevista NUMERIC(14,2),
+    receita_paga NUMERIC(14,2),
+    mensalidades_atrasadas INTEGER NOT NULL,
+    mensalidades_pendentes INTEGER NOT NULL,
+    taxa_inadimplencia NUMERIC(5,2), -- % de mensalidades atrasadas
+    evasoes INTEGER NOT NULL,
+    PRIMARY KEY (escola_id, mes_referencia, unidade)
+);
+
+-- Cobre: mapa de alunos pré-agregado por tile (z/x/y) em vários zooms, com o centróide de cada tile
+-- (gerado por generate_final_data.py ou scripts/build_map_tiles.py)
+CREATE TABLE IF NOT EXISTS rollup_mapa_alunos (
+    escola_id UUID REFERENCES escolas(id) ON DELETE CASCADE,
+    zoom SMALLINT NOT NULL,
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    alunos INTEGER NOT NULL,
+    ativos INTEGER NOT NULL,
+    evadidos INTEGER NOT NULL,
+    inadimplentes INTEGER NOT NULL,
+    bolsistas INTEGER NOT NULL,
+    latitude NUMERIC(9,6),
+    longitude NUMERIC(9,6),
+    PRIMARY KEY (escola_id, zoom, tile_x, tile_y)
+);
+
+-- Cobre: risco acadêmico, evasão e health score por aluno (uma linha por aluno, com score_risco 0-100)
+-- (gerado por generate_final_data.py ou scripts/build_risk_features.py, que recalcula só os alunos alterados)
+CREATE TABLE IF NOT EXISTS aluno_risk_features (
+    aluno_id UUID PRIMARY KEY REFERENCES alunos(id) ON DELETE CASCADE,
+    escola_id UUID REFERENCES escolas(id) ON DELETE CASCADE,
+    unidade TEXT,
+    segmento TEXT,
+    turma TEXT,
+    status_matricula TEXT,
+    periodos INTEGER NOT NULL, -- bimestres com notas
+    media_atual NUMERIC(4,2), -- média do último bimestre com notas
+    media_anterior NUMERIC(4,2),
+    tendencia_nota NUMERIC(5,2), -- inclinação da média por bimestre (pontos/bimestre)
+    presenca_atual NUMERIC(5,2),
+    presenca_media NUMERIC(5,2),
+    entrega_media NUMERIC(5,2),
+    disciplinas_abaixo INTEGER NOT NULL, -- disciplinas com média < 6 no último bimestre
+    registros_risco INTEGER NOT NULL, -- notas com média < 6 ou presença < 75%
+    mensalidades_atrasadas INTEGER NOT NULL,
+    atraso_consecutivo INTEGER NOT NULL, -- mensalidades atrasadas desde a última paga
+    nps_unidade NUMERIC(5,2),
+    health_score_unidade NUMERIC(4,2),
+    score_risco NUMERIC(5,2) NOT NULL,
+    nivel_risco TEXT CHECK (nivel_risco IN ('Alto', 'Médio', 'Baixo')),
+    em_risco BOOLEAN NOT NULL, -- mesmo critério de "Alunos em Risco" do dashboard acadêmico
+    referencia DATE
+);
+CREATE INDEX IF NOT EXISTS idx_risk_escola_score ON aluno_risk_features(escola_id, score_risco DESC);